@@ -6,22 +6,124 @@ Pi Camera V5647 色彩校正系統
 
 import cv2
 import numpy as np
+import copy
 import json
 import os
+import sys
+import threading
 from typing import Dict, Tuple, Optional
 from pathlib import Path
 
+# 3D LUT 引擎 (來自 filter 模組)；不可用時編譯後的配置仍以矩陣 + 逐步運算執行
+try:
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'filter'))
+    from film_lut import FilmLUT
+    FILM_LUT_AVAILABLE = True
+except ImportError:
+    FILM_LUT_AVAILABLE = False
+
+# 配置檔熱重載優先使用 inotify，不可用時退回 mtime 輪詢
+try:
+    from inotify_watcher import InotifyWatcher, IN_CLOSE_WRITE, IN_MOVED_TO
+    INOTIFY_AVAILABLE = True
+except ImportError:
+    INOTIFY_AVAILABLE = False
+
+from raw_color_pipeline import RawColorPipeline
+
+
+class CompiledProfile:
+    """
+    編譯後的相機配置：
+    - matrix: CCM × 白平衡 合併的 3x3 矩陣 (BGR)，曝光增益於套用時併入
+    - curve: 純逐通道的色調 (對比度 + Gamma) 時使用的 1D LUT
+    - lut: 含飽和度 / 戶外色相修正時使用的 3D LUT
+    套用只需一次矩陣運算 (量化一次) 加一次查表。
+
+    建立後不可修改 (陣列設為唯讀)，熱重載時整組替換而不是原地更新。
+    """
+
+    __slots__ = ("matrix", "curve", "lut", "_tone")
+
+    def __init__(self, matrix: np.ndarray, curve: Optional[np.ndarray] = None,
+                 lut: Optional["FilmLUT"] = None, tone=None):
+        matrix = np.array(matrix, dtype=np.float32)
+        matrix.flags.writeable = False
+        if curve is not None:
+            curve = np.array(curve, dtype=np.uint8)
+            curve.flags.writeable = False
+        if lut is not None:
+            lut.table.flags.writeable = False
+        object.__setattr__(self, "matrix", matrix)
+        object.__setattr__(self, "curve", curve)
+        object.__setattr__(self, "lut", lut)
+        object.__setattr__(self, "_tone", tone)  # 無 3D LUT 時的逐步備援
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CompiledProfile 不可修改，請重新編譯")
+
+    def apply(self, image: np.ndarray, exposure_ev: float = 0.0) -> np.ndarray:
+        matrix = self.matrix if exposure_ev == 0 else self.matrix * np.float32(2 ** exposure_ev)
+        return self.apply_tone(cv2.transform(image, matrix))
+
+    def apply_tone(self, image: np.ndarray) -> np.ndarray:
+        """只套用色調查表 (RAW 路徑已在線性域完成白平衡與 CCM)"""
+        if self.lut is not None:
+            return self.lut.apply(image)
+        if self.curve is not None:
+            return cv2.LUT(image, self.curve)
+        if self._tone is not None:
+            return self._tone(image)
+        return image
+
+    def for_rgb(self) -> "CompiledProfile":
+        """RGB 影像用的版本：R / B 交換併入矩陣與 3D LUT，套用時不需 cvtColor"""
+        matrix = self.matrix[::-1].copy()
+        matrix[:, :3] = matrix[:, 2::-1]
+        lut = tone = None
+        if self.lut is not None:
+            lut = FilmLUT(self.lut.table.transpose(2, 1, 0, 3)[..., ::-1])
+        elif self._tone is not None:
+            base = self._tone
+            tone = lambda image: cv2.cvtColor(base(cv2.cvtColor(image, cv2.COLOR_RGB2BGR)),
+                                              cv2.COLOR_BGR2RGB)
+        return CompiledProfile(matrix, self.curve, lut, tone)
+
+
 class CameraColorCalibration:
     """相機色彩校正系統"""
+
+    OUTDOOR_STEPS = 8  # 戶外調整強度的量化階數 (中間值以兩組 LUT 混合)
     
     def __init__(self):
         self.config_path = Path(__file__).parent / "camera_profiles.json"
-        self.camera_profiles = self._load_camera_profiles()
         self.current_profile = "pi_camera_v5647"
+        self.lut_size = 33
+        self._reload_lock = threading.Lock()
+        self._cache_lock = threading.Lock()  # 保護混合結果寫入共用的編譯快取
+        self._state: Tuple[Dict, Dict[Tuple, CompiledProfile]] = ({}, {})
+        self._watch_thread: Optional[threading.Thread] = None
+        self._watch_stop = threading.Event()
+        self.profile_version = 0  # 每次重新編譯遞增，供外部快取判斷是否過期
+        self._swap_profiles(self._load_camera_profiles())
         
     def _load_camera_profiles(self) -> Dict:
         """載入相機色彩配置檔案"""
-        default_profiles = {
+        default_profiles = self._default_profiles()
+        
+        if self.config_path.exists():
+            try:
+                # 合併預設和載入的配置
+                default_profiles.update(self._read_profile_file())
+            except Exception as e:
+                print(f"⚠️  載入配置檔案失敗，使用預設設定: {e}")
+        
+        return default_profiles
+
+    @staticmethod
+    def _default_profiles() -> Dict:
+        """內建的預設配置"""
+        return {
             "pi_camera_v5647": {
                 "name": "Raspberry Pi Camera V5647 (OV5647)",
                 "sensor_type": "OmniVision OV5647",
@@ -60,17 +162,19 @@ class CameraColorCalibration:
                 "gamma_correction": 1.0
             }
         }
-        
-        if self.config_path.exists():
-            try:
-                with open(self.config_path, 'r', encoding='utf-8') as f:
-                    loaded_profiles = json.load(f)
-                # 合併預設和載入的配置
-                default_profiles.update(loaded_profiles)
-            except Exception as e:
-                print(f"⚠️  載入配置檔案失敗，使用預設設定: {e}")
-        
-        return default_profiles
+
+    def _read_profile_file(self) -> Dict:
+        with open(self.config_path, 'r', encoding='utf-8') as f:
+            loaded_profiles = json.load(f)
+        if not isinstance(loaded_profiles, dict):
+            raise ValueError("配置檔案格式錯誤")
+        # 逐一驗證必要欄位，避免編輯到一半的檔案換掉可用的配置
+        for name, profile in loaded_profiles.items():
+            for key in ("name", "color_correction_matrix", "white_balance_gains", "saturation_adjustment",
+                        "contrast_curve", "gamma_correction", "outdoor_optimization"):
+                if key not in profile:
+                    raise ValueError(f"配置 {name} 缺少欄位 {key}")
+        return loaded_profiles
     
     def save_camera_profiles(self):
         """儲存相機配置到檔案"""
@@ -91,55 +195,322 @@ class CameraColorCalibration:
             print(f"❌ 找不到相機配置: {profile_name}")
             return False
     
+    # === 編譯後的配置 ===
+
+    @property
+    def camera_profiles(self) -> Dict:
+        """目前的配置 (與編譯結果屬於同一組發布狀態)"""
+        return self._state[0]
+
+    @camera_profiles.setter
+    def camera_profiles(self, profiles: Dict):
+        """整組替換配置並重新編譯"""
+        with self._reload_lock:
+            self._swap_profiles(profiles)
+
+    def _compile_all(self, profiles: Dict) -> Dict[Tuple, CompiledProfile]:
+        """編譯所有配置的 0 / 1 戶外強度版本 (中間值於使用時混合並快取)"""
+        compiled = {}
+        for name, profile in profiles.items():
+            compiled[(name, 0)] = self._build_compiled(profile, False)
+            compiled[(name, self.OUTDOOR_STEPS)] = self._build_compiled(profile, True)
+        return compiled
+
+    def _swap_profiles(self, profiles: Dict):
+        """
+        編譯完成後以單一賦值發布 (配置, 編譯結果)；套用中的幀繼續使用舊的一組。
+        版本號在發布後才遞增，外部快取不會把舊結果記在新版本下。
+        """
+        profiles = copy.deepcopy(profiles)
+        compiled = self._compile_all(profiles)
+        if self.current_profile not in profiles:
+            print(f"⚠️  配置 {self.current_profile} 已不存在，改用 generic_camera")
+            self.current_profile = "generic_camera" if "generic_camera" in profiles else next(iter(profiles))
+        self._state = (profiles, compiled)
+        self.profile_version += 1
+
+    def invalidate_compiled(self):
+        """重新編譯 (直接修改 camera_profiles 的內容後呼叫)"""
+        with self._reload_lock:
+            self._swap_profiles(self.camera_profiles)
+
+    def reload_profiles(self) -> bool:
+        """重新讀取配置檔並編譯；讀取或編譯失敗時保留目前配置"""
+        with self._reload_lock:
+            try:
+                profiles = self._default_profiles()
+                profiles.update(self._read_profile_file())
+                self._swap_profiles(profiles)
+            except Exception as e:
+                print(f"⚠️  重新載入配置失敗，保留目前配置: {e}")
+                return False
+        print(f"🔄 相機配置已重新載入: {self.config_path.name}")
+        return True
+
+    def watch_profiles(self, poll_interval: float = 1.0):
+        """在背景監看配置檔，變更時自動重新編譯並替換"""
+        if self._watch_thread is not None and self._watch_thread.is_alive():
+            return
+        self._watch_stop.clear()
+        self._watch_thread = threading.Thread(target=self._watch_loop, args=(poll_interval,),
+                                              name="ProfileWatcher", daemon=True)
+        self._watch_thread.start()
+
+    def stop_watching(self, timeout: float = 2.0):
+        self._watch_stop.set()
+        if self._watch_thread is not None:
+            self._watch_thread.join(timeout)
+            self._watch_thread = None
+
+    def _watch_loop(self, poll_interval: float):
+        watcher = None
+        if INOTIFY_AVAILABLE:
+            try:
+                watcher = InotifyWatcher()
+                # 監看資料夾：編輯器常以「寫入暫存檔再改名」方式存檔
+                watcher.add_watch(str(self.config_path.parent), IN_CLOSE_WRITE | IN_MOVED_TO)
+            except OSError as e:
+                print(f"⚠️  inotify 無法使用，改用輪詢: {e}")
+                watcher = None
+
+        last_mtime = self._config_mtime()
+        try:
+            while not self._watch_stop.is_set():
+                if watcher is not None:
+                    events = watcher.read_events(timeout=poll_interval)
+                    if not any(event['name'] == self.config_path.name for event in events):
+                        continue
+                else:
+                    self._watch_stop.wait(poll_interval)
+                    mtime = self._config_mtime()
+                    if mtime == last_mtime:
+                        continue
+                    last_mtime = mtime
+                self.reload_profiles()
+        finally:
+            if watcher is not None:
+                watcher.close()
+
+    def _config_mtime(self) -> Optional[float]:
+        try:
+            return self.config_path.stat().st_mtime
+        except OSError:
+            return None
+
+    def compile_profile(self, profile_name: Optional[str] = None,
+                        outdoor: float = 0.0) -> CompiledProfile:
+        """
+        將配置編譯為 矩陣 + 查表，結果快取重複使用
+
+        Args:
+            profile_name: 配置名稱 (預設為目前配置)
+            outdoor: 戶外場景調整強度 (0-1，對比度 1.1、曝光 -0.05EV)；
+                     中間值由 0 與 1 兩組查表混合，讓即時預覽能平滑過渡
+        """
+        profile_name = profile_name or self.current_profile
+        step = int(round(float(np.clip(outdoor, 0.0, 1.0)) * self.OUTDOOR_STEPS))
+        # 取得目前這一組編譯結果的參照；重載時整組替換，不影響此次讀取
+        table = self._state[1]
+        compiled = table.get((profile_name, step))
+        if compiled is not None:
+            return compiled
+        if (profile_name, 0) not in table:
+            raise KeyError(f"找不到相機配置: {profile_name}")
+
+        # 預覽與拍照執行緒可能同時要求相同的中間強度，混合與寫入快取需互斥
+        with self._cache_lock:
+            compiled = table.get((profile_name, step))
+            if compiled is None:
+                compiled = self._blend_compiled(table[(profile_name, 0)],
+                                                table[(profile_name, self.OUTDOOR_STEPS)],
+                                                step / self.OUTDOOR_STEPS)
+                table[(profile_name, step)] = compiled
+        return compiled
+
+    def _blend_compiled(self, base: CompiledProfile, outdoor: CompiledProfile,
+                        weight: float) -> CompiledProfile:
+        """兩組編譯結果的查表線性混合 (矩陣相同)"""
+        curve = lut = None
+        if base.lut is not None and outdoor.lut is not None:
+            lut = FilmLUT.blend([base.lut, outdoor.lut], [1.0 - weight, weight])
+        elif base.curve is not None or outdoor.curve is not None:
+            identity = np.arange(256, dtype=np.float32)
+            low = identity if base.curve is None else base.curve.astype(np.float32)
+            high = identity if outdoor.curve is None else outdoor.curve.astype(np.float32)
+            curve = np.clip(low + (high - low) * weight + 0.5, 0, 255).astype(np.uint8)
+        elif base._tone is not None:
+            # 無 3D LUT 的逐步備援無法混合，取較接近的一端
+            return outdoor if weight >= 0.5 else base
+        return CompiledProfile(base.matrix, curve, lut, None)
+
+    def _build_compiled(self, profile: dict, outdoor: bool) -> CompiledProfile:
+        """編譯單一配置：CCM × 白平衡 矩陣，其餘逐像素步驟烘焙為 1D / 3D 查表"""
+        ccm = np.array(profile["color_correction_matrix"], dtype=np.float32)
+        if ccm.shape != (3, 3):
+            ccm = np.eye(3, dtype=np.float32)
+        gains = profile["white_balance_gains"]
+        # 白平衡增益為 R, G, B 順序，矩陣為 BGR
+        wb = np.diag([gains[2], gains[1], gains[0]]).astype(np.float32) if len(gains) == 3 \
+            else np.eye(3, dtype=np.float32)
+        matrix = wb @ ccm
+        offset = profile.get("color_correction_offset")
+        if offset is not None and len(offset) == 3:
+            # 3x4 仿射矩陣 (色卡校正工具 --offset)：偏移以 0-1 為單位，cv2.transform 以 0-255 計算
+            matrix = np.hstack([matrix, (wb @ np.array(offset, dtype=np.float32) * 255.0)[:, None]])
+
+        def tone(img):
+            return self._tone_stages(img, profile, outdoor)
+
+        optimization = profile["outdoor_optimization"]
+        per_channel = profile["saturation_adjustment"] == 1.0 and not any(optimization.values())
+        curve = lut = None
+        if per_channel:
+            # 對比度與 Gamma 皆為逐通道運算，合併為單一 1D LUT
+            ramp = np.repeat(np.arange(256, dtype=np.uint8)[None, :, None], 3, axis=2)
+            curve = tone(ramp)[0, :, 0].copy()
+            if np.array_equal(curve, np.arange(256)):
+                curve = None
+        elif FILM_LUT_AVAILABLE:
+            lut = FilmLUT.from_function(tone, self.lut_size)
+
+        fallback = tone if lut is None and not per_channel else None
+        return CompiledProfile(matrix.astype(np.float32), curve, lut, fallback)
+
+    def _is_outdoor_scene(self, image: np.ndarray) -> bool:
+        """戶外場景偵測 (天空或植被比例)"""
+        sky_ratio, vegetation_ratio = self.outdoor_ratios(image)
+        return sky_ratio > 0.2 or vegetation_ratio > 0.3
+
+    def outdoor_ratios(self, image: np.ndarray) -> Tuple[float, float]:
+        """天空與植被佔畫面的比例"""
+        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        
+        # 檢測天空區域（高亮度、藍色調）
+        sky_mask = (hsv[:, :, 2] > 180) & (hsv[:, :, 0] > 90) & (hsv[:, :, 0] < 130)
+        sky_ratio = np.sum(sky_mask) / (image.shape[0] * image.shape[1])
+        
+        # 檢測植被（綠色調）
+        vegetation_mask = (hsv[:, :, 0] > 35) & (hsv[:, :, 0] < 85) & (hsv[:, :, 1] > 50)
+        vegetation_ratio = np.sum(vegetation_mask) / (image.shape[0] * image.shape[1])
+        
+        return float(sky_ratio), float(vegetation_ratio)
+
+    def _tone_stages(self, image: np.ndarray, profile: dict, outdoor: bool) -> np.ndarray:
+        """矩陣之後的逐像素步驟 (場景調整、飽和度、對比度、Gamma、戶外修正)"""
+        corrected = image
+        if outdoor:
+            # 戶外場景：增加對比度，輕微降低曝光
+            corrected = self._adjust_exposure(corrected, -0.05)
+            corrected = self._enhance_contrast(corrected, 1.1)
+        
+        corrected = self._adjust_saturation(corrected, profile["saturation_adjustment"])
+        corrected = self._apply_contrast_curve(corrected, profile["contrast_curve"])
+        corrected = self._apply_gamma_correction(corrected, profile["gamma_correction"])
+        
+        if profile["outdoor_optimization"]["sky_blue_correction"]:
+            corrected = self._correct_sky_blue(corrected)
+        
+        if profile["outdoor_optimization"]["vegetation_green_enhancement"]:
+            corrected = self._enhance_vegetation_green(corrected)
+        
+        if profile["outdoor_optimization"]["skin_tone_protection"]:
+            corrected = self._protect_skin_tones(corrected)
+        
+        return corrected
+
     def apply_color_correction(self, image: np.ndarray, 
-                             scene_analysis: bool = True) -> np.ndarray:
+                             scene_analysis: bool = True,
+                             exposure_ev: float = 0.0,
+                             use_compiled: bool = True,
+                             scene_params: Optional[dict] = None) -> np.ndarray:
         """
         套用完整的色彩校正
         
         Args:
             image: 輸入圖像 (BGR)
             scene_analysis: 是否進行場景分析自動調整
+            exposure_ev: 額外的曝光補償 (EV)
+            use_compiled: 使用編譯後的 矩陣 + 查表 (False 為逐步參考實作)
+            scene_params: 串流場景分析的結果 (StreamingSceneAnalyzer.current)，
+                          提供時不再逐幀偵測場景，改用其平滑後的戶外強度與曝光
         
         Returns:
             校正後的圖像
         """
         if image is None or image.size == 0:
             return image
-            
+
+        outdoor = None
+        if scene_params is not None:
+            outdoor = float(scene_params.get("outdoor", 0.0))
+            exposure_ev += float(scene_params.get("exposure_ev", 0.0))
+
+        if use_compiled:
+            if outdoor is None:
+                outdoor = 0.0
+                if scene_analysis:
+                    # 場景偵測只需比例，在縮圖上套用矩陣後判斷
+                    compiled = self.compile_profile()
+                    h, w = image.shape[:2]
+                    scale = min(1.0, 160.0 / max(h, w))
+                    thumb = cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))),
+                                       interpolation=cv2.INTER_AREA)
+                    outdoor = float(self._is_outdoor_scene(cv2.transform(thumb, compiled.matrix)))
+            return self.compile_profile(outdoor=outdoor).apply(image, exposure_ev)
+
+        return self._reference_color_correction(image, scene_analysis, exposure_ev, outdoor)
+
+    def apply_raw_correction(self, raw: np.ndarray, raw_format: str, width: Optional[int] = None,
+                             metadata: Optional[dict] = None, outdoor: float = 0.0,
+                             output: str = "srgb8") -> np.ndarray:
+        """
+        RAW 域色彩校正：白平衡在去馬賽克前套用於 Bayer 資料，CCM 在線性 RGB 上套用
+
+        Args:
+            raw: make_array("raw") 的緩衝區 (打包 CSI2P 或未打包)
+            raw_format: raw 串流格式 (例如 SGBRG10)
+            width: 影像寬度 (緩衝區含 stride 補齊時必須提供)
+            metadata: capture_request 的 metadata (ColourGains、ColourCorrectionMatrix、黑電平)
+            outdoor: 戶外調整強度 (0-1)
+            output: "srgb8" 套用配置色調後輸出 8-bit BGR；"linear16" 輸出未經色調的 16-bit 線性 BGR
+        """
+        profile = self.camera_profiles[self.current_profile]
+        overrides = {}
+        if "raw_color_correction_matrix" in profile:
+            # 配置檔提供以線性 raw 資料擬合的 CCM 時優先使用
+            overrides["ccm_rgb"] = profile["raw_color_correction_matrix"]
+        pipeline = RawColorPipeline.from_metadata(raw_format, metadata or {}, **overrides)
+        developed = pipeline.develop(raw, width, output)
+        if output != "srgb8":
+            return developed
+        # 8-bit 的配置矩陣是針對 ISP 輸出擬合的，RAW 路徑只沿用色調 (飽和度 / 曲線 / Gamma)
+        return self.compile_profile(outdoor=outdoor).apply_tone(developed)
+
+    def _reference_color_correction(self, image: np.ndarray, scene_analysis: bool = True,
+                                    exposure_ev: float = 0.0,
+                                    outdoor: Optional[float] = None) -> np.ndarray:
+        """逐步參考實作 (每一步都量化回 uint8)，用於驗證編譯結果"""
         profile = self.camera_profiles[self.current_profile]
         
         # 1. 基礎色彩矩陣校正
-        corrected = self._apply_color_matrix(image, profile["color_correction_matrix"])
+        corrected = self._apply_color_matrix(image, profile["color_correction_matrix"],
+                                             profile.get("color_correction_offset"))
         
         # 2. 白平衡調整
         corrected = self._apply_white_balance(corrected, profile["white_balance_gains"])
+        corrected = self._adjust_exposure(corrected, exposure_ev)
         
         # 3. 場景自適應調整
-        if scene_analysis:
-            corrected = self._scene_adaptive_correction(corrected, profile)
-        
-        # 4. 飽和度調整
-        corrected = self._adjust_saturation(corrected, profile["saturation_adjustment"])
-        
-        # 5. 對比度曲線
-        corrected = self._apply_contrast_curve(corrected, profile["contrast_curve"])
-        
-        # 6. Gamma 校正
-        corrected = self._apply_gamma_correction(corrected, profile["gamma_correction"])
-        
-        # 7. 戶外場景優化
-        if profile["outdoor_optimization"]["sky_blue_correction"]:
-            corrected = self._correct_sky_blue(corrected)
-        
-        if profile["outdoor_optimization"]["vegetation_green_enhancement"]:
-            corrected = self._enhance_vegetation_green(corrected)
-        
-        if profile["outdoor_optimization"]["skin_tone_protection"]:
-            corrected = self._protect_skin_tones(corrected)
+        if outdoor is None:
+            outdoor = scene_analysis and self._is_outdoor_scene(corrected)
+        else:
+            outdoor = outdoor >= 0.5
         
-        return corrected
+        # 4-7. 飽和度、對比度曲線、Gamma、戶外場景優化
+        return self._tone_stages(corrected, profile, outdoor)
     
-    def _apply_color_matrix(self, image: np.ndarray, matrix: list) -> np.ndarray:
+    def _apply_color_matrix(self, image: np.ndarray, matrix: list,
+                            offset: Optional[list] = None) -> np.ndarray:
         """套用色彩校正矩陣"""
         if len(matrix) != 3 or len(matrix[0]) != 3:
             return image
@@ -154,6 +525,8 @@ class CameraColorCalibration:
         # 套用色彩矩陣 (BGR 順序)
         correction_matrix = np.array(matrix, dtype=np.float32)
         img_corrected = img_reshaped @ correction_matrix.T
+        if offset is not None and len(offset) == 3:
+            img_corrected += np.array(offset, dtype=np.float32)
         
         # 限制範圍並轉回原格式
         img_corrected = np.clip(img_corrected, 0, 1)
@@ -177,21 +550,10 @@ class CameraColorCalibration:
     
     def _scene_adaptive_correction(self, image: np.ndarray, profile: dict) -> np.ndarray:
         """場景自適應校正"""
-        # 分析圖像特徵
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-        
-        # 檢測天空區域（高亮度、藍色調）
-        sky_mask = (hsv[:, :, 2] > 180) & (hsv[:, :, 0] > 90) & (hsv[:, :, 0] < 130)
-        sky_ratio = np.sum(sky_mask) / (image.shape[0] * image.shape[1])
-        
-        # 檢測植被（綠色調）
-        vegetation_mask = (hsv[:, :, 0] > 35) & (hsv[:, :, 0] < 85) & (hsv[:, :, 1] > 50)
-        vegetation_ratio = np.sum(vegetation_mask) / (image.shape[0] * image.shape[1])
-        
         corrected = image.copy()
         
         # 戶外場景偵測
-        if sky_ratio > 0.2 or vegetation_ratio > 0.3:
+        if self._is_outdoor_scene(image):
             # 戶外場景：增加對比度，輕微降低曝光
             corrected = self._adjust_exposure(corrected, -0.05)
             corrected = self._enhance_contrast(corrected, 1.1)
@@ -328,17 +690,7 @@ class CameraColorCalibration:
         green_ratio = np.sum((hsv[:, :, 0] > 35) & (hsv[:, :, 0] < 85)) / (image.shape[0] * image.shape[1])
         
         # 場景判斷
-        scene_type = "unknown"
-        if blue_ratio > 0.3:
-            scene_type = "outdoor_sky"
-        elif green_ratio > 0.4:
-            scene_type = "outdoor_vegetation"
-        elif brightness < 100:
-            scene_type = "low_light"
-        elif brightness > 200:
-            scene_type = "high_key"
-        else:
-            scene_type = "balanced"
+        scene_type = self.classify_scene(brightness, blue_ratio, green_ratio)
         
         return {
             "brightness": float(brightness),
@@ -346,10 +698,22 @@ class CameraColorCalibration:
             "blue_ratio": float(blue_ratio),
             "green_ratio": float(green_ratio),
             "scene_type": scene_type,
-            "recommended_adjustments": self._get_scene_recommendations(scene_type)
+            "recommended_adjustments": self.get_scene_recommendations(scene_type)
         }
     
-    def _get_scene_recommendations(self, scene_type: str) -> dict:
+    def classify_scene(self, brightness: float, blue_ratio: float, green_ratio: float) -> str:
+        """依亮度與色彩分布判斷場景類型"""
+        if blue_ratio > 0.3:
+            return "outdoor_sky"
+        elif green_ratio > 0.4:
+            return "outdoor_vegetation"
+        elif brightness < 100:
+            return "low_light"
+        elif brightness > 200:
+            return "high_key"
+        return "balanced"
+    
+    def get_scene_recommendations(self, scene_type: str) -> dict:
         """根據場景類型提供調整建議"""
         recommendations = {
             "outdoor_sky": {
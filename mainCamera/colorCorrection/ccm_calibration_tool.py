@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+色卡 CCM 校正工具
+Color-Chart CCM Calibration Tool
+
+拍攝 24 色色卡 (ColorChecker Classic) 後：
+1. 自動偵測色塊 (或以滑鼠 / 參數指定四個角落色塊的中心)
+2. 在縮小後的影像上取樣各色塊平均值 (剔除過曝色塊)
+3. 加權最小平方法求解 3x3 (或含偏移的 3x4) 色彩矩陣與白平衡增益
+4. 回報殘差 ΔE，並寫入 camera_profiles.json 成為新的相機配置
+
+矩陣的套用方式與 CameraColorCalibration 相同 (8-bit BGR / 255 後乘上矩陣)，
+寫入的配置可直接使用；執行中的相機若開啟 watch_profiles 會自動重新載入。
+
+用法:
+    python ccm_calibration_tool.py chart.jpg --name pi_camera_v5647_unit2
+    python ccm_calibration_tool.py chart.jpg --click            # 手動點選四角色塊
+    python ccm_calibration_tool.py chart.jpg --corners 120,80 980,95 975,660 115,650 --offset
+"""
+
+import argparse
+import copy
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from camera_color_calibration import CameraColorCalibration
+
+# ColorChecker Classic 24 色 sRGB 參考值 (D65，由左上角依列排列)
+CHART_PATCHES = [
+    ("dark skin", (115, 82, 68)), ("light skin", (194, 150, 130)), ("blue sky", (98, 122, 157)),
+    ("foliage", (87, 108, 67)), ("blue flower", (133, 128, 177)), ("bluish green", (103, 189, 170)),
+    ("orange", (214, 126, 44)), ("purplish blue", (80, 91, 166)), ("moderate red", (193, 90, 99)),
+    ("purple", (94, 60, 108)), ("yellow green", (157, 188, 64)), ("orange yellow", (224, 163, 46)),
+    ("blue", (56, 61, 150)), ("green", (70, 148, 73)), ("red", (175, 54, 60)),
+    ("yellow", (231, 199, 31)), ("magenta", (187, 86, 149)), ("cyan", (8, 133, 161)),
+    ("white", (243, 243, 242)), ("neutral 8", (200, 200, 200)), ("neutral 6.5", (160, 160, 160)),
+    ("neutral 5", (122, 122, 121)), ("neutral 3.5", (85, 85, 85)), ("black", (52, 52, 52)),
+]
+CHART_COLUMNS, CHART_ROWS = 6, 4
+REFERENCE_BGR = np.array([rgb[::-1] for _, rgb in CHART_PATCHES], dtype=np.float32) / 255.0
+
+# 擬合權重：中性色決定白平衡，膚色對人像最敏感
+PATCH_WEIGHTS = np.ones(24, dtype=np.float32)
+PATCH_WEIGHTS[18:24] = 2.0
+PATCH_WEIGHTS[0:2] = 1.5
+
+
+def delta_e(bgr_a: np.ndarray, bgr_b: np.ndarray) -> np.ndarray:
+    """CIE76 ΔE (輸入為 0-1 的 BGR，形狀 (N, 3))"""
+    lab_a = cv2.cvtColor(np.clip(bgr_a, 0, 1).astype(np.float32)[None], cv2.COLOR_BGR2Lab)[0]
+    lab_b = cv2.cvtColor(np.clip(bgr_b, 0, 1).astype(np.float32)[None], cv2.COLOR_BGR2Lab)[0]
+    return np.sqrt(((lab_a - lab_b) ** 2).sum(axis=1))
+
+
+class ChartDetector:
+    """在縮小的影像上找出 24 個色塊中心"""
+
+    def __init__(self, max_dimension: int = 1000):
+        self.max_dimension = max_dimension
+
+    def decimate(self, image: np.ndarray) -> Tuple[np.ndarray, float]:
+        h, w = image.shape[:2]
+        scale = min(1.0, self.max_dimension / max(h, w))
+        if scale == 1.0:
+            return image, 1.0
+        small = cv2.resize(image, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+        return small, scale
+
+    @staticmethod
+    def centers_from_corners(corners: Sequence[Tuple[float, float]]) -> np.ndarray:
+        """由四個角落色塊 (dark skin、bluish green、black、white) 的中心推算全部色塊中心"""
+        grid = np.float32([[0, 0], [CHART_COLUMNS - 1, 0],
+                           [CHART_COLUMNS - 1, CHART_ROWS - 1], [0, CHART_ROWS - 1]])
+        homography = cv2.getPerspectiveTransform(grid, np.float32(corners))
+        return ChartDetector._project(homography)
+
+    @staticmethod
+    def _project(homography: np.ndarray) -> np.ndarray:
+        cols, rows = np.meshgrid(np.arange(CHART_COLUMNS), np.arange(CHART_ROWS))
+        grid = np.stack([cols.ravel(), rows.ravel()], axis=-1).astype(np.float32)
+        return cv2.perspectiveTransform(grid[None], homography)[0]
+
+    def _candidate_patches(self, small: np.ndarray) -> List[cv2.RotatedRect]:
+        """平坦且近似正方形的區域 (色塊之間有深色間隔)"""
+        blurred = cv2.GaussianBlur(small, (5, 5), 0)
+        edges = np.zeros(small.shape[:2], dtype=np.uint8)
+        for channel in cv2.split(blurred):
+            edges |= cv2.Canny(channel, 20, 60)
+        edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(255 - edges, connectivity=4)
+
+        image_area = small.shape[0] * small.shape[1]
+        patches = []
+        for label in range(1, count):
+            area = stats[label, cv2.CC_STAT_AREA]
+            if not image_area / 3000 < area < image_area / 40:
+                continue
+            points = np.column_stack(np.nonzero(labels[stats[label, 1]:stats[label, 1] + stats[label, 3],
+                                                       stats[label, 0]:stats[label, 0] + stats[label, 2]] == label))
+            points = (points[:, ::-1] + stats[label, :2]).astype(np.float32)
+            rect = cv2.minAreaRect(points)
+            (w, h) = rect[1]
+            if min(w, h) <= 0 or max(w, h) / min(w, h) > 1.4 or area / (w * h) < 0.75:
+                continue
+            patches.append(rect)
+        if not patches:
+            return []
+        # 色塊大小相近：保留面積接近中位數者
+        sizes = np.array([r[1][0] * r[1][1] for r in patches])
+        median = np.median(sizes)
+        return [r for r, s in zip(patches, sizes) if 0.5 * median < s < 2.0 * median]
+
+    def detect(self, small: np.ndarray) -> Optional[List[np.ndarray]]:
+        """
+        自動偵測：回傳兩種可能擺放方向 (相差 180°) 各自的 24 個色塊中心，由呼叫端以擬合殘差選擇；
+        色塊不足時回傳 None
+        """
+        patches = self._candidate_patches(small)
+        if len(patches) < 12:
+            return None
+
+        centers = np.float32([r[0] for r in patches])
+        pitch_hint = np.median([max(r[1]) for r in patches])
+        # 以色塊邊的方向對齊網格 (minAreaRect 角度以 90° 為週期)
+        angles = np.deg2rad([r[2] % 90 for r in patches])
+        angle = np.arctan2(np.mean(np.sin(4 * angles)), np.mean(np.cos(4 * angles))) / 4
+        rotation = np.float32([[np.cos(angle), np.sin(angle)], [-np.sin(angle), np.cos(angle)]])
+        aligned = centers @ rotation.T
+
+        # 相鄰色塊中心的距離即為網格間距
+        distances = np.linalg.norm(aligned[:, None] - aligned[None], axis=-1)
+        distances[distances < pitch_hint * 0.5] = np.inf
+        pitch = float(np.median(distances.min(axis=1)))
+        indices = np.round((aligned - aligned.min(axis=0)) / pitch).astype(np.int32)
+        extent = indices.max(axis=0) + 1
+        if sorted(extent.tolist()) != [CHART_ROWS, CHART_COLUMNS]:
+            return None
+
+        # 網格座標 → 影像座標的單應矩陣 (用已偵測的色塊擬合，補出未偵測到的色塊)
+        if extent[0] == CHART_COLUMNS:
+            grid_of = [lambda i, j: (i, j), lambda i, j: (CHART_COLUMNS - 1 - i, CHART_ROWS - 1 - j)]
+        else:
+            grid_of = [lambda i, j: (j, CHART_ROWS - 1 - i), lambda i, j: (CHART_COLUMNS - 1 - j, i)]
+        layouts = []
+        for mapping in grid_of:
+            grid = np.float32([mapping(i, j) for i, j in indices])
+            homography, _ = cv2.findHomography(grid, centers, cv2.RANSAC, pitch * 0.3)
+            if homography is not None:
+                layouts.append(self._project(homography))
+        return layouts or None
+
+
+class CCMCalibrator:
+    """色塊取樣與加權最小平方擬合"""
+
+    def __init__(self, use_offset: bool = False, sample_fraction: float = 0.4,
+                 clip_level: int = 250):
+        """
+        Args:
+            use_offset: 求解 3x4 (含偏移) 矩陣，可補償鏡頭眩光造成的黑位抬升
+            sample_fraction: 取樣方塊邊長相對於色塊間距的比例
+            clip_level: 超過此值的像素視為過曝
+        """
+        self.use_offset = use_offset
+        self.sample_fraction = sample_fraction
+        self.clip_level = clip_level
+
+    def sample(self, small: np.ndarray, centers: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """各色塊中央方塊的中位數 (0-1 BGR) 與權重 (過曝或超出畫面為 0)"""
+        pitch = np.median(np.linalg.norm(np.diff(centers.reshape(CHART_ROWS, CHART_COLUMNS, 2), axis=1), axis=-1))
+        half = max(1, int(pitch * self.sample_fraction / 2))
+        h, w = small.shape[:2]
+        values = np.zeros((24, 3), dtype=np.float32)
+        weights = PATCH_WEIGHTS.copy()
+        for index, (x, y) in enumerate(centers):
+            x0, y0 = int(round(x)) - half, int(round(y)) - half
+            if x0 < 0 or y0 < 0 or x0 + 2 * half >= w or y0 + 2 * half >= h:
+                weights[index] = 0
+                continue
+            block = small[y0:y0 + 2 * half + 1, x0:x0 + 2 * half + 1, :3].reshape(-1, 3)
+            values[index] = np.median(block, axis=0) / 255.0
+            if (block.max(axis=1) >= self.clip_level).mean() > 0.2:
+                weights[index] = 0
+        return values, weights
+
+    def fit(self, measured: np.ndarray, weights: np.ndarray) -> Dict:
+        """
+        求解 out = W · (CCM · x + offset)，W 為由中性色塊估計的白平衡對角矩陣
+
+        Returns:
+            {ccm (3x3, BGR), offset (3, 或 None), wb_gains (R, G, B), predicted, delta_e}
+        """
+        used = weights > 0
+        if used.sum() < (12 if self.use_offset else 9):
+            raise ValueError(f"可用色塊不足: {int(used.sum())}")
+
+        x = measured[used]
+        if self.use_offset:
+            x = np.hstack([x, np.ones((x.shape[0], 1), dtype=np.float32)])
+        sqrt_w = np.sqrt(weights[used])[:, None]
+        combined, *_ = np.linalg.lstsq(x * sqrt_w, REFERENCE_BGR[used] * sqrt_w, rcond=None)
+        combined = combined.T  # (3, 3) 或 (3, 4)，BGR
+
+        # 白平衡：中性色塊的參考值 / 量測值 (以綠色為 1)，其餘差異留在 CCM
+        neutral = used & (np.arange(24) >= 18)
+        if neutral.any():
+            ratio = REFERENCE_BGR[neutral].sum(axis=0) / np.maximum(measured[neutral].sum(axis=0), 1e-6)
+            wb_bgr = ratio / ratio[1]
+        else:
+            wb_bgr = np.ones(3, dtype=np.float32)
+        local = combined / wb_bgr[:, None]
+
+        full = measured if not self.use_offset else np.hstack([measured, np.ones((24, 1), np.float32)])
+        predicted = full @ combined.T
+        return {
+            "ccm": local[:, :3],
+            "offset": local[:, 3] if self.use_offset else None,
+            "wb_gains": wb_bgr[::-1],
+            "predicted": predicted,
+            "delta_e": delta_e(predicted, REFERENCE_BGR),
+            "used": used,
+        }
+
+
+def pick_corners(small: np.ndarray) -> Optional[List[Tuple[float, float]]]:
+    """以滑鼠依序點選 dark skin、bluish green、black、white 四個色塊的中心"""
+    names = ["dark skin (左上)", "bluish green (右上)", "black (右下)", "white (左下)"]
+    corners: List[Tuple[float, float]] = []
+    window = "CCM 校正：點選四角色塊中心 (Esc 取消)"
+
+    def on_mouse(event, x, y, flags, param):
+        if event == cv2.EVENT_LBUTTONDOWN and len(corners) < 4:
+            corners.append((float(x), float(y)))
+
+    cv2.namedWindow(window)
+    cv2.setMouseCallback(window, on_mouse)
+    while len(corners) < 4:
+        display = small.copy()
+        for point in corners:
+            cv2.circle(display, (int(point[0]), int(point[1])), 6, (0, 0, 255), 2)
+        cv2.putText(display, f"click: {names[len(corners)].split()[0]}", (10, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
+        cv2.imshow(window, display)
+        if cv2.waitKey(20) == 27:
+            corners = []
+            break
+    cv2.destroyWindow(window)
+    return corners or None
+
+
+def calibrate(image: np.ndarray, corners: Optional[Sequence[Tuple[float, float]]] = None,
+              use_offset: bool = False, max_dimension: int = 1000) -> Dict:
+    """
+    由色卡照片求解色彩矩陣
+
+    Args:
+        image: 色卡照片 (BGR uint8，與 CameraColorCalibration 的輸入相同)
+        corners: 原圖座標的四角色塊中心；None 時自動偵測
+    """
+    start = time.perf_counter()
+    detector = ChartDetector(max_dimension)
+    small, scale = detector.decimate(image)
+    calibrator = CCMCalibrator(use_offset)
+
+    if corners is not None:
+        layouts = [detector.centers_from_corners([(x * scale, y * scale) for x, y in corners])]
+    else:
+        layouts = detector.detect(small)
+        if not layouts:
+            raise RuntimeError("找不到色卡，請改用 --click 或 --corners 指定四角")
+
+    # 擺放方向不確定時，以擬合殘差最小者為準
+    best = None
+    for centers in layouts:
+        measured, weights = calibrator.sample(small, centers)
+        try:
+            result = calibrator.fit(measured, weights)
+        except ValueError:
+            continue
+        score = float(np.average(result["delta_e"], weights=np.maximum(weights, 1e-6)))
+        if best is None or score < best[0]:
+            best = (score, result, centers)
+    if best is None:
+        raise RuntimeError("色塊取樣失敗 (過曝或超出畫面)")
+
+    _, result, centers = best
+    result["centers"] = centers / scale
+    result["elapsed"] = time.perf_counter() - start
+    return result
+
+
+def build_profile(result: Dict, base: Dict, name: str) -> Dict:
+    """以既有配置為範本建立新配置 (只替換矩陣與白平衡)"""
+    profile = copy.deepcopy(base)
+    profile["name"] = name
+    profile["color_correction_matrix"] = np.round(result["ccm"], 4).tolist()
+    profile["white_balance_gains"] = np.round(result["wb_gains"], 4).tolist()
+    if result["offset"] is not None:
+        profile["color_correction_offset"] = np.round(result["offset"], 4).tolist()
+    else:
+        profile.pop("color_correction_offset", None)
+    used = result["used"]
+    profile["calibration"] = {
+        "chart": "ColorChecker Classic 24",
+        "date": time.strftime("%Y-%m-%d"),
+        "delta_e_mean": round(float(result["delta_e"][used].mean()), 2),
+        "delta_e_max": round(float(result["delta_e"][used].max()), 2),
+        "patches_used": int(used.sum()),
+    }
+    return profile
+
+
+def print_report(result: Dict):
+    used = result["used"]
+    errors = result["delta_e"]
+    print(f"🎯 擬合完成 ({result['elapsed'] * 1000:.0f} ms，使用 {int(used.sum())}/24 色塊)")
+    print(f"   ΔE 平均 {errors[used].mean():.2f}，最大 {errors[used].max():.2f}")
+    for index in np.argsort(-np.where(used, errors, -1))[:5]:
+        print(f"   {CHART_PATCHES[index][0]:>14}: ΔE {errors[index]:.2f}")
+    print(f"   CCM (BGR): {np.round(result['ccm'], 3).tolist()}")
+    print(f"   白平衡 (R, G, B): {np.round(result['wb_gains'], 3).tolist()}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="由 24 色色卡照片求解相機色彩矩陣並寫入 camera_profiles.json")
+    parser.add_argument('image', help="色卡照片 (JPEG / PNG)")
+    parser.add_argument('--name', help="新配置名稱 (寫入 camera_profiles.json 的鍵)")
+    parser.add_argument('--base', default="pi_camera_v5647", help="作為範本的既有配置")
+    parser.add_argument('--offset', action='store_true', help="求解含偏移的 3x4 矩陣")
+    parser.add_argument('--click', action='store_true', help="以滑鼠點選四角色塊")
+    parser.add_argument('--corners', nargs=4, metavar="X,Y",
+                        help="四角色塊中心 (dark skin、bluish green、black、white)")
+    args = parser.parse_args(argv)
+
+    image = cv2.imread(args.image)
+    if image is None:
+        print(f"❌ 無法載入圖像: {args.image}")
+        return 1
+
+    corners = None
+    if args.corners:
+        corners = [tuple(float(v) for v in corner.split(",")) for corner in args.corners]
+    elif args.click:
+        small, scale = ChartDetector().decimate(image)
+        picked = pick_corners(small)
+        if picked is None:
+            return 1
+        corners = [(x / scale, y / scale) for x, y in picked]
+
+    try:
+        result = calibrate(image, corners, use_offset=args.offset)
+    except (RuntimeError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+    print_report(result)
+
+    if args.name:
+        calibration = CameraColorCalibration()
+        if args.base not in calibration.camera_profiles:
+            print(f"❌ 找不到範本配置: {args.base}")
+            return 1
+        profiles = json.loads(Path(calibration.config_path).read_text(encoding='utf-8')) \
+            if Path(calibration.config_path).exists() else {}
+        profiles[args.name] = build_profile(result, calibration.camera_profiles[args.base], args.name)
+        calibration.camera_profiles = profiles
+        calibration.save_camera_profiles()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
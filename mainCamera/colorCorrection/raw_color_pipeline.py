@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+RAW 域色彩校正
+Raw-Domain Color Pipeline
+
+白平衡與色彩矩陣應在線性感光元件資料上套用，而不是 8-bit gamma 編碼後的 BGR：
+- 解開 picamera2 的 Bayer 緩衝區 (SGBRG10 / SRGGB12 等，打包 CSI2P 或未打包)
+- 扣除黑電平後，直接在 Bayer 資料上依 CFA 位置乘上 R / B 增益 (去馬賽克之前)
+- 16-bit 去馬賽克，CCM 以 float32 在線性 RGB 上套用
+- 最後只量化一次：輸出 16-bit 線性或經 sRGB 編碼的 8-bit BGR
+
+增益與 CCM 預設取自 capture_request 的 metadata (ColourGains、ColourCorrectionMatrix)，
+與 ISP 使用相同的調校值。
+"""
+
+from typing import Dict, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# 感光元件 Bayer 排列 → OpenCV 去馬賽克代碼 (OpenCV 以第二列第二、三個像素命名)
+_DEMOSAIC_CODES = {
+    "RGGB": cv2.COLOR_BayerBG2BGR,
+    "GRBG": cv2.COLOR_BayerGB2BGR,
+    "GBRG": cv2.COLOR_BayerGR2BGR,
+    "BGGR": cv2.COLOR_BayerRG2BGR,
+}
+# 2x2 區塊內 R、B 的位置 (列, 行)
+_RED_BLUE_SITES = {
+    "RGGB": ((0, 0), (1, 1)),
+    "GRBG": ((0, 1), (1, 0)),
+    "GBRG": ((1, 0), (0, 1)),
+    "BGGR": ((1, 1), (0, 0)),
+}
+
+
+def parse_raw_format(fmt: str) -> Tuple[str, int, bool]:
+    """'SGBRG10_CSI2P' → ('GBRG', 10, True)"""
+    name = fmt.upper()
+    if not name.startswith("S") or name[1:5] not in _DEMOSAIC_CODES:
+        raise ValueError(f"不支援的 RAW 格式: {fmt}")
+    digits = "".join(ch for ch in name[5:].split("_")[0] if ch.isdigit())
+    return name[1:5], int(digits or 16), name.endswith("_CSI2P")
+
+
+def unpack_bayer(array: np.ndarray, fmt: str, width: int) -> np.ndarray:
+    """
+    將 picamera2 的 raw 緩衝區 (h, stride) uint8 解為 (h, width) uint16
+
+    - 未打包：每像素 2 bytes (little endian)
+    - 10-bit CSI2P：每 5 bytes 4 像素，前 4 bytes 為高 8 位元，第 5 byte 為各像素的低 2 位元
+    - 12-bit CSI2P：每 3 bytes 2 像素，第 3 byte 為兩像素的低 4 位元
+    """
+    _, bits, packed = parse_raw_format(fmt)
+    if array.dtype == np.uint16:
+        return array[:, :width]
+    if not packed:
+        return np.ascontiguousarray(array[:, :width * 2]).view(np.uint16)
+
+    h = array.shape[0]
+    if bits == 10:
+        groups = array[:, :width * 5 // 4].reshape(h, width // 4, 5)
+        high = groups[:, :, :4].astype(np.uint16) << 2
+        low = (groups[:, :, 4:5] >> np.array([0, 2, 4, 6], dtype=np.uint8)) & 0x3
+        return (high | low).reshape(h, width)
+    if bits == 12:
+        groups = array[:, :width * 3 // 2].reshape(h, width // 2, 3)
+        high = groups[:, :, :2].astype(np.uint16) << 4
+        low = (groups[:, :, 2:3] >> np.array([0, 4], dtype=np.uint8)) & 0xF
+        return (high | low).reshape(h, width)
+    raise ValueError(f"不支援的打包位元深度: {bits}")
+
+
+def _srgb_encode_table() -> np.ndarray:
+    """16-bit 線性 → 8-bit sRGB 查表 (65536 項，整張影像只需一次查表)"""
+    linear = np.arange(65536, dtype=np.float64) / 65535.0
+    encoded = np.where(linear <= 0.0031308, linear * 12.92, 1.055 * linear ** (1 / 2.4) - 0.055)
+    return np.clip(encoded * 255.0 + 0.5, 0, 255).astype(np.uint8)
+
+
+class RawColorPipeline:
+    """Bayer 域白平衡 + 16-bit 去馬賽克 + 線性 CCM"""
+
+    _encode_table: Optional[np.ndarray] = None
+
+    def __init__(self, fmt: str = "SGBRG10", colour_gains: Tuple[float, float] = (1.0, 1.0),
+                 ccm_rgb: Optional[Sequence[Sequence[float]]] = None,
+                 black_level: Optional[float] = None, white_level: Optional[float] = None):
+        """
+        Args:
+            fmt: picamera2 的 raw 格式 (例如 SGBRG10、SGBRG10_CSI2P)
+            colour_gains: (R, B) 白平衡增益，與 picamera2 ColourGains 相同
+            ccm_rgb: 線性 RGB 的 3x3 色彩矩陣 (與 ColourCorrectionMatrix 相同，RGB 順序)
+            black_level / white_level: 感光元件數值範圍 (預設黑電平為滿刻度的 1/16)
+        """
+        self.pattern, self.bits, self.packed = parse_raw_format(fmt)
+        self.fmt = fmt
+        self.colour_gains = tuple(float(g) for g in colour_gains)
+        self.white_level = float(white_level if white_level is not None else (1 << self.bits) - 1)
+        self.black_level = float(black_level if black_level is not None else 1 << (self.bits - 4))
+        ccm = np.eye(3, dtype=np.float32) if ccm_rgb is None else np.array(ccm_rgb, dtype=np.float32)
+        # RGB 矩陣轉為作用在 BGR 上：反轉列與行的順序
+        self.ccm_bgr = np.ascontiguousarray(ccm.reshape(3, 3)[::-1, ::-1])
+
+    @classmethod
+    def from_metadata(cls, fmt: str, metadata: Dict, **overrides) -> "RawColorPipeline":
+        """以 capture_request 的 metadata 建立 (增益、CCM、黑電平與 ISP 一致)"""
+        _, bits, _ = parse_raw_format(fmt)
+        params = {
+            "colour_gains": metadata.get("ColourGains", (1.0, 1.0)),
+            "ccm_rgb": metadata.get("ColourCorrectionMatrix"),
+        }
+        levels = metadata.get("SensorBlackLevels")
+        if levels:
+            # metadata 的黑電平以 16-bit 為刻度
+            params["black_level"] = float(np.mean(levels)) / (1 << (16 - bits))
+        params.update(overrides)
+        return cls(fmt, **params)
+
+    # === Bayer 域 ===
+
+    def apply_cfa_gains(self, bayer: np.ndarray) -> np.ndarray:
+        """扣除黑電平並依 CFA 位置乘上白平衡增益，輸出 16-bit 滿刻度 (去馬賽克之前)"""
+        scale = 65535.0 / (self.white_level - self.black_level)
+        gains = np.full((2, 2), scale, dtype=np.float32)
+        (ry, rx), (by, bx) = _RED_BLUE_SITES[self.pattern]
+        gains[ry, rx] *= self.colour_gains[0]
+        gains[by, bx] *= self.colour_gains[1]
+
+        h, w = bayer.shape
+        out = np.empty((h, w), dtype=np.uint16)
+        work = np.empty((h // 2, w // 2), dtype=np.float32)
+        for dy in (0, 1):
+            for dx in (0, 1):
+                np.subtract(bayer[dy::2, dx::2], self.black_level, out=work, casting="unsafe")
+                work *= gains[dy, dx]
+                work += 0.5
+                np.clip(work, 0, 65535, out=work)
+                out[dy::2, dx::2] = work
+        return out
+
+    # === 線性 RGB ===
+
+    def develop_linear(self, bayer: np.ndarray) -> np.ndarray:
+        """Bayer (uint16) → 線性 BGR float32 (0-1，已套用白平衡與 CCM)"""
+        balanced = self.apply_cfa_gains(bayer)
+        rgb16 = cv2.cvtColor(balanced, _DEMOSAIC_CODES[self.pattern])
+        linear = cv2.transform(rgb16.astype(np.float32), self.ccm_bgr * np.float32(1.0 / 65535.0))
+        return np.clip(linear, 0.0, 1.0, out=linear)
+
+    def develop(self, array: np.ndarray, width: Optional[int] = None, output: str = "srgb8") -> np.ndarray:
+        """
+        由 raw 緩衝區沖洗
+
+        Args:
+            array: make_array("raw") 的結果 (uint8 緩衝區或已解開的 uint16)
+            width: 影像寬度 (緩衝區含 stride 補齊時必須提供)
+            output: "srgb8" (sRGB 編碼 8-bit BGR) 或 "linear16" (16-bit 線性 BGR)
+        """
+        width = width or (array.shape[1] if array.dtype == np.uint16 else None)
+        if width is None:
+            raise ValueError("uint8 緩衝區需提供影像寬度")
+        linear = self.develop_linear(unpack_bayer(array, self.fmt, width))
+        linear *= 65535.0
+        linear += 0.5
+        linear16 = linear.astype(np.uint16)
+        if output == "linear16":
+            return linear16
+        if RawColorPipeline._encode_table is None:
+            RawColorPipeline._encode_table = _srgb_encode_table()
+        return RawColorPipeline._encode_table[linear16]
+
+
+if __name__ == "__main__":
+    import time
+
+    # 合成 SGBRG10 打包緩衝區的往返測試
+    rng = np.random.default_rng(0)
+    h, w = 1944, 2592
+    bayer = rng.integers(64, 1023, (h, w), dtype=np.uint16)
+    groups = bayer.reshape(h, w // 4, 4)
+    packed = np.empty((h, w // 4, 5), dtype=np.uint8)
+    packed[:, :, :4] = groups >> 2
+    packed[:, :, 4] = ((groups & 3) << np.array([0, 2, 4, 6], dtype=np.uint16)).sum(axis=2)
+    packed = packed.reshape(h, w * 5 // 4)
+    assert np.array_equal(unpack_bayer(packed, "SGBRG10_CSI2P", w), bayer)
+
+    pipeline = RawColorPipeline("SGBRG10_CSI2P", colour_gains=(1.8, 1.5))
+    start = time.perf_counter()
+    result = pipeline.develop(packed, w)
+    print(f"RAW 沖洗 {w}x{h}: {(time.perf_counter() - start) * 1000:.0f} ms, {result.shape} {result.dtype}")
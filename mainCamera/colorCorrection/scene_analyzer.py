@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+串流場景分析
+Streaming Scene Analyzer
+
+即時預覽用的場景分析，取代逐幀重新判斷天空 / 植被：
+- 每 N 幀取樣一次，先以步進抽樣再縮成約 96 像素寬的小圖分析
+- 統計值 (亮度、天空 / 植被比例…) 以指數移動平均平滑
+- 場景類型需連續數次取樣一致才切換 (遲滯)，戶外判斷的進出門檻不同
+- 戶外調整強度與曝光補償逐步趨近目標，校正不會在幀間跳動
+
+發布的參數可直接傳給 CameraColorCalibration.apply_color_correction(scene_params=...)。
+"""
+
+import threading
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from camera_color_calibration import CameraColorCalibration
+
+_STAT_KEYS = ("brightness", "saturation", "blue_ratio", "green_ratio", "sky_ratio", "vegetation_ratio")
+
+
+class StreamingSceneAnalyzer:
+    """低頻取樣 + 平滑統計 + 遲滯的場景分析器"""
+
+    def __init__(self, calibration: CameraColorCalibration, sample_every: int = 5,
+                 analysis_width: int = 96, smoothing: float = 0.25, hold_samples: int = 3,
+                 outdoor_margin: float = 0.05, outdoor_ramp: float = 0.25,
+                 exposure_strength: float = 1.0):
+        """
+        Args:
+            calibration: 提供色彩矩陣與場景判斷規則的校正系統
+            sample_every: 每幾幀分析一次
+            analysis_width: 分析小圖的寬度 (像素)
+            smoothing: 統計值的指數平滑係數 (越小越穩定)
+            hold_samples: 新場景類型需連續出現的取樣次數
+            outdoor_margin: 離開戶外判斷時門檻降低的幅度
+            outdoor_ramp: 每次取樣戶外調整強度最多變化的量
+            exposure_strength: 場景建議曝光補償的套用比例 (0 = 不調整曝光)
+        """
+        self.calibration = calibration
+        self.sample_every = max(1, sample_every)
+        self.analysis_width = analysis_width
+        self.smoothing = smoothing
+        self.hold_samples = max(1, hold_samples)
+        self.outdoor_margin = outdoor_margin
+        self.outdoor_ramp = outdoor_ramp
+        self.exposure_strength = exposure_strength
+        self._listeners: List[Callable[[Dict], None]] = []
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self._frame_index = 0
+        self._stats: Optional[Dict[str, float]] = None
+        self._scene_type = "balanced"
+        self._pending_type = None
+        self._pending_count = 0
+        self._outdoor = False
+        self._outdoor_strength = 0.0
+        self._exposure_ev = 0.0
+        self.current: Dict = self._snapshot()
+
+    def subscribe(self, callback: Callable[[Dict], None]):
+        """註冊參數更新回呼 (僅在發布的參數改變時呼叫)"""
+        self._listeners.append(callback)
+
+    # === 逐幀入口 ===
+
+    def update(self, frame: np.ndarray) -> Dict:
+        """每幀呼叫；非取樣幀只累加計數，直接回傳目前參數"""
+        self._frame_index += 1
+        if (self._frame_index - 1) % self.sample_every != 0:
+            return self.current
+        with self._lock:
+            self._sample(frame)
+            previous, self.current = self.current, self._snapshot()
+        if self._changed(previous, self.current):
+            for callback in self._listeners:
+                callback(self.current)
+        return self.current
+
+    # === 分析 ===
+
+    def _small(self, frame: np.ndarray) -> np.ndarray:
+        """步進抽樣後縮圖，成本與小圖尺寸成正比"""
+        h, w = frame.shape[:2]
+        step = max(1, w // (self.analysis_width * 2))
+        sampled = frame[::step, ::step, :3]
+        sh, sw = sampled.shape[:2]
+        size = (self.analysis_width, max(1, int(round(sh * self.analysis_width / sw))))
+        small = cv2.resize(sampled, size, interpolation=cv2.INTER_AREA)
+        # 與 apply_color_correction 相同：在色彩矩陣校正後判斷
+        return cv2.transform(small, self.calibration.compile_profile().matrix)
+
+    def _sample(self, frame: np.ndarray):
+        small = self._small(frame)
+        analysis = self.calibration.analyze_image_characteristics(small)
+        sky_ratio, vegetation_ratio = self.calibration.outdoor_ratios(small)
+        measured = {key: analysis.get(key, 0.0) for key in _STAT_KEYS[:4]}
+        measured.update(sky_ratio=sky_ratio, vegetation_ratio=vegetation_ratio)
+
+        if self._stats is None:
+            self._stats = measured
+        else:
+            for key, value in measured.items():
+                self._stats[key] += self.smoothing * (value - self._stats[key])
+        stats = self._stats
+
+        # 場景類型遲滯：候選類型需連續 hold_samples 次一致
+        candidate = self.calibration.classify_scene(stats["brightness"], stats["blue_ratio"],
+                                                     stats["green_ratio"])
+        if candidate == self._scene_type:
+            self._pending_type, self._pending_count = None, 0
+        elif candidate == self._pending_type:
+            self._pending_count += 1
+        else:
+            self._pending_type, self._pending_count = candidate, 1
+        if self._pending_type is not None and self._pending_count >= self.hold_samples:
+            self._scene_type, self._pending_type, self._pending_count = candidate, None, 0
+
+        # 戶外判斷：進入與離開使用不同門檻
+        margin = self.outdoor_margin if self._outdoor else 0.0
+        self._outdoor = stats["sky_ratio"] > 0.2 - margin or stats["vegetation_ratio"] > 0.3 - margin
+
+        # 校正參數逐步趨近目標
+        target = 1.0 if self._outdoor else 0.0
+        self._outdoor_strength += float(np.clip(target - self._outdoor_strength,
+                                                -self.outdoor_ramp, self.outdoor_ramp))
+        recommendation = self.calibration.get_scene_recommendations(self._scene_type)
+        target_ev = recommendation.get("exposure_compensation", 0.0) * self.exposure_strength
+        self._exposure_ev += self.smoothing * (target_ev - self._exposure_ev)
+
+    def _snapshot(self) -> Dict:
+        """不可變的參數快照 (以整個 dict 替換發布，讀取端不需加鎖)"""
+        return {
+            "scene_type": self._scene_type,
+            "outdoor": round(self._outdoor_strength, 3),
+            "exposure_ev": round(self._exposure_ev, 3),
+            "statistics": dict(self._stats or {}),
+            "recommended_adjustments": self.calibration.get_scene_recommendations(self._scene_type),
+        }
+
+    @staticmethod
+    def _changed(previous: Dict, current: Dict) -> bool:
+        return any(previous[key] != current[key] for key in ("scene_type", "outdoor", "exposure_ev"))
+
+
+if __name__ == "__main__":
+    import time
+
+    calibration = CameraColorCalibration()
+    analyzer = StreamingSceneAnalyzer(calibration)
+    analyzer.subscribe(lambda params: print(f"📡 {params['scene_type']} 戶外 {params['outdoor']:.2f} "
+                                            f"EV {params['exposure_ev']:+.3f}"))
+
+    indoor = np.full((1080, 1920, 3), 120, dtype=np.uint8)
+    sky = indoor.copy()
+    sky[:600] = (230, 170, 90)  # BGR 藍天
+    start = time.perf_counter()
+    for i in range(120):
+        analyzer.update(sky if 30 <= i < 90 else indoor)
+    print(f"平均每幀 {(time.perf_counter() - start) / 120 * 1000:.3f} ms")
@@ -6,10 +6,66 @@ Pi Camera V5647 色彩校正 + 軟片模擬整合測試
 import cv2
 import numpy as np
 import os
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'filter'))
 from enhanced_film_simulation import EnhancedFilmSimulation
+from ccm_calibration_tool import delta_e
+
+# 快速路徑 vs 參考實作的容許誤差 (平均 ΔE 上限, 最大 ΔE 上限, PSNR 下限)，約為實測值加一成餘裕
+# 最大 ΔE 超過預設值的軟片都來自參考實作中的硬門檻：門檻兩側的輸出不連續，
+# 跨越門檻的 LUT 網格只能內插，誤差集中在門檻附近少數高飽和像素，加密網格也不會降低最大值
+# 依畫面平均值調整的軟片 (MEAN_DEPENDENT_SIMULATIONS) 不烘焙 LUT，不在此列
+LOOK_TOLERANCES = {
+    "default": (1.5, 8.0, 42.0),
+    # 綠 (H 40-80) / 藍 (H 100-130) 遮罩在 ×1.4 之上再把飽和度 ×1.2
+    "VELVIA": (2.0, 24.0, 40.0),
+    # 紅色遮罩 (H ≤ 20 或 ≥ 160) 飽和度 ×1.2；Kodachrome 25 以 64 為基底
+    "KODACHROME_64": (2.0, 14.5, 40.0),
+    "KODACHROME_25": (2.0, 14.5, 40.0),
+    # 膚色遮罩 (H 8-25) 降低飽和度並提亮；160 / 800 以 400 為基底
+    "KODAK_PORTRA_400": (1.5, 9.0, 38.0),
+    "KODAK_PORTRA_160": (1.5, 9.0, 38.0),
+    "KODAK_PORTRA_800": (1.5, 9.0, 38.0),
+    # 色相 ×0.96 + 3 在紅色 H 179 / 0 的環繞處不連續
+    "KODAK_GOLD_200": (1.5, 17.5, 43.5),
+    # 綠 / 藍遮罩飽和度 ×1.15
+    "KODAK_EKTAR_100": (2.0, 12.5, 42.0),
+    # 藍色遮罩 (H 100-130) 飽和度 ×1.3
+    "PACIFIC_BLUES": (1.5, 22.0, 38.0),
+    # 分離色調後飽和度 ×1.5，截斷處的折點
+    "CROSS_PROCESS": (1.5, 9.0, 40.5),
+}
+# YUV420 路徑與逐像素處理 YUV420 的結果比較：同樣的門檻之外，YUV LUT 多一次網格內插
+YUV_TOLERANCES = {
+    "default": (1.5, 8.0, 40.5),
+    "VELVIA": (2.5, 28.0, 34.0),
+    "KODACHROME_64": (2.0, 11.0, 36.5),
+    "KODACHROME_25": (2.0, 11.0, 36.5),
+    "KODAK_PORTRA_400": (1.5, 8.0, 36.5),
+    "KODAK_PORTRA_160": (1.5, 8.0, 36.5),
+    "KODAK_PORTRA_800": (1.5, 8.0, 36.5),
+    "KODAK_GOLD_200": (1.5, 17.5, 41.5),
+    "KODAK_EKTAR_100": (2.25, 18.5, 35.0),
+    "PACIFIC_BLUES": (1.5, 18.5, 39.5),
+    "CROSS_PROCESS": (2.0, 13.5, 36.0),
+    # 以 R 通道為主混合灰階再套高對比曲線，色度誤差被放大到亮度
+    "INFRARED_BW": (1.5, 13.5, 37.0),
+}
+# 參考實作每一步都量化回 uint8，編譯後只量化一次
+CALIBRATION_TOLERANCES = {
+    "color_matrix": (1.0, 3.0, 45.0),
+    # 最大值來自 _correct_sky_blue：H 100-130、S > 50、V > 150 的天空色相 ×0.95
+    "tone": (1.5, 24.5, 41.5),
+    "tone_outdoor": (1.5, 23.5, 41.5),
+    # 同上，再加上矩陣後的量化差異
+    "full": (2.0, 29.0, 39.0),
+}
 
-def create_test_image() -> np.ndarray:
-    """創建戶外場景測試圖像"""
+def create_test_image(seed: Optional[int] = None) -> np.ndarray:
+    """創建戶外場景測試圖像 (指定 seed 時雜訊固定，供一致性測試使用)"""
     # 創建一個模擬戶外場景的測試圖像
     img = np.zeros((400, 600, 3), dtype=np.uint8)
     
@@ -28,11 +84,183 @@ def create_test_image() -> np.ndarray:
     img[280:320, 220:260] = [140, 170, 200]  # 膚色
     
     # 添加一些噪音，模擬 Pi Camera 特性
-    noise = np.random.normal(0, 5, img.shape).astype(np.int16)
+    noise = np.random.default_rng(seed).normal(0, 5, img.shape).astype(np.int16)
     img = np.clip(img.astype(np.int16) + noise, 0, 255).astype(np.uint8)
     
     return img
 
+def create_parity_image_set(seed: int = 0) -> Dict[str, np.ndarray]:
+    """一致性測試用的固定合成影像組"""
+    outdoor = create_test_image(seed)
+    
+    # 色相 × 飽和度掃描：涵蓋 HSV 遮罩邊界與 LUT 網格之間的顏色
+    hue = np.tile(np.linspace(0, 179, 384, dtype=np.float32), (256, 1))
+    sat = np.repeat(np.linspace(0, 255, 256, dtype=np.float32)[:, None], 384, axis=1)
+    hsv = np.dstack([hue, sat, np.full_like(hue, 200)]).astype(np.uint8)
+    hue_sweep = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+    
+    # 中性灰階：檢查色調曲線
+    gray_ramp = np.repeat(np.tile(np.arange(256, dtype=np.uint8), (64, 1))[:, :, None], 3, axis=2)
+    
+    # 低光場景：暗部量化誤差最明顯
+    low_light = (outdoor.astype(np.float32) * 0.25).astype(np.uint8)
+    
+    return {"outdoor": outdoor, "hue_sweep": hue_sweep, "gray_ramp": gray_ramp, "low_light": low_light}
+
+def compare_images(reference: np.ndarray, fast: np.ndarray) -> Dict[str, float]:
+    """平均 / 最大 ΔE (CIE76) 與 PSNR"""
+    if reference.ndim == 2:
+        reference = cv2.cvtColor(reference, cv2.COLOR_GRAY2BGR)
+    if fast.ndim == 2:
+        fast = cv2.cvtColor(fast, cv2.COLOR_GRAY2BGR)
+    errors = delta_e(reference.reshape(-1, 3) / 255.0, fast.reshape(-1, 3) / 255.0)
+    return {"mean_de": float(errors.mean()), "max_de": float(errors.max()),
+            "psnr": float(cv2.PSNR(reference, fast))}
+
+def _timed(func: Callable[[], np.ndarray]) -> Tuple[np.ndarray, float]:
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+def parity_case(name: str, images: Dict[str, np.ndarray],
+                reference: Callable[[np.ndarray], np.ndarray],
+                fast: Callable[[np.ndarray], np.ndarray],
+                tolerance: Tuple[float, float, float]) -> Dict:
+    """在整組影像上比較參考實作與快速路徑，回傳最差的誤差與總加速比
+    
+    通過與否只看 ΔE 與 PSNR (tolerance = 平均 ΔE 上限, 最大 ΔE 上限, PSNR 下限)；
+    加速比只供報告與 check_speedups 使用，計時誤差不影響測試結果。
+    """
+    report = {"name": name, "mean_de": 0.0, "max_de": 0.0, "psnr": float("inf"),
+              "tolerance": tolerance}
+    reference_time = fast_time = 0.0
+    for image in images.values():
+        fast(image)  # 預熱 (LUT 烘焙 / 編譯不計入)
+        expected, elapsed = _timed(lambda: reference(image))
+        reference_time += elapsed
+        actual, elapsed = _timed(lambda: fast(image))
+        fast_time += elapsed
+        metrics = compare_images(expected, actual)
+        report["mean_de"] = max(report["mean_de"], metrics["mean_de"])
+        report["max_de"] = max(report["max_de"], metrics["max_de"])
+        report["psnr"] = min(report["psnr"], metrics["psnr"])
+    report["speedup"] = reference_time / max(fast_time, 1e-9)
+    report["passed"] = (report["mean_de"] <= tolerance[0] and report["max_de"] <= tolerance[1]
+                        and report["psnr"] >= tolerance[2])
+    return report
+
+def film_look_parity(film_sim: EnhancedFilmSimulation, images: Dict[str, np.ndarray],
+                     looks: Optional[List[str]] = None) -> List[Dict]:
+    """每種可烘焙的軟片：apply_simulation_per_pixel vs 烘焙 3D LUT
+    
+    BGR LUT 只供 compile_look 混合軟片使用，沒有呼叫端以它取代逐像素計算，不列入 check_speedups。
+    """
+    results = []
+    for simulation in looks or list(film_sim.simulations.keys()):
+        if not film_sim.lut_supported(simulation):
+            continue
+        lut = film_sim.bake_lut(simulation)
+        tolerance = LOOK_TOLERANCES.get(simulation, LOOK_TOLERANCES["default"])
+        results.append(parity_case(f"LUT {simulation}", images,
+                                   lambda img, s=simulation: film_sim.apply_simulation_per_pixel(img, s),
+                                   lut.apply, tolerance))
+    return results
+
+def yuv_look_parity(film_sim: EnhancedFilmSimulation, images: Dict[str, np.ndarray],
+                    looks: Optional[List[str]] = None) -> List[Dict]:
+    """每種可烘焙的軟片：逐像素處理 YUV420 (解碼 → 軟片 → 編碼) vs YUV LUT
+    
+    參考與快速路徑的輸入輸出都是 YUV420，色度取樣的誤差不計入；
+    依畫面平均值調整的軟片沒有 LUT 路徑，不列入。
+    """
+    # OpenCV 的 I420 轉換為 BT.601 有限範圍
+    planes = {name: cv2.cvtColor(image[:image.shape[0] // 2 * 2, :image.shape[1] // 2 * 2],
+                                 cv2.COLOR_BGR2YUV_I420)
+              for name, image in images.items()}
+    decoded = {name: cv2.cvtColor(yuv, cv2.COLOR_YUV2BGR_I420) for name, yuv in planes.items()}
+    encoded = {id(decoded[name]): yuv for name, yuv in planes.items()}
+    
+    results = []
+    for simulation in looks or list(film_sim.simulations.keys()):
+        if not film_sim.lut_supported(simulation):
+            continue
+        yuv_lut = film_sim.bake_yuv_lut(simulation, full_range=False)
+        def reference(image, s=simulation):
+            yuv = film_sim.apply_simulation_yuv(encoded[id(image)], s, full_range=False, per_pixel=True)
+            return cv2.cvtColor(yuv, cv2.COLOR_YUV2BGR_I420)
+        def fast(image, lut=yuv_lut):
+            return cv2.cvtColor(lut.apply_yuv420(encoded[id(image)]), cv2.COLOR_YUV2BGR_I420)
+        tolerance = YUV_TOLERANCES.get(simulation, YUV_TOLERANCES["default"])
+        results.append(parity_case(f"YUV {simulation}", decoded, reference, fast, tolerance))
+    return results
+
+def calibration_parity(calibration, images: Dict[str, np.ndarray]) -> List[Dict]:
+    """色彩校正每一步：逐步參考實作 vs 編譯後的矩陣 + 查表"""
+    profile = calibration.camera_profiles[calibration.current_profile]
+    compiled = calibration.compile_profile()
+    compiled_outdoor = calibration.compile_profile(outdoor=1.0)
+    
+    def reference_matrix(image):
+        corrected = calibration._apply_color_matrix(image, profile["color_correction_matrix"],
+                                                    profile.get("color_correction_offset"))
+        return calibration._apply_white_balance(corrected, profile["white_balance_gains"])
+    
+    steps = {
+        "color_matrix": (reference_matrix, lambda img: cv2.transform(img, compiled.matrix)),
+        "tone": (lambda img: calibration._tone_stages(img, profile, False), compiled.apply_tone),
+        "tone_outdoor": (lambda img: calibration._tone_stages(img, profile, True),
+                         compiled_outdoor.apply_tone),
+        "full": (lambda img: calibration.apply_color_correction(img, use_compiled=False),
+                 lambda img: calibration.apply_color_correction(img)),
+    }
+    return [parity_case(f"校正 {step}", images, reference, fast, CALIBRATION_TOLERANCES[step])
+            for step, (reference, fast) in steps.items()]
+
+def print_parity_report(results: List[Dict]):
+    print(f"{'路徑':<34}{'平均ΔE':>8}{'最大ΔE':>8}{'PSNR':>8}{'加速':>8}  容許")
+    for r in results:
+        mark = "✅" if r["passed"] else "❌"
+        mean_de, max_de, psnr = r["tolerance"]
+        print(f"{mark} {r['name']:<32}{r['mean_de']:>8.2f}{r['max_de']:>8.1f}{r['psnr']:>8.1f}"
+              f"{r['speedup']:>7.1f}x  {mean_de:g}/{max_de:g}/{psnr:g}dB")
+
+def check_speedups(results: List[Dict], minimum: float = 1.0) -> List[str]:
+    """效能檢查 (不屬於通過 / 失敗判定)：加速比未超過 minimum 的快速路徑"""
+    return [r["name"] for r in results if r["speedup"] <= minimum]
+
+def run_parity_harness(film_sim: Optional[EnhancedFilmSimulation] = None,
+                       looks: Optional[List[str]] = None, verbose: bool = True) -> List[Dict]:
+    """執行全部一致性比較並列出報告"""
+    film_sim = film_sim or EnhancedFilmSimulation(enable_calibration=True)
+    images = create_parity_image_set()
+    replacing = []  # 實際取代參考實作的快速路徑
+    if film_sim.calibration_enabled:
+        replacing += calibration_parity(film_sim.color_calibration, images)
+    replacing += yuv_look_parity(film_sim, images, looks)
+    results = replacing + film_look_parity(film_sim, images, looks)
+    if verbose:
+        print_parity_report(results)
+        slow = check_speedups(replacing)
+        if slow:
+            print(f"⚠️  快速路徑未比參考實作快: {', '.join(slow)}")
+    return results
+
+def test_calibration_parity():
+    film_sim = EnhancedFilmSimulation(enable_calibration=True)
+    failures = [r["name"] for r in calibration_parity(film_sim.color_calibration, create_parity_image_set())
+                if not r["passed"]]
+    assert not failures, f"超出容許誤差: {failures}"
+
+def test_film_look_parity():
+    film_sim = EnhancedFilmSimulation(enable_calibration=False)
+    failures = [r["name"] for r in film_look_parity(film_sim, create_parity_image_set()) if not r["passed"]]
+    assert not failures, f"超出容許誤差: {failures}"
+
+def test_yuv_look_parity():
+    film_sim = EnhancedFilmSimulation(enable_calibration=False)
+    failures = [r["name"] for r in yuv_look_parity(film_sim, create_parity_image_set()) if not r["passed"]]
+    assert not failures, f"超出容許誤差: {failures}"
+
 def test_color_calibration():
     """測試色彩校正系統"""
     print("🧪 Pi Camera V5647 色彩校正系統測試")
@@ -148,6 +376,13 @@ if __name__ == "__main__":
         # 批次處理測試
         test_batch_processing()
         
+        # 快速路徑一致性
+        print("\n⚖️ 快速路徑 vs 參考實作")
+        print("-" * 30)
+        failures = [r["name"] for r in run_parity_harness() if not r["passed"]]
+        if failures:
+            print(f"❌ 超出容許誤差: {', '.join(failures)}")
+        
         print("\n🎉 所有測試完成！")
         print("\n💡 使用建議:")
         print("   1. 將此系統整合到 RD-1 相機主程式")
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+白卡測光
+White-Card White Balance Meter
+
+對準白 / 灰卡按下快門，由預覽串流中央區塊計算 R/B ColourGains：
+- 預設讀取 lores 串流 (YUV420 或 RGB)，也可讀取未打包的 raw Bayer 串流
+- 過曝與過暗像素以向量化遮罩剔除，連續數幀累加後平均
+- lores 已套用 ISP 的增益與 gamma，先線性化再以目前的 ColourGains 換算新增益
+- 以 picamera2 controls 套用 (關閉 AWB)，整個流程約為 2-3 個預覽幀的時間
+"""
+
+import time
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# raw Bayer 排列 (2x2 區塊內 R、Gr、Gb、B 的位置)
+_BAYER_OFFSETS = {
+    "RGGB": {"R": (0, 0), "G1": (0, 1), "G2": (1, 0), "B": (1, 1)},
+    "GRBG": {"G1": (0, 0), "R": (0, 1), "B": (1, 0), "G2": (1, 1)},
+    "GBRG": {"G1": (0, 0), "B": (0, 1), "R": (1, 0), "G2": (1, 1)},
+    "BGGR": {"B": (0, 0), "G1": (0, 1), "G2": (1, 0), "R": (1, 1)},
+}
+
+
+class WhiteCardMeter:
+    """由預覽串流中央區塊量測白卡並計算 ColourGains"""
+
+    def __init__(self, picam2, stream: str = "lores", roi_fraction: float = 0.25,
+                 frames: int = 3, dark_level: float = 0.06, clip_level: float = 0.94,
+                 min_valid_fraction: float = 0.2, gain_range: Tuple[float, float] = (0.5, 8.0),
+                 display_gamma: float = 2.2):
+        """
+        Args:
+            picam2: Picamera2 實例 (需已啟動)
+            stream: 量測串流 ("lores"、"main" 或未打包的 "raw")
+            roi_fraction: 中央區塊佔畫面寬高的比例
+            frames: 累加平均的幀數
+            dark_level / clip_level: 剔除門檻 (0-1，相對於最大值)
+            min_valid_fraction: 有效像素比例低於此值視為量測失敗 (未對準白卡)
+            gain_range: ColourGains 的允許範圍
+            display_gamma: lores / main 串流的近似 gamma，量測前先線性化
+        """
+        self.picam2 = picam2
+        self.stream = stream
+        self.roi_fraction = roi_fraction
+        self.frames = max(1, frames)
+        self.dark_level = dark_level
+        self.clip_level = clip_level
+        self.min_valid_fraction = min_valid_fraction
+        self.gain_range = gain_range
+        self.display_gamma = display_gamma
+        self._linearize = ((np.arange(256, dtype=np.float32) / 255.0) ** display_gamma).astype(np.float32)
+
+    # === 影像讀取 ===
+
+    def _stream_format(self) -> str:
+        try:
+            return str(self.picam2.camera_configuration()[self.stream]["format"])
+        except (KeyError, TypeError, AttributeError):
+            return "RGB888"
+
+    def _center(self, array: np.ndarray, align: int = 1) -> np.ndarray:
+        h, w = array.shape[:2]
+        rh = max(align, int(h * self.roi_fraction) // align * align)
+        rw = max(align, int(w * self.roi_fraction) // align * align)
+        y0 = (h - rh) // 2 // align * align
+        x0 = (w - rw) // 2 // align * align
+        return array[y0:y0 + rh, x0:x0 + rw]
+
+    def _roi_rgb(self, array: np.ndarray, fmt: str) -> np.ndarray:
+        """中央區塊轉為線性 (N, 3) R, G, B (0-1)"""
+        if fmt.startswith("S") and fmt[1:5] in _BAYER_OFFSETS:
+            return self._roi_bayer(array, fmt)
+
+        if array.ndim == 2:
+            # YUV420 (I420)：lores 解析度小，整張轉換後再取中央區塊
+            rgb = self._center(cv2.cvtColor(array, cv2.COLOR_YUV2RGB_I420))
+        elif fmt in ("XBGR8888", "BGR888"):
+            # picamera2 的命名與記憶體順序相反：這兩種格式陣列內為 R, G, B
+            rgb = self._center(array)[:, :, :3]
+        else:
+            rgb = self._center(array)[:, :, 2::-1]
+        return self._linearize[np.ascontiguousarray(rgb).reshape(-1, 3)]
+
+    def _roi_bayer(self, array: np.ndarray, fmt: str) -> np.ndarray:
+        """未打包的 raw Bayer (uint16)：每個 2x2 區塊取 R、平均 G、B"""
+        if "_CSI2P" in fmt or "PISP" in fmt:
+            raise ValueError(f"不支援打包的 raw 格式: {fmt}")
+        bits = int("".join(ch for ch in fmt[5:] if ch.isdigit()) or 16)
+        raw = array.view(np.uint16) if array.dtype == np.uint8 else array
+        roi = self._center(raw, align=2).astype(np.float32) * (1.0 / ((1 << bits) - 1))
+        offsets = _BAYER_OFFSETS[fmt[1:5]]
+
+        def plane(name):
+            dy, dx = offsets[name]
+            return roi[dy::2, dx::2]
+
+        # raw 已是線性，不需 gamma 轉換 (黑電平忽略，白卡亮度遠高於黑電平)
+        green = (plane("G1") + plane("G2")) * 0.5
+        return np.stack([plane("R"), green, plane("B")], axis=-1).reshape(-1, 3)
+
+    # === 量測 ===
+
+    def _capture(self) -> Tuple[np.ndarray, Dict]:
+        """同一個 request 取得影像與 metadata，確保增益與畫面對應"""
+        request = self.picam2.capture_request()
+        try:
+            return request.make_array(self.stream), request.get_metadata()
+        finally:
+            request.release()
+
+    def measure(self) -> Optional[Dict]:
+        """量測白卡，回傳 {gains, valid_fraction, frames, elapsed}；無法量測時回傳 None"""
+        start = time.perf_counter()
+        fmt = self._stream_format()
+        raw_stream = fmt.startswith("S") and fmt[1:5] in _BAYER_OFFSETS
+        sums = np.zeros(3, dtype=np.float64)
+        valid_count = total_count = 0
+        current = (1.0, 1.0)
+
+        for _ in range(self.frames):
+            array, metadata = self._capture()
+            current = tuple(metadata.get("ColourGains", current))
+            rgb = self._roi_rgb(array, fmt)
+            # 向量化剔除：任一通道過曝或任一通道過暗
+            valid = (rgb.max(axis=1) < self.clip_level) & (rgb.min(axis=1) > self.dark_level)
+            sums += rgb[valid].sum(axis=0, dtype=np.float64)
+            valid_count += int(valid.sum())
+            total_count += rgb.shape[0]
+
+        valid_fraction = valid_count / max(total_count, 1)
+        if valid_fraction < self.min_valid_fraction:
+            print(f"⚠️  白卡量測失敗：有效像素 {valid_fraction:.0%} (請確認白卡填滿中央且曝光正常)")
+            return None
+
+        red, green, blue = sums / valid_count
+        # raw 是增益前的數值；lores / main 已乘上目前的增益，需換算
+        base_red, base_blue = (1.0, 1.0) if raw_stream else current
+        gains = (float(np.clip(base_red * green / max(red, 1e-6), *self.gain_range)),
+                 float(np.clip(base_blue * green / max(blue, 1e-6), *self.gain_range)))
+        return {
+            "gains": gains,
+            "valid_fraction": valid_fraction,
+            "frames": self.frames,
+            "elapsed": time.perf_counter() - start,
+        }
+
+    def measure_and_apply(self) -> Optional[Dict]:
+        """量測並以 picamera2 controls 套用 (關閉自動白平衡)"""
+        result = self.measure()
+        if result is None:
+            return None
+        self.picam2.set_controls({"AwbEnable": False, "ColourGains": result["gains"]})
+        print(f"⚖️ 白卡增益 R {result['gains'][0]:.3f} / B {result['gains'][1]:.3f} "
+              f"(有效 {result['valid_fraction']:.0%}，{result['elapsed'] * 1000:.0f} ms)")
+        return result
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+暗房批次沖洗工具
+Darkroom Batch Developer
+
+以多行程 (multiprocessing) 批次套用軟片模擬到整個資料夾的照片
+支援續傳 (manifest 記錄已完成輸出)、依序輸出日誌與吞吐量統計
+
+用法:
+    python darkroom.py ~/Pictures/piCam -s CLASSIC_CHROME -s KODAK_PORTRA_400 -o developed
+    python darkroom.py "shots/*.jpg" -s VELVIA --format png --workers 3
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool, cpu_count
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+
+from enhanced_film_simulation import EnhancedFilmSimulation
+
+SUPPORTED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp'}
+OUTPUT_FORMATS = {'jpg': '.jpg', 'png': '.png', 'webp': '.webp'}
+MANIFEST_NAME = 'darkroom_manifest.json'
+MANIFEST_SAVE_EVERY = 20      # 每完成幾張寫入一次 manifest
+MANIFEST_SAVE_INTERVAL = 5.0  # 或距上次寫入超過幾秒
+
+# 每個工作行程各自持有一個引擎實例
+_worker_engine = None
+_worker_color_correction = True
+
+
+def _init_worker(apply_color_correction: bool):
+    """工作行程初始化：建立引擎並限制 OpenCV 執行緒數，避免與行程池互搶 CPU"""
+    global _worker_engine, _worker_color_correction
+    cv2.setNumThreads(1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        _worker_engine = EnhancedFilmSimulation(enable_calibration=apply_color_correction)
+    _worker_color_correction = apply_color_correction
+
+
+def _encode_params(output_format: str, quality: int) -> List[int]:
+    """依輸出格式轉換品質參數"""
+    if output_format == 'jpg':
+        return [cv2.IMWRITE_JPEG_QUALITY, quality]
+    if output_format == 'webp':
+        return [cv2.IMWRITE_WEBP_QUALITY, quality]
+    # PNG 品質對應壓縮等級 (0-9)，品質越高壓縮越輕
+    return [cv2.IMWRITE_PNG_COMPRESSION, max(0, min(9, (100 - quality) // 10))]
+
+
+def _develop(job: Dict) -> Dict:
+    """沖洗單張照片 (於工作行程內執行)"""
+    start = time.perf_counter()
+    result = {'job': job, 'ok': False, 'error': None, 'seconds': 0.0}
+    try:
+        img = cv2.imread(job['source'], cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError(f"無法載入圖像: {job['source']}")
+
+        # 引擎每次套用都會輸出進度，批次模式下交由主行程統一記錄
+        with contextlib.redirect_stdout(io.StringIO()):
+            developed = _worker_engine.apply_simulation(
+                img, job['simulation'], apply_color_correction=_worker_color_correction,
+                noise_reduction=job['options']['noise_reduction'])
+
+        os.makedirs(os.path.dirname(job['output']), exist_ok=True)
+        # 先寫入暫存檔再改名，中斷時不會留下半張輸出
+        root, ext = os.path.splitext(job['output'])
+        tmp_path = f"{root}.part{ext}"
+        if not cv2.imwrite(tmp_path, developed, _encode_params(job['format'], job['quality'])):
+            raise IOError(f"無法寫入: {job['output']}")
+        os.replace(tmp_path, job['output'])
+        result['ok'] = True
+    except Exception as e:
+        result['error'] = str(e)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def collect_sources(inputs: List[str]) -> List[Tuple[str, str]]:
+    """展開資料夾與 glob，回傳 (來源路徑, 相對根目錄) 清單"""
+    sources = []
+    seen = set()
+
+    def add(path: str, root: str):
+        path = os.path.abspath(path)
+        if path in seen or os.path.splitext(path)[1].lower() not in SUPPORTED_EXTENSIONS:
+            return
+        seen.add(path)
+        sources.append((path, root))
+
+    for item in inputs:
+        if os.path.isdir(item):
+            root = os.path.abspath(item)
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    add(os.path.join(dirpath, name), root)
+        else:
+            matches = sorted(glob.glob(item, recursive=True)) if glob.has_magic(item) else [item]
+            for path in matches:
+                if os.path.isfile(path):
+                    add(path, os.path.dirname(os.path.abspath(path)))
+    return sources
+
+
+def _source_signature(path: str) -> Dict:
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime': int(stat.st_mtime)}
+
+
+class DarkroomManifest:
+    """已完成輸出的紀錄，供中斷後續傳"""
+
+    def __init__(self, output_dir: str):
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.entries: Dict[str, Dict] = {}
+        self._unsaved = 0
+        self._last_save = time.monotonic()
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f).get('outputs', {})
+            except Exception as e:
+                print(f"⚠️  manifest 損毀，將重新沖洗全部照片: {e}")
+
+    def is_done(self, job: Dict) -> bool:
+        """輸出存在且以相同來源與相同沖洗選項產生 (選項不同時重新沖洗並覆蓋)"""
+        entry = self.entries.get(job['key'])
+        return (entry is not None
+                and entry.get('source') == job['source']
+                and entry.get('signature') == job['signature']
+                and entry.get('options') == job['options']
+                and os.path.exists(job['output']))
+
+    def mark_done(self, job: Dict):
+        self.entries[job['key']] = {
+            'source': job['source'],
+            'signature': job['signature'],
+            'options': job['options'],
+        }
+        self._unsaved += 1
+
+    def save_if_due(self):
+        """批次寫入：累積一定數量或經過一段時間才重寫 JSON"""
+        if (self._unsaved >= MANIFEST_SAVE_EVERY
+                or (self._unsaved and time.monotonic() - self._last_save >= MANIFEST_SAVE_INTERVAL)):
+            self.save()
+
+    def save(self):
+        if not self._unsaved:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': 2, 'outputs': self.entries}, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._unsaved = 0
+        self._last_save = time.monotonic()
+
+
+def build_jobs(sources: List[Tuple[str, str]], simulations: List[str], output_dir: str,
+               output_format: str, quality: int, apply_color_correction: bool = True,
+               noise_reduction: str = 'off') -> List[Dict]:
+    """為每張照片 × 每種軟片建立工作"""
+    jobs = []
+    extension = OUTPUT_FORMATS[output_format]
+    for source, root in sources:
+        rel_dir = os.path.dirname(os.path.relpath(source, root))
+        stem = os.path.splitext(os.path.basename(source))[0]
+        signature = _source_signature(source)
+        for simulation in simulations:
+            rel_output = os.path.join(rel_dir, f"{stem}_{simulation}{extension}")
+            jobs.append({
+                'key': rel_output.replace(os.sep, '/'),
+                'source': source,
+                'signature': signature,
+                'simulation': simulation,
+                'output': os.path.join(output_dir, rel_output),
+                'format': output_format,
+                'quality': quality,
+                # 影響輸出內容的完整選項，manifest 依此判斷能否續傳
+                'options': {
+                    'simulation': simulation,
+                    'format': output_format,
+                    'quality': quality,
+                    'apply_color_correction': apply_color_correction,
+                    'noise_reduction': noise_reduction,
+                },
+            })
+    return jobs
+
+
+def run_darkroom(inputs: List[str], simulations: List[str], output_dir: str,
+                 output_format: str = 'jpg', quality: int = 92, workers: Optional[int] = None,
+                 apply_color_correction: bool = True, resume: bool = True,
+                 noise_reduction: str = 'off') -> Dict:
+    """批次沖洗主流程，回傳統計資訊"""
+    output_dir = os.path.abspath(output_dir)
+    sources = collect_sources(inputs)
+    jobs = build_jobs(sources, simulations, output_dir, output_format, quality,
+                      apply_color_correction, noise_reduction)
+
+    manifest = DarkroomManifest(output_dir)
+    pending = [job for job in jobs if not (resume and manifest.is_done(job))]
+    skipped = len(jobs) - len(pending)
+
+    print(f"🗂️  來源照片: {len(sources)} 張，軟片: {', '.join(simulations)}")
+    print(f"📋 工作: {len(jobs)} 項，已完成略過: {skipped} 項，待處理: {len(pending)} 項")
+
+    stats = {'total': len(jobs), 'skipped': skipped, 'developed': 0, 'failed': 0,
+             'bytes_in': 0, 'seconds': 0.0}
+    if not pending:
+        print("✅ 沒有需要沖洗的照片")
+        return stats
+
+    workers = workers or max(1, cpu_count() - 1)
+    start = time.perf_counter()
+
+    # imap 保持提交順序，日誌依來源順序輸出，不受完成先後影響
+    # manifest 批次寫入，中斷時 (包含 Ctrl+C) 仍會寫入已完成的項目
+    try:
+        with Pool(processes=workers, initializer=_init_worker,
+                  initargs=(apply_color_correction,)) as pool:
+            for index, result in enumerate(pool.imap(_develop, pending, chunksize=1), 1):
+                job = result['job']
+                name = os.path.relpath(job['output'], output_dir)
+                if result['ok']:
+                    stats['developed'] += 1
+                    stats['bytes_in'] += job['signature']['size']
+                    manifest.mark_done(job)
+                    manifest.save_if_due()
+                    print(f"  [{index}/{len(pending)}] ✅ {name} ({result['seconds']:.2f}s)")
+                else:
+                    stats['failed'] += 1
+                    print(f"  [{index}/{len(pending)}] ❌ {name}: {result['error']}")
+    finally:
+        manifest.save()
+
+    stats['seconds'] = time.perf_counter() - start
+    elapsed = max(stats['seconds'], 1e-6)
+    images_per_second = stats['developed'] / elapsed
+    mb_per_second = stats['bytes_in'] / (1024 * 1024) / elapsed
+
+    print(f"\n📈 沖洗完成: {stats['developed']} 成功 / {stats['failed']} 失敗，"
+          f"耗時 {stats['seconds']:.1f}s ({workers} 行程)")
+    print(f"   吞吐量: {images_per_second:.2f} 張/秒，{mb_per_second:.2f} MB/秒")
+    stats['images_per_second'] = images_per_second
+    stats['mb_per_second'] = mb_per_second
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令列進入點"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        available = list(EnhancedFilmSimulation(enable_calibration=False).simulations.keys())
+
+    parser = argparse.ArgumentParser(description="暗房批次沖洗：以多行程套用軟片模擬")
+    parser.add_argument('inputs', nargs='+', help="照片資料夾 (遞迴) 或 glob，例如 'shots/**/*.jpg'")
+    parser.add_argument('-s', '--simulation', action='append', dest='simulations',
+                        help="軟片模擬名稱，可重複指定 (預設 PROVIA)")
+    parser.add_argument('-o', '--output', default='developed', help="輸出資料夾")
+    parser.add_argument('--format', choices=sorted(OUTPUT_FORMATS), default='jpg', help="輸出格式")
+    parser.add_argument('-q', '--quality', type=int, default=92, help="輸出品質 (1-100)")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="行程數 (預設 CPU 核心數 - 1)")
+    parser.add_argument('--no-color-correction', action='store_true', help="略過相機色彩校正")
+    parser.add_argument('--noise-reduction', choices=['auto', 'off', 'low', 'medium', 'high'], default='off',
+                        help="降噪等級 (auto 在無增益資訊時依場景分析，low_light 才降噪)")
+    parser.add_argument('--force', action='store_true', help="忽略 manifest，全部重新沖洗")
+    parser.add_argument('--list', action='store_true', help="列出所有軟片模擬")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name in available:
+            print(name)
+        return 0
+
+    simulations = args.simulations or ['PROVIA']
+    unknown = [s for s in simulations if s not in available]
+    if unknown:
+        parser.error(f"未知的軟片模擬: {', '.join(unknown)}")
+    if not 1 <= args.quality <= 100:
+        parser.error("品質必須介於 1-100")
+
+    stats = run_darkroom(args.inputs, simulations, args.output, args.format, args.quality,
+                         args.workers, not args.no_color_correction, not args.force,
+                         args.noise_reduction)
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
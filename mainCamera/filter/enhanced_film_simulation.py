@@ -9,9 +9,15 @@ Enhanced Film Simulation Engine
 import cv2
 import numpy as np
 from PIL import Image
-from typing import Union, Tuple, Dict, Any
+from typing import Union, Tuple, Dict, Any, Optional
 import random
 
+from noise_reduction import NoiseReducer, level_from_gain
+from film_lut import FilmLUT, YUVFilmLUT, bgr_to_yuv420, yuv420_to_bgr
+from local_tone_mapping import LocalToneMapper
+from texture_assets import TextureAssetCache
+from face_regions import FaceRegionTracker
+
 # 導入色彩校正系統（從 colorCorrection 模組）
 try:
     import sys
@@ -26,20 +32,57 @@ except ImportError:
 class EnhancedFilmSimulation:
     """增強版軟片模擬引擎（整合色彩校正）"""
     
-    def __init__(self, enable_calibration: bool = True):
+    # _vintage_fade 以整張影像的平均值為對比中心，結果取決於畫面內容，無法烘焙為 LUT；
+    # 這些軟片的 YUV 路徑改為逐像素計算，其餘一律使用 YUV LUT (路徑固定，輸出不隨計時變動)
+    MEAN_DEPENDENT_SIMULATIONS = frozenset({
+        'CLASSIC_NEG', 'ETERNA', 'VINTAGE_KODACHROME', 'NOSTALGIC_NEGATIVE', 'SUMMER_1960', 'VINTAGE_BRONZE'
+    })
+    # 軟片本身以 face_weight 調整膚色 (_adjust_skin)，臉部膚色保護不再重複套用
+    SKIN_AWARE_SIMULATIONS = frozenset({
+        'ASTIA', 'REALA_ACE', 'KODAK_PORTRA_400', 'KODAK_PORTRA_160', 'KODAK_PORTRA_800'
+    })
+    # 黑白軟片沒有膚色可保護
+    MONOCHROME_SIMULATIONS = frozenset({
+        'ACROS', 'MONO_CHROME', 'KODAK_TRI_X_400', 'KODAK_TMAX_100', 'KODAK_TMAX_3200', 'INFRARED_BW'
+    })
+    
+    def __init__(self, enable_calibration: bool = True, texture_cache_mb: int = 64,
+                 texture_cache_dir: Optional[str] = None, watch_profiles: bool = False):
         """初始化軟片模擬系統
         
         Args:
             enable_calibration: 是否啟用相機色彩校正
+            texture_cache_mb: 漏光 / 灰塵 / 邊框素材的記憶體快取上限 (MB)
+            texture_cache_dir: 素材磁碟快取資料夾 (設定後以 memmap 載入)
+            watch_profiles: 監看 camera_profiles.json，修改後自動重新編譯 (不需重新啟動)
         """
         # 初始化色彩校正系統
         self.calibration_enabled = enable_calibration and CALIBRATION_AVAILABLE
         if self.calibration_enabled:
             self.color_calibration = CameraColorCalibration()
+            if watch_profiles:
+                self.color_calibration.watch_profiles()
             print("✅ Pi Camera V5647 色彩校正系統已啟用")
         else:
             self.color_calibration = None
             print("📷 使用基本軟片模擬（無色彩校正）")
+        
+        # 降噪器（低解析度計算係數，全解析度成本固定）
+        self.noise_reducer = NoiseReducer()
+        
+        # 局部色調映射（1/8 解析度基底層，Classic Chrome 與 high_key 高光保護使用）
+        self.tone_mapper = LocalToneMapper()
+        self._classic_chrome_tone = LocalToneMapper(highlight_compression=0.35, shadow_lift=0.15, knee=0.65)
+        
+        # 臉部區域（膚色調整只作用在人臉附近）
+        self.face_regions = FaceRegionTracker()
+        
+        # 復古質感素材（每種解析度只產生一次）
+        self.textures = TextureAssetCache(max_bytes=texture_cache_mb * 1024 * 1024,
+                                          cache_dir=texture_cache_dir)
+        
+        # 烘焙後的 3D LUT 快取 (預覽 / 錄影 / YUV 路徑)；烘焙時以 spatial_effects=False 略過空間效果
+        self._lut_cache: Dict[Tuple, Any] = {}
             
         self.simulations = {
             # === 經典 Fujifilm 軟片 ===
@@ -97,13 +140,21 @@ class EnhancedFilmSimulation:
         }
     
     def apply_simulation(self, image: Union[str, Image.Image, np.ndarray], 
-                        simulation: str, apply_color_correction: bool = True, **kwargs) -> np.ndarray:
+                        simulation: str, apply_color_correction: bool = True,
+                        noise_reduction: str = "off", analogue_gain: Optional[float] = None,
+                        local_tone: str = "off", face_aware: str = "off",
+                        scene_params: Optional[dict] = None, **kwargs) -> np.ndarray:
         """套用軟片模擬（整合色彩校正）
         
         Args:
             image: 輸入圖像
             simulation: 軟片模擬類型
             apply_color_correction: 是否在軟片模擬前套用色彩校正
+            noise_reduction: 降噪等級 (auto/off/low/medium/high，對應 CameraSettings.noise_reduction)
+            analogue_gain: 拍攝時的類比增益，auto 降噪依此決定強度
+            local_tone: 局部色調映射 (off/on/auto，auto 依場景建議做高光保護或陰影提升)
+            face_aware: 膚色調整限制在臉部附近 (off/still/preview；preview 每 N 幀偵測、其餘追蹤)
+            scene_params: 串流場景分析參數 (StreamingSceneAnalyzer.update 的結果)，預覽時避免逐幀重新判斷場景
             **kwargs: 其他參數
         """
         # 載入圖像
@@ -118,10 +169,31 @@ class EnhancedFilmSimulation:
         else:
             raise ValueError("不支援的圖像格式")
         
+        # === 降噪：在色彩校正放大雜訊之前處理 ===
+        level = self._resolve_noise_reduction(img, noise_reduction, analogue_gain)
+        if level != "off":
+            print(f"🔇 套用降噪: {level}")
+            img = self.noise_reducer.apply(img, level)
+        
         # === 第一步：Pi Camera V5647 色彩校正 ===
         if apply_color_correction and self.calibration_enabled:
             print(f"🔧 套用 Pi Camera V5647 色彩校正...")
-            img = self.color_calibration.apply_color_correction(img, scene_analysis=True)
+            img = self.color_calibration.apply_color_correction(img, scene_analysis=True,
+                                                                scene_params=scene_params)
+        
+        # === 局部色調映射 ===
+        tone_mapper = self._resolve_local_tone(img, local_tone)
+        if tone_mapper is not None:
+            print(f"🌗 套用局部色調映射")
+            img = tone_mapper.apply(img)
+        
+        # === 臉部區域權重（低解析度，供膚色調整使用） ===
+        if face_aware != "off" and self.face_regions.available:
+            if face_aware == "preview":
+                self.face_regions.update(img)
+            else:
+                self.face_regions.detect(img)
+            kwargs['face_weight'] = self.face_regions.weight_map()
         
         # 檢查軟片模擬是否存在
         if simulation not in self.simulations:
@@ -132,8 +204,118 @@ class EnhancedFilmSimulation:
         print(f"🎞️ 套用軟片模擬: {simulation}")
         result = self.simulations[simulation](img, **kwargs)
         
+        # === 膚色保護：只在偵測到臉時，於臉部附近拉回軟片造成的膚色偏移 ===
+        # (已自行處理膚色的軟片與黑白軟片除外)
+        if (self.face_regions.boxes and kwargs.get('face_weight') is not None
+                and simulation not in self.SKIN_AWARE_SIMULATIONS
+                and simulation not in self.MONOCHROME_SIMULATIONS):
+            result = self._protect_skin_tones(result, kwargs['face_weight'])
+        
+        return result
+    
+    def lut_supported(self, simulation: str) -> bool:
+        """軟片是否能以 3D LUT 表示 (逐像素且與畫面內容無關)"""
+        return simulation in self.simulations and simulation not in self.MEAN_DEPENDENT_SIMULATIONS
+    
+    def apply_simulation_per_pixel(self, image: np.ndarray, simulation: str,
+                                   apply_color_correction: bool = False) -> np.ndarray:
+        """LUT 烘焙、逐像素後備路徑與一致性測試共用的參考計算（略過顆粒與局部色調等空間效果）"""
+        if simulation not in self.simulations:
+            raise ValueError(f"軟片模擬 '{simulation}' 不存在")
+        if apply_color_correction and self.calibration_enabled:
+            image = self.color_calibration.apply_color_correction(image, scene_analysis=False)
+        result = self.simulations[simulation](image, spatial_effects=False)
+        if result.ndim == 2:
+            result = cv2.cvtColor(result, cv2.COLOR_GRAY2BGR)
         return result
     
+    def bake_lut(self, simulation: str, size: int = 33,
+                 apply_color_correction: bool = False) -> FilmLUT:
+        """將軟片模擬烘焙為 3D LUT（略過顆粒與局部色調等空間效果；色彩校正不含場景自適應）"""
+        key = ("bgr", simulation, size, self._correction_key(apply_color_correction))
+        if key in self._lut_cache:
+            return self._lut_cache[key]
+        if simulation not in self.simulations:
+            raise ValueError(f"軟片模擬 '{simulation}' 不存在")
+        if not self.lut_supported(simulation):
+            raise ValueError(f"軟片模擬 '{simulation}' 依畫面平均值調整對比，無法烘焙為 LUT")
+        
+        lut = FilmLUT.from_function(
+            lambda grid: self.apply_simulation_per_pixel(grid, simulation, apply_color_correction), size)
+        self._lut_cache[key] = lut
+        return lut
+    
+    def _correction_key(self, apply_color_correction: bool):
+        """LUT 快取鍵中的色彩校正部分；配置熱重載或切換後自動重新烘焙"""
+        if not (apply_color_correction and self.calibration_enabled):
+            return None
+        return (self.color_calibration.current_profile, self.color_calibration.profile_version)
+    
+    def bake_yuv_lut(self, simulation: str, size: int = 49, apply_color_correction: bool = False,
+                     full_range: bool = True) -> YUVFilmLUT:
+        """YUV 域的軟片 LUT（由 BGR LUT 轉換；網格較密以抵銷二次內插的誤差，套用成本不變）"""
+        key = ("yuv", simulation, size, self._correction_key(apply_color_correction), full_range)
+        if key not in self._lut_cache:
+            bgr_lut = self.bake_lut(simulation, size, apply_color_correction)
+            self._lut_cache[key] = bgr_lut.to_yuv(full_range)
+        return self._lut_cache[key]
+    
+    def compile_look(self, blend: Dict[str, float], strength: float = 1.0,
+                     user_lut: Optional[str] = None, size: int = 33,
+                     apply_color_correction: bool = False) -> FilmLUT:
+        """將混合軟片編譯為單一 LUT，套用成本與單一軟片相同
+        
+        Args:
+            blend: 軟片與權重，例如 {'KODAK_PORTRA_400': 0.7, 'CLASSIC_CHROME': 0.3}
+            strength: 效果強度 (0 = 原圖，1 = 完整效果)
+            user_lut: 串接在軟片之後的使用者 .cube 檔案
+        
+        MEAN_DEPENDENT_SIMULATIONS 中的軟片無法以 LUT 表示，不能混合 (ValueError)。
+        """
+        key = ("look", tuple(sorted(blend.items())), strength, user_lut, size,
+               self._correction_key(apply_color_correction))
+        if key in self._lut_cache:
+            return self._lut_cache[key]
+        
+        names = list(blend.keys())
+        luts = [self.bake_lut(name, size, apply_color_correction) for name in names]
+        lut = luts[0] if len(luts) == 1 else FilmLUT.blend(luts, [blend[name] for name in names])
+        if user_lut:
+            lut = lut.then(FilmLUT.from_cube(user_lut))
+        if strength != 1.0:
+            lut = lut.with_strength(strength)
+        self._lut_cache[key] = lut
+        return lut
+    
+    def _apply_yuv_per_pixel(self, frame: np.ndarray, simulation: str, layout: str,
+                             apply_color_correction: bool, full_range: bool,
+                             out: Optional[np.ndarray] = None) -> np.ndarray:
+        """逐像素後備路徑：解碼為 BGR、套用軟片、再編碼回相同排列"""
+        bgr = yuv420_to_bgr(frame, layout, full_range)
+        result = self.apply_simulation_per_pixel(bgr, simulation, apply_color_correction)
+        return bgr_to_yuv420(result, layout, full_range, out=out)
+    
+    def apply_simulation_yuv(self, frame: np.ndarray, simulation: str, layout: str = "I420",
+                             apply_color_correction: bool = False, full_range: bool = True,
+                             out: Optional[np.ndarray] = None, per_pixel: bool = False) -> np.ndarray:
+        """直接在 YUV420 / NV12 緩衝區套用軟片模擬，輸出相同排列（預覽與錄影用）
+        
+        MEAN_DEPENDENT_SIMULATIONS 中無法以 LUT 表示的軟片改用逐像素計算，其餘使用 YUV LUT。
+        
+        Args:
+            frame: picamera2 lores / 錄影串流的 YUV420 陣列 (h*3/2, w)
+            layout: "I420" 或 "NV12"
+            per_pixel: 強制走逐像素路徑 (解碼 → 軟片 → 編碼)，作為 LUT 路徑的參考
+        """
+        if simulation not in self.simulations:
+            raise ValueError(f"軟片模擬 '{simulation}' 不存在")
+        if per_pixel or not self.lut_supported(simulation):
+            return self._apply_yuv_per_pixel(frame, simulation, layout, apply_color_correction,
+                                             full_range, out=out)
+        yuv_lut = self.bake_yuv_lut(simulation, apply_color_correction=apply_color_correction,
+                                    full_range=full_range)
+        return yuv_lut.apply_yuv420(frame, layout, out=out)
+    
     def get_available_simulations(self) -> Dict[str, str]:
         """取得所有可用的軟片模擬及其描述"""
         descriptions = {
@@ -181,14 +363,53 @@ class EnhancedFilmSimulation:
         }
         return descriptions
     
+    def analyze_scene(self, image: np.ndarray) -> Dict:
+        """以縮圖分析場景 (scene_type / recommended_adjustments)，未啟用色彩校正時回傳空字典"""
+        if not self.calibration_enabled:
+            return {}
+        return self._thumbnail_analysis(image)
+    
     # === 工具函數 ===
     
+    def _thumbnail_analysis(self, img: np.ndarray) -> Dict:
+        """以縮圖分析場景，避免全解析度的額外成本"""
+        h, w = img.shape[:2]
+        scale = min(1.0, 320 / max(h, w))
+        thumb = cv2.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+        return self.color_calibration.analyze_image_characteristics(thumb)
+    
+    def _resolve_noise_reduction(self, img: np.ndarray, level: str, analogue_gain: Optional[float]) -> str:
+        """決定實際降噪等級：auto 優先依增益，否則依場景分析的 low_light 建議 (與 level_from_gain 相同規則)"""
+        if level != "auto":
+            return level
+        low_light = None
+        if analogue_gain is None and self.calibration_enabled:
+            analysis = self._thumbnail_analysis(img)
+            low_light = bool(analysis.get("recommended_adjustments", {}).get("noise_reduction"))
+        return level_from_gain(analogue_gain, low_light=low_light)
+    
+    def _resolve_local_tone(self, img: np.ndarray, mode: str) -> Optional[LocalToneMapper]:
+        """決定局部色調映射：on 使用預設參數，auto 依場景建議 (high_key 高光保護 / low_light 陰影提升)"""
+        if mode == "on":
+            return self.tone_mapper
+        if mode != "auto" or not self.calibration_enabled:
+            return None
+        recommended = self._thumbnail_analysis(img).get("recommended_adjustments", {})
+        if recommended.get("highlight_protection"):
+            return LocalToneMapper(highlight_compression=0.5, shadow_lift=0.0)
+        if recommended.get("shadow_lift"):
+            return LocalToneMapper(highlight_compression=0.0, shadow_lift=recommended["shadow_lift"] * 3)
+        return None
+    
     def _apply_lut(self, img: np.ndarray, lut: np.ndarray) -> np.ndarray:
         """應用查找表"""
         return cv2.LUT(img, lut)
     
-    def _film_grain(self, img: np.ndarray, strength: float = 0.1, size: float = 1.0) -> np.ndarray:
-        """添加膠片顆粒"""
+    def _film_grain(self, img: np.ndarray, strength: float = 0.1, size: float = 1.0,
+                    **kwargs) -> np.ndarray:
+        """添加膠片顆粒（spatial_effects=False 時略過）"""
+        if not kwargs.get('spatial_effects', True):
+            return img
         grain = np.random.normal(0, strength * 255, img.shape)
         if size != 1.0:
             # 調整顆粒大小
@@ -199,6 +420,13 @@ class EnhancedFilmSimulation:
         result = img.astype(np.float32) + grain
         return np.clip(result, 0, 255).astype(np.uint8)
     
+    def _film_textures(self, img: np.ndarray, light_leak: float = 0.0, dust: float = 0.0,
+                       film_border: bool = False, **kwargs) -> np.ndarray:
+        """疊加漏光、灰塵與底片邊框（快取素材，單次融合；textures=False 可關閉）"""
+        if not kwargs.get('textures', True) or not kwargs.get('spatial_effects', True):
+            return img
+        return self.textures.composite(img, light_leak, dust, film_border)
+    
     def _color_temperature(self, img: np.ndarray, temp: int) -> np.ndarray:
         """調整色溫 (3000K=暖色, 6500K=中性, 10000K=冷色)"""
         if temp == 6500:
@@ -269,8 +497,42 @@ class EnhancedFilmSimulation:
         
         return cv2.LUT(img, lut)
     
-    def _protect_skin_tones(self, img: np.ndarray) -> np.ndarray:
-        """膚色保護算法 - 保持膚色自然"""
+    def _adjust_skin(self, hsv: np.ndarray, skin_mask: np.ndarray, saturation: float,
+                     value: float, face_weight: Optional[np.ndarray] = None):
+        """膚色區域的飽和度 / 明度調整（原地修改 HSV）
+        
+        有臉部權重時，調整量乘上柔和權重，只作用在人臉附近；否則維持原本的 HSV 遮罩。
+        """
+        if face_weight is None:
+            hsv[skin_mask, 1] *= saturation
+            hsv[skin_mask, 2] *= value
+            return
+        weight = FaceRegionTracker.upsample(face_weight, hsv.shape) * skin_mask
+        hsv[:, :, 1] *= 1.0 + (saturation - 1.0) * weight
+        hsv[:, :, 2] *= 1.0 + (value - 1.0) * weight
+    
+    def _protect_skin_tones(self, img: np.ndarray, face_weight: Optional[np.ndarray] = None) -> np.ndarray:
+        """膚色保護算法 - 保持膚色自然
+        
+        有臉部權重時只處理權重涵蓋的範圍，其餘像素維持原值（也省去全畫面的 HSV 轉換）。
+        """
+        if face_weight is None:
+            return self._protect_skin_region(img)
+        ys, xs = np.nonzero(face_weight > 1e-3)
+        if ys.size == 0:
+            return img
+        h, w = img.shape[:2]
+        sy, sx = h / face_weight.shape[0], w / face_weight.shape[1]
+        y0, y1 = int(ys.min() * sy), min(h, int(np.ceil((ys.max() + 1) * sy)))
+        x0, x1 = int(xs.min() * sx), min(w, int(np.ceil((xs.max() + 1) * sx)))
+        weight = FaceRegionTracker.upsample(face_weight, img.shape)[y0:y1, x0:x1]
+        result = img.copy()
+        protected = self._protect_skin_region(img[y0:y1, x0:x1], weight)
+        np.copyto(result[y0:y1, x0:x1], protected, where=(weight > 1e-3)[:, :, None])
+        return result
+    
+    def _protect_skin_region(self, img: np.ndarray, weight: Optional[np.ndarray] = None) -> np.ndarray:
+        """膚色保護的 HSV 調整（weight 為與 img 同尺寸的臉部權重，None 時以膚色遮罩全畫面調整）"""
         hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV).astype(np.float32)
         
         # 定義膚色範圍（HSV）
@@ -287,11 +549,16 @@ class EnhancedFilmSimulation:
         # 對膚色區域進行保護性調整
         # 減少極端的色相偏移
         h_protected = h.copy()
-        h_protected[skin_mask] = h[skin_mask] * 0.95  # 輕微調整色相
-        
-        # 保護膚色的飽和度
         s_protected = s.copy() * 255
-        s_protected[skin_mask] = s[skin_mask] * 255 * 1.05  # 略微增強膚色飽和度
+        if weight is None:
+            h_protected[skin_mask] = h[skin_mask] * 0.95  # 輕微調整色相
+            # 保護膚色的飽和度
+            s_protected[skin_mask] = s[skin_mask] * 255 * 1.05  # 略微增強膚色飽和度
+        else:
+            # 只在臉部附近調整
+            weight = weight * skin_mask
+            h_protected *= 1.0 - 0.05 * weight
+            s_protected *= 1.0 + 0.05 * weight
         
         hsv[:, :, 0] = h_protected
         hsv[:, :, 1] = np.clip(s_protected, 0, 255)
@@ -350,8 +617,7 @@ class EnhancedFilmSimulation:
         
         # 人像膚色範圍優化
         skin_mask = ((hsv[:,:,0] >= 5) & (hsv[:,:,0] <= 25)) & (hsv[:,:,1] >= 30)
-        hsv[skin_mask, 1] *= 0.9   # 降低膚色飽和度
-        hsv[skin_mask, 2] *= 1.05  # 提亮膚色
+        self._adjust_skin(hsv, skin_mask, 0.9, 1.05, kwargs.get('face_weight'))  # 降低飽和度、提亮膚色
         
         # 整體柔和調整
         hsv[:,:,1] *= 0.95  # 略微降低整體飽和度
@@ -373,8 +639,11 @@ class EnhancedFilmSimulation:
         4. 微妙的冷調偏移
         5. 柔和的對比度曲線
         """
-        # 最簡化的處理 - 只降低飽和度和微調色調
-        result = img.copy()
+        # === 高光卷掃與陰影細節 - 局部色調映射 (可用 highlight_rolloff=False 關閉) ===
+        if kwargs.get('highlight_rolloff', True) and kwargs.get('spatial_effects', True):
+            result = self._classic_chrome_tone.apply(img)
+        else:
+            result = img.copy()
         
         # === 飽和度控制 - Classic Chrome 的核心 ===
         hsv = cv2.cvtColor(result, cv2.COLOR_BGR2HSV).astype(np.float32)
@@ -507,8 +776,7 @@ class EnhancedFilmSimulation:
         
         # 膚色優化
         skin_mask = ((hsv[:,:,0] >= 5) & (hsv[:,:,0] <= 25))
-        hsv[skin_mask, 1] *= 0.95
-        hsv[skin_mask, 2] *= 1.05
+        self._adjust_skin(hsv, skin_mask, 0.95, 1.05, kwargs.get('face_weight'))
         
         result = cv2.cvtColor(np.clip(hsv, 0, 255).astype(np.uint8), cv2.COLOR_HSV2BGR)
         
@@ -538,17 +806,17 @@ class EnhancedFilmSimulation:
         result = self._tone_curve(result, 'high_contrast')
         
         # 輕微膠片顆粒
-        result = self._film_grain(result, 0.02)
+        result = self._film_grain(result, 0.02, **kwargs)
         
         return result
     
     def _kodachrome_25(self, img: np.ndarray, **kwargs) -> np.ndarray:
         """Kodachrome 25 - 細膩質感"""
         # 基於 Kodachrome 64 但更細膩
-        result = self._kodachrome_64(img)
+        result = self._kodachrome_64(img, **kwargs)
         
         # 更精細的處理
-        result = self._film_grain(result, 0.01, 0.5)  # 更細的顆粒
+        result = self._film_grain(result, 0.01, 0.5, **kwargs)  # 更細的顆粒
         
         return result
     
@@ -562,8 +830,7 @@ class EnhancedFilmSimulation:
         
         # 人像膚色範圍優化
         skin_mask = ((hsv[:,:,0] >= 8) & (hsv[:,:,0] <= 25))
-        hsv[skin_mask, 1] *= 0.85  # 膚色降低飽和度
-        hsv[skin_mask, 2] *= 1.05  # 膚色提亮
+        self._adjust_skin(hsv, skin_mask, 0.85, 1.05, kwargs.get('face_weight'))  # 膚色降低飽和度、提亮
         
         # 整體柔和飽和度
         hsv[:,:,1] *= 0.95
@@ -574,27 +841,27 @@ class EnhancedFilmSimulation:
         result = self._split_toning(result, (5, 2, -3), (-2, 1, 4), 0.2)
         
         # 膠片顆粒
-        result = self._film_grain(result, 0.03)
+        result = self._film_grain(result, 0.03, **kwargs)
         
         return result
     
     def _portra_160_v2(self, img: np.ndarray, **kwargs) -> np.ndarray:
         """Kodak Portra 160 v2 - 自然膚色"""
         # 基於 Portra 400 但更柔和
-        result = self._portra_400_v2(img)
+        result = self._portra_400_v2(img, **kwargs)
         
         # 更細的顆粒
-        result = self._film_grain(result, 0.015, 0.7)
+        result = self._film_grain(result, 0.015, 0.7, **kwargs)
         
         return result
     
     def _portra_800_v3(self, img: np.ndarray, **kwargs) -> np.ndarray:
         """Kodak Portra 800 v3 - 高感光人像"""
         # 基於 Portra 400 但顆粒更明顯
-        result = self._portra_400_v2(img)
+        result = self._portra_400_v2(img, **kwargs)
         
         # 高感光的顆粒感
-        result = self._film_grain(result, 0.05, 1.2)
+        result = self._film_grain(result, 0.05, 1.2, **kwargs)
         
         return result
     
@@ -615,7 +882,7 @@ class EnhancedFilmSimulation:
         result = self._split_toning(result, (10, 5, -5), (-3, 2, 8), 0.25)
         
         # 膠片顆粒
-        result = self._film_grain(result, 0.025)
+        result = self._film_grain(result, 0.025, **kwargs)
         
         return result
     
@@ -630,7 +897,7 @@ class EnhancedFilmSimulation:
         result = cv2.cvtColor(np.clip(hsv, 0, 255).astype(np.uint8), cv2.COLOR_HSV2BGR)
         
         # 膠片顆粒
-        result = self._film_grain(result, 0.04)
+        result = self._film_grain(result, 0.04, **kwargs)
         
         return result
     
@@ -652,7 +919,7 @@ class EnhancedFilmSimulation:
         result = self._tone_curve(result, 'high_contrast')
         
         # 細膩顆粒
-        result = self._film_grain(result, 0.015, 0.5)
+        result = self._film_grain(result, 0.015, 0.5, **kwargs)
         
         return result
     
@@ -667,7 +934,7 @@ class EnhancedFilmSimulation:
         gray = self._tone_curve(gray, 'high_contrast')
         
         # Tri-X 特有的顆粒感
-        gray = self._film_grain(gray, 0.06, 1.0)
+        gray = self._film_grain(gray, 0.06, 1.0, **kwargs)
         
         # 轉回三通道
         result = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
@@ -686,7 +953,7 @@ class EnhancedFilmSimulation:
         gray = self._tone_curve(gray, 'film')
         
         # 極細的顆粒
-        gray = self._film_grain(gray, 0.01, 0.3)
+        gray = self._film_grain(gray, 0.01, 0.3, **kwargs)
         
         # 轉回三通道
         result = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
@@ -696,11 +963,11 @@ class EnhancedFilmSimulation:
     def _tmax_3200(self, img: np.ndarray, **kwargs) -> np.ndarray:
         """Kodak T-Max P3200 - 高感光黑白"""
         # 基於 T-Max 100 但顆粒明顯
-        result = self._tmax_100(img)
+        result = self._tmax_100(img, **kwargs)
         
         # 高感光顆粒
         gray = cv2.cvtColor(result, cv2.COLOR_BGR2GRAY)
-        gray = self._film_grain(gray, 0.08, 1.5)
+        gray = self._film_grain(gray, 0.08, 1.5, **kwargs)
         result = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
         
         return result
@@ -718,7 +985,7 @@ class EnhancedFilmSimulation:
         result = cv2.cvtColor(np.clip(hsv, 0, 255).astype(np.uint8), cv2.COLOR_HSV2BGR)
         
         # 膠片顆粒
-        result = self._film_grain(result, 0.03)
+        result = self._film_grain(result, 0.03, **kwargs)
         
         return result
     
@@ -736,17 +1003,17 @@ class EnhancedFilmSimulation:
         result = self._split_toning(result, (3, 1, -2), (-1, 2, 3), 0.2)
         
         # 膠片顆粒
-        result = self._film_grain(result, 0.035)
+        result = self._film_grain(result, 0.035, **kwargs)
         
         return result
     
     def _superia_1600(self, img: np.ndarray, **kwargs) -> np.ndarray:
         """Fujicolor Superia 1600 - 高感光"""
         # 基於 Superia 400
-        result = self._superia_400(img)
+        result = self._superia_400(img, **kwargs)
         
         # 高感光顆粒
-        result = self._film_grain(result, 0.065, 1.3)
+        result = self._film_grain(result, 0.065, 1.3, **kwargs)
         
         return result
     
@@ -761,7 +1028,7 @@ class EnhancedFilmSimulation:
         result = cv2.cvtColor(np.clip(hsv, 0, 255).astype(np.uint8), cv2.COLOR_HSV2BGR)
         
         # 高感光顆粒但保持自然
-        result = self._film_grain(result, 0.055, 1.1)
+        result = self._film_grain(result, 0.055, 1.1, **kwargs)
         
         return result
     
@@ -776,7 +1043,7 @@ class EnhancedFilmSimulation:
         result = cv2.cvtColor(np.clip(hsv, 0, 255).astype(np.uint8), cv2.COLOR_HSV2BGR)
         
         # 精細顆粒
-        result = self._film_grain(result, 0.015, 0.6)
+        result = self._film_grain(result, 0.015, 0.6, **kwargs)
         
         return result
     
@@ -794,7 +1061,7 @@ class EnhancedFilmSimulation:
         result = self._tone_curve(result, 'film')
         
         # 膠片顆粒
-        result = self._film_grain(result, 0.045)
+        result = self._film_grain(result, 0.045, **kwargs)
         
         return result
     
@@ -810,7 +1077,7 @@ class EnhancedFilmSimulation:
         result = self._tone_curve(result, 'film')
         
         # 膠片顆粒
-        result = self._film_grain(result, 0.04)
+        result = self._film_grain(result, 0.04, **kwargs)
         
         return result
     
@@ -828,18 +1095,18 @@ class EnhancedFilmSimulation:
         result = self._split_toning(result, (8, 3, -5), (-3, 2, 6), 0.2)
         
         # 精細顆粒
-        result = self._film_grain(result, 0.02, 0.8)
+        result = self._film_grain(result, 0.02, 0.8, **kwargs)
         
         return result
     
     def _vision3_500t(self, img: np.ndarray, **kwargs) -> np.ndarray:
         """Kodak Vision3 500T - 室內電影膠片"""
         # 基於 Vision3 250D 但偏暖
-        result = self._vision3_250d(img)
+        result = self._vision3_250d(img, **kwargs)
         result = self._color_temperature(result, 3200)
         
         # 稍微增加顆粒
-        result = self._film_grain(result, 0.035, 1.0)
+        result = self._film_grain(result, 0.035, 1.0, **kwargs)
         
         return result
     
@@ -848,13 +1115,16 @@ class EnhancedFilmSimulation:
     def _vintage_kodachrome(self, img: np.ndarray, **kwargs) -> np.ndarray:
         """復古 Kodachrome 風格"""
         # 基於 Kodachrome 64 但加入復古效果
-        result = self._kodachrome_64(img)
+        result = self._kodachrome_64(img, **kwargs)
         
         # 復古褪色
         result = self._vintage_fade(result, 0.3)
         
         # 增加顆粒感
-        result = self._film_grain(result, 0.04, 1.2)
+        result = self._film_grain(result, 0.04, 1.2, **kwargs)
+        
+        # 輕微漏光與灰塵
+        result = self._film_textures(result, light_leak=0.25, dust=0.3, **kwargs)
         
         return result
     
@@ -872,7 +1142,10 @@ class EnhancedFilmSimulation:
         result = cv2.cvtColor(np.clip(hsv, 0, 255).astype(np.uint8), cv2.COLOR_HSV2BGR)
         
         # 復古顆粒
-        result = self._film_grain(result, 0.05, 1.3)
+        result = self._film_grain(result, 0.05, 1.3, **kwargs)
+        
+        # 漏光、灰塵與底片邊框
+        result = self._film_textures(result, light_leak=0.35, dust=0.4, film_border=True, **kwargs)
         
         return result
     
@@ -893,7 +1166,10 @@ class EnhancedFilmSimulation:
         result = self._vintage_fade(result, 0.2)
         
         # 復古顆粒
-        result = self._film_grain(result, 0.035, 1.1)
+        result = self._film_grain(result, 0.035, 1.1, **kwargs)
+        
+        # 夏日午後的漏光
+        result = self._film_textures(result, light_leak=0.45, dust=0.25, **kwargs)
         
         return result
     
@@ -1153,6 +1429,8 @@ def main():
     print("\n使用方法:")
     print("film_sim = EnhancedFilmSimulation()")
     print("result = film_sim.apply_simulation(image, 'KODAK_PORTRA_400')")
+    print("\n批次沖洗整個資料夾:")
+    print("python darkroom.py ~/Pictures/piCam -s CLASSIC_CHROME -s KODAK_PORTRA_400 -o developed")
 
 
 if __name__ == "__main__":
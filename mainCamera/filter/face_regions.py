@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+臉部區域權重
+Face Region Weighting
+
+讓膚色調整只作用在人臉附近，而不是所有橘色的牆面：
+- 在 1/8 解析度以 Haar cascade 偵測，每 N 幀才偵測一次
+- 其餘幀以低解析度模板比對追蹤既有的框
+- 框轉為柔和的橢圓權重圖 (低解析度)，膚色遮罩乘上此權重
+
+找不到 cascade 檔案時自動停用，呼叫端回到純 HSV 遮罩。
+"""
+
+import os
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+_CASCADE_NAME = "haarcascade_frontalface_default.xml"
+_CASCADE_DIRS = [
+    getattr(getattr(cv2, "data", None), "haarcascades", ""),
+    "/usr/share/opencv4/haarcascades/",
+    "/usr/share/opencv/haarcascades/",
+    "/usr/local/share/opencv4/haarcascades/",
+]
+
+Box = Tuple[int, int, int, int]  # (x, y, w, h)，低解析度座標
+
+
+def find_cascade() -> Optional[str]:
+    for directory in _CASCADE_DIRS:
+        path = os.path.join(directory, _CASCADE_NAME) if directory else ""
+        if path and os.path.exists(path):
+            return path
+    return None
+
+
+class FaceRegionTracker:
+    """低解析度臉部偵測 + 幀間追蹤，輸出柔和權重圖"""
+
+    def __init__(self, detect_every: int = 10, scale: int = 8, cascade_path: Optional[str] = None,
+                 min_face: int = 12, track_threshold: float = 0.5, feather: float = 0.35):
+        """
+        Args:
+            detect_every: 預覽時每幾幀重新偵測一次
+            scale: 偵測與權重圖的縮小倍率
+            min_face: 低解析度下的最小臉部尺寸 (像素)
+            track_threshold: 模板比對低於此分數即放棄追蹤
+            feather: 權重邊緣柔化比例 (相對於臉部大小)
+        """
+        self.detect_every = max(1, detect_every)
+        self.scale = max(1, scale)
+        self.min_face = min_face
+        self.track_threshold = track_threshold
+        self.feather = feather
+
+        path = cascade_path or find_cascade()
+        self._cascade = cv2.CascadeClassifier(path) if path else None
+        if self._cascade is not None and self._cascade.empty():
+            self._cascade = None
+        self.reset()
+
+    @property
+    def available(self) -> bool:
+        return self._cascade is not None
+
+    def reset(self):
+        self.boxes: List[Box] = []
+        self._templates: List[np.ndarray] = []
+        self._frame_index = 0
+        self._small_shape = (0, 0)
+
+    # === 偵測與追蹤 ===
+
+    def _small_gray(self, image: np.ndarray) -> np.ndarray:
+        h, w = image.shape[:2]
+        small = cv2.resize(image, (max(1, w // self.scale), max(1, h // self.scale)),
+                           interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small[:, :, :3], cv2.COLOR_BGR2GRAY)
+        return small
+
+    def _detect(self, gray: np.ndarray):
+        faces = self._cascade.detectMultiScale(gray, scaleFactor=1.15, minNeighbors=4,
+                                               minSize=(self.min_face, self.min_face))
+        self.boxes = [tuple(int(v) for v in face) for face in faces]
+        self._templates = [gray[y:y + h, x:x + w].copy() for x, y, w, h in self.boxes]
+
+    def _track(self, gray: np.ndarray):
+        """在原位置附近 (半個臉寬) 做模板比對"""
+        boxes, templates = [], []
+        gh, gw = gray.shape
+        for (x, y, w, h), template in zip(self.boxes, self._templates):
+            margin_x, margin_y = w // 2, h // 2
+            x0, y0 = max(0, x - margin_x), max(0, y - margin_y)
+            x1, y1 = min(gw, x + w + margin_x), min(gh, y + h + margin_y)
+            window = gray[y0:y1, x0:x1]
+            if window.shape[0] < h or window.shape[1] < w:
+                continue
+            scores = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (dx, dy) = cv2.minMaxLoc(scores)
+            if score >= self.track_threshold:
+                nx, ny = x0 + dx, y0 + dy
+                boxes.append((nx, ny, w, h))
+                templates.append(gray[ny:ny + h, nx:nx + w].copy())
+        self.boxes, self._templates = boxes, templates
+
+    def update(self, frame: np.ndarray) -> List[Box]:
+        """預覽用：每 detect_every 幀偵測一次，其餘追蹤"""
+        if not self.available:
+            return []
+        gray = self._small_gray(frame)
+        if gray.shape != self._small_shape:
+            self.reset()
+            self._small_shape = gray.shape
+        if self._frame_index % self.detect_every == 0 or not self.boxes:
+            self._detect(gray)
+        else:
+            self._track(gray)
+        self._frame_index += 1
+        return self.boxes
+
+    def detect(self, image: np.ndarray) -> List[Box]:
+        """靜態影像用：單次偵測"""
+        if not self.available:
+            return []
+        gray = self._small_gray(image)
+        self._small_shape = gray.shape
+        self._detect(gray)
+        return self.boxes
+
+    # === 權重圖 ===
+
+    def weight_map(self, boxes: Optional[List[Box]] = None) -> Optional[np.ndarray]:
+        """低解析度柔和權重圖 (float32, 0-1)；沒有臉時全為 0，尚未處理任何影像時回傳 None"""
+        boxes = self.boxes if boxes is None else boxes
+        if self._small_shape == (0, 0):
+            return None
+        weight = np.zeros(self._small_shape, dtype=np.float32)
+        if not boxes:
+            return weight
+        for x, y, w, h in boxes:
+            # 臉部框往下延伸涵蓋頸部
+            center = (int(x + w / 2), int(y + h * 0.6))
+            axes = (max(1, int(w * 0.65)), max(1, int(h * 0.85)))
+            cv2.ellipse(weight, center, axes, 0, 0, 360, 1.0, -1)
+        sigma = max(1.0, self.feather * float(np.mean([b[2] for b in boxes])))
+        return cv2.GaussianBlur(weight, (0, 0), sigma)
+
+    @staticmethod
+    def upsample(weight: np.ndarray, shape: Tuple[int, int]) -> np.ndarray:
+        """權重圖放大到目標尺寸 (h, w)"""
+        h, w = shape[:2]
+        if weight.shape == (h, w):
+            return weight
+        return cv2.resize(weight, (w, h), interpolation=cv2.INTER_LINEAR)
+
+
+if __name__ == "__main__":
+    import time
+
+    tracker = FaceRegionTracker()
+    print(f"cascade: {'可用' if tracker.available else '未找到，停用'}")
+    frame = np.random.default_rng(0).integers(0, 255, (972, 1296, 3), dtype=np.uint8)
+    start = time.perf_counter()
+    for _ in range(30):
+        tracker.update(frame)
+    print(f"每幀 {(time.perf_counter() - start) / 30 * 1000:.2f} ms")
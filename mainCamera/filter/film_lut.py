@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+軟片 3D LUT 與 YUV420 直接處理
+Film 3D LUT & Direct YUV420 Processing
+
+- 將任何「逐像素」的軟片模擬烘焙為 3D LUT (在網格影像上執行一次原始算法)
+- 三線性內插套用於 BGR 影像
+- LUT 運算：串接、線性混合、強度調整，結果仍是一張 LUT，單次套用
+- YUV420 (I420) / NV12 直接處理，不經 RGB 轉換：
+  * Y 平面：由軟片對中性灰的響應得到 1D 亮度曲線，cv2.LUT 一次完成
+  * UV 平面：在 1/4 面積的色度解析度上以 YUV 域 3D LUT 計算
+  * 色彩造成的亮度變化 (例如飽和色變暗) 在色度解析度上修正後加回 Y
+
+顆粒等空間 / 隨機效果無法以 LUT 表示，烘焙時會被略過。
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# BT.601 係數 (picamera2 預覽 / 靜態影像的 sYCC 為全幅 BT.601)
+_KR, _KB = 0.299, 0.114
+_KG = 1.0 - _KR - _KB
+
+
+def _lattice_axis(size: int) -> np.ndarray:
+    return np.linspace(0.0, 255.0, size, dtype=np.float32)
+
+
+def _interp_tables(size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """8-bit 值對應的網格索引與內插比例 (查表取代逐像素除法)"""
+    pos = np.arange(256, dtype=np.float32) * ((size - 1) / 255.0)
+    index = np.minimum(pos.astype(np.int32), size - 2)
+    frac = (pos - index).astype(np.float32)
+    return index, frac
+
+
+def bgr_to_yuv(bgr: np.ndarray, full_range: bool = True) -> np.ndarray:
+    """BGR (float, 0-255) → YUV (float, 0-255)，U/V 以 128 為中心"""
+    b, g, r = bgr[..., 0], bgr[..., 1], bgr[..., 2]
+    y = _KR * r + _KG * g + _KB * b
+    u = (b - y) / (2.0 * (1.0 - _KB))
+    v = (r - y) / (2.0 * (1.0 - _KR))
+    if not full_range:
+        y = y * (219.0 / 255.0) + 16.0
+        u = u * (224.0 / 255.0)
+        v = v * (224.0 / 255.0)
+    return np.stack([y, u + 128.0, v + 128.0], axis=-1)
+
+
+def yuv_to_bgr(yuv: np.ndarray, full_range: bool = True) -> np.ndarray:
+    """YUV (float, 0-255) → BGR (float, 未裁切)"""
+    y = yuv[..., 0]
+    u = yuv[..., 1] - 128.0
+    v = yuv[..., 2] - 128.0
+    if not full_range:
+        y = (y - 16.0) * (255.0 / 219.0)
+        u = u * (255.0 / 224.0)
+        v = v * (255.0 / 224.0)
+    r = y + 2.0 * (1.0 - _KR) * v
+    b = y + 2.0 * (1.0 - _KB) * u
+    g = (y - _KR * r - _KB * b) / _KG
+    return np.stack([b, g, r], axis=-1)
+
+
+def split_yuv420(frame: np.ndarray, layout: str = "I420") -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """YUV420 緩衝區 (h*3/2, w) → (y, u, v) 平面 (view，不複製)"""
+    rows, w = frame.shape[:2]
+    h = rows * 2 // 3
+    ch, cw = h // 2, w // 2
+    y = frame[:h]
+    if layout == "I420":
+        chroma = frame[h:].reshape(-1)
+        u = chroma[:ch * cw].reshape(ch, cw)
+        v = chroma[ch * cw:2 * ch * cw].reshape(ch, cw)
+    elif layout == "NV12":
+        uv = frame[h:].reshape(ch, cw, 2)
+        u, v = uv[:, :, 0], uv[:, :, 1]
+    else:
+        raise ValueError(f"不支援的 YUV 排列: {layout}")
+    return y, u, v
+
+
+def merge_yuv420(out: np.ndarray, y: np.ndarray, u: np.ndarray, v: np.ndarray,
+                 layout: str = "I420") -> np.ndarray:
+    """將 (y, u, v) 平面寫回 YUV420 緩衝區 out"""
+    out_y, out_u, out_v = split_yuv420(out, layout)
+    out_y[:] = y
+    out_u[:] = u
+    out_v[:] = v
+    return out
+
+
+def yuv420_to_bgr(frame: np.ndarray, layout: str = "I420", full_range: bool = True) -> np.ndarray:
+    """YUV420 → uint8 BGR (色度以最近鄰上採樣，與 OpenCV 及 YUV LUT 路徑一致；逐像素後備路徑使用)"""
+    y, u, v = split_yuv420(frame, layout)
+    size = (y.shape[1], y.shape[0])
+    yuv = np.dstack([y, cv2.resize(u, size, interpolation=cv2.INTER_NEAREST),
+                     cv2.resize(v, size, interpolation=cv2.INTER_NEAREST)]).astype(np.float32)
+    return np.clip(yuv_to_bgr(yuv, full_range) + 0.5, 0, 255).astype(np.uint8)
+
+
+def bgr_to_yuv420(image: np.ndarray, layout: str = "I420", full_range: bool = True,
+                  out: Optional[np.ndarray] = None) -> np.ndarray:
+    """uint8 BGR → YUV420 (色度以 2x2 平均下採樣)"""
+    h, w = image.shape[:2]
+    yuv = np.clip(bgr_to_yuv(image[:, :, :3].astype(np.float32), full_range) + 0.5, 0, 255).astype(np.uint8)
+    chroma = cv2.resize(yuv[:, :, 1:], (w // 2, h // 2), interpolation=cv2.INTER_AREA)
+    if out is None:
+        out = np.empty((h * 3 // 2, w), dtype=np.uint8)
+    return merge_yuv420(out, yuv[:, :, 0], chroma[:, :, 0], chroma[:, :, 1], layout)
+
+
+class FilmLUT:
+    """3D LUT：table[c0, c1, c2] = 輸出 (三通道，與輸入同一色彩空間)"""
+
+    def __init__(self, table: np.ndarray, strip_height: int = 128, workers: Optional[int] = None):
+        if table.ndim != 4 or table.shape[:3] != (table.shape[0],) * 3 or table.shape[3] != 3:
+            raise ValueError(f"LUT 形狀錯誤: {table.shape}")
+        self.table = np.ascontiguousarray(table, dtype=np.float32)
+        self.size = table.shape[0]
+        self.strip_height = strip_height
+        self.workers = workers or os.cpu_count() or 1
+        self._index, self._frac = _interp_tables(self.size)
+        n = self.size
+        # 以 (c0, c1·n + c2) 的 2D 紋理存放：cv2.remap 的雙線性內插負責 c0、c2 軸，
+        # 相鄰兩個 c1 切片再手動線性內插
+        self._texture = self.table.reshape(n, n * n, 3)
+        self._position = np.arange(256, dtype=np.float32) * ((n - 1) / 255.0)
+        self._tile = (self._index * n).astype(np.float32)
+
+    # === 建立 ===
+
+    @classmethod
+    def identity(cls, size: int = 33) -> "FilmLUT":
+        axis = _lattice_axis(size)
+        c0, c1, c2 = np.meshgrid(axis, axis, axis, indexing="ij")
+        return cls(np.stack([c0, c1, c2], axis=-1))
+
+    @classmethod
+    def from_function(cls, func: Callable[[np.ndarray], np.ndarray], size: int = 33) -> "FilmLUT":
+        """
+        在網格影像上執行一次 func (uint8 BGR → uint8 BGR) 烘焙成 LUT
+
+        網格排成 (size*size, size) 的影像，func 內的 HSV / 曲線等逐像素運算
+        都能照常執行；成本只有一張約 200x33 像素的小圖。
+        """
+        lattice = cls.identity(size).table
+        grid = np.clip(lattice + 0.5, 0, 255).astype(np.uint8).reshape(size * size, size, 3)
+        out = func(grid)
+        if out.ndim == 2:
+            out = cv2.cvtColor(out, cv2.COLOR_GRAY2BGR)
+        return cls(out.reshape(size, size, size, 3).astype(np.float32))
+
+    # === 套用 ===
+
+    def _lookup(self, pixels: np.ndarray) -> np.ndarray:
+        """三線性內插 (pixels: (h, w, 3) uint8)，回傳 float32"""
+        map_y = self._position[pixels[..., 0]]
+        map_x = self._tile[pixels[..., 1]] + self._position[pixels[..., 2]]
+        f1 = self._frac[pixels[..., 1]][..., None]
+        lower = cv2.remap(self._texture, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        map_x += self.size
+        upper = cv2.remap(self._texture, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        return lower + (upper - lower) * f1
+
+    def apply(self, image: np.ndarray) -> np.ndarray:
+        """套用於 uint8 三通道影像，大圖分條多執行緒處理"""
+        h = image.shape[0]
+        output = np.empty(image.shape[:2] + (3,), dtype=np.uint8)
+
+        def process(y0):
+            y1 = min(y0 + self.strip_height, h)
+            result = self._lookup(image[y0:y1, :, :3])
+            output[y0:y1] = np.clip(result + 0.5, 0, 255).astype(np.uint8)
+
+        strips = range(0, h, self.strip_height)
+        if len(strips) == 1 or self.workers == 1:
+            for y0 in strips:
+                process(y0)
+        else:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                list(pool.map(process, strips))
+        return output
+
+    def sample(self, points: np.ndarray) -> np.ndarray:
+        """以浮點座標 (0-255) 三線性取樣 (用於建表與 LUT 運算，不追求速度)"""
+        n = self.size
+        pos = np.clip(points, 0, 255) * ((n - 1) / 255.0)
+        index = np.minimum(pos.astype(np.int32), n - 2)
+        frac = pos - index
+        result = np.zeros(points.shape, dtype=np.float32)
+        for d0 in (0, 1):
+            w0 = frac[..., 0] if d0 else 1 - frac[..., 0]
+            for d1 in (0, 1):
+                w1 = frac[..., 1] if d1 else 1 - frac[..., 1]
+                for d2 in (0, 1):
+                    w2 = frac[..., 2] if d2 else 1 - frac[..., 2]
+                    corner = self.table[index[..., 0] + d0, index[..., 1] + d1, index[..., 2] + d2]
+                    result += corner * (w0 * w1 * w2)[..., None]
+        return result
+
+    # === LUT 運算 (結果仍為單一 LUT，套用成本不變) ===
+
+    def resampled(self, size: int) -> "FilmLUT":
+        """改變網格大小"""
+        if size == self.size:
+            return self
+        return FilmLUT(self.sample(FilmLUT.identity(size).table))
+
+    def then(self, other: "FilmLUT") -> "FilmLUT":
+        """串接：先套用 self 再套用 other (例如原廠軟片後接使用者 LUT)"""
+        return FilmLUT(np.clip(other.sample(self.table), 0, 255))
+
+    def with_strength(self, strength: float) -> "FilmLUT":
+        """強度：0 = 原圖 (identity)，1 = 完整效果，>1 誇張化"""
+        identity = FilmLUT.identity(self.size).table
+        return FilmLUT(np.clip(identity + (self.table - identity) * strength, 0, 255))
+
+    @staticmethod
+    def blend(luts: Sequence["FilmLUT"], weights: Sequence[float]) -> "FilmLUT":
+        """線性混合多個 LUT (權重自動正規化，網格以最大者為準)"""
+        if not luts or len(luts) != len(weights):
+            raise ValueError("LUT 與權重數量不符")
+        total = float(sum(weights))
+        if total <= 0:
+            raise ValueError("權重總和必須大於 0")
+        size = max(lut.size for lut in luts)
+        table = np.zeros((size, size, size, 3), dtype=np.float32)
+        for lut, weight in zip(luts, weights):
+            table += lut.resampled(size).table * (weight / total)
+        return FilmLUT(table)
+
+    # === 檔案 ===
+
+    @classmethod
+    def from_cube(cls, path: str) -> "FilmLUT":
+        """載入 .cube 3D LUT (Adobe / Resolve 格式，RGB 0-1，R 變化最快)"""
+        size = None
+        domain_min, domain_max = np.zeros(3, np.float32), np.ones(3, np.float32)
+        values = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                keyword = line.split()[0].upper()
+                if keyword == "LUT_3D_SIZE":
+                    size = int(line.split()[1])
+                elif keyword == "DOMAIN_MIN":
+                    domain_min = np.array(line.split()[1:4], dtype=np.float32)
+                elif keyword == "DOMAIN_MAX":
+                    domain_max = np.array(line.split()[1:4], dtype=np.float32)
+                elif keyword == "LUT_1D_SIZE":
+                    raise ValueError(f"不支援 1D .cube: {path}")
+                elif keyword[0].isdigit() or keyword[0] in "-.":
+                    values.append([float(v) for v in line.split()[:3]])
+                # 其他關鍵字 (TITLE 等) 略過
+        if size is None or len(values) != size ** 3:
+            raise ValueError(f".cube 內容不完整: {path}")
+        rgb = (np.array(values, dtype=np.float32) - domain_min) / (domain_max - domain_min)
+        # 資料順序為 [b][g][r]，正好對應本類別的 (B, G, R) 索引；輸出轉為 BGR
+        table = rgb.reshape(size, size, size, 3)[..., ::-1] * 255.0
+        return cls(np.clip(table, 0, 255))
+
+    def save_cube(self, path: str, title: str = "piCamera film look"):
+        """輸出 .cube，可在其他軟體使用"""
+        rgb = self.table[..., ::-1].reshape(-1, 3) / 255.0
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f'TITLE "{title}"\nLUT_3D_SIZE {self.size}\n')
+            for r, g, b in rgb:
+                f.write(f"{r:.6f} {g:.6f} {b:.6f}\n")
+
+    # === YUV ===
+
+    def to_yuv(self, full_range: bool = True) -> "YUVFilmLUT":
+        return YUVFilmLUT.from_bgr_lut(self, full_range=full_range)
+
+
+class LUTBatch:
+    """多個 LUT 同時套用在同一張小圖 (例如軟片選單的即時縮圖)
+
+    索引與內插比例只計算一次，所有 LUT 疊成一張大表，
+    每個角落只需一次 gather 即可取得全部軟片的結果。
+    """
+
+    def __init__(self, luts: Sequence[FilmLUT]):
+        if not luts:
+            raise ValueError("至少需要一個 LUT")
+        self.size = max(lut.size for lut in luts)
+        self.count = len(luts)
+        n3 = self.size ** 3
+        self._stacked = np.concatenate([lut.resampled(self.size).table.reshape(-1, 3) for lut in luts])
+        self._lut_offsets = (np.arange(self.count, dtype=np.int64) * n3)
+        self._index, self._frac = _interp_tables(self.size)
+        n = self.size
+        self._offsets = (0, 1, n, n + 1, n * n, n * n + 1, n * n + n, n * n + n + 1)
+
+    def apply(self, image: np.ndarray, indices: Optional[Sequence[int]] = None) -> np.ndarray:
+        """
+        回傳 (k, h, w, 3) uint8，k 為 indices 指定的 LUT 數 (預設全部)
+
+        Args:
+            indices: 只計算這些 LUT (例如捲動區域中可見的項目)
+        """
+        pixels = image[..., :3]
+        lut_offsets = self._lut_offsets if indices is None else self._lut_offsets[list(indices)]
+        i0 = self._index[pixels[..., 0]].astype(np.int64)
+        i1 = self._index[pixels[..., 1]]
+        i2 = self._index[pixels[..., 2]]
+        f0 = self._frac[pixels[..., 0]][None, ..., None]
+        f1 = self._frac[pixels[..., 1]][None, ..., None]
+        f2 = self._frac[pixels[..., 2]][None, ..., None]
+        base = lut_offsets[:, None, None] + ((i0 * self.size + i1) * self.size + i2)[None]
+        c = [self._stacked[base + offset] for offset in self._offsets]
+        c00 = c[0] + (c[1] - c[0]) * f2
+        c01 = c[2] + (c[3] - c[2]) * f2
+        c10 = c[4] + (c[5] - c[4]) * f2
+        c11 = c[6] + (c[7] - c[6]) * f2
+        c0 = c00 + (c01 - c00) * f1
+        c1 = c10 + (c11 - c10) * f1
+        return np.clip(c0 + (c1 - c0) * f0 + 0.5, 0, 255).astype(np.uint8)
+
+
+class YUVFilmLUT:
+    """YUV 域的軟片 LUT，直接處理 YUV420 (I420) / NV12 緩衝區"""
+
+    def __init__(self, lut: FilmLUT, luma_curve: np.ndarray, full_range: bool = True):
+        """
+        Args:
+            lut: YUV → YUV 的 3D LUT
+            luma_curve: 中性灰的 Y → Y 曲線 (256 個 uint8)
+        """
+        self.lut = lut
+        self.luma_curve = luma_curve
+        self.full_range = full_range
+
+    @classmethod
+    def from_bgr_lut(cls, bgr_lut: FilmLUT, size: Optional[int] = None,
+                     full_range: bool = True) -> "YUVFilmLUT":
+        """以 BGR LUT 建立 YUV 網格：YUV 網格點 → BGR → LUT → YUV"""
+        size = size or bgr_lut.size
+        yuv_lattice = FilmLUT.identity(size).table
+        bgr = np.clip(yuv_to_bgr(yuv_lattice, full_range), 0, 255)
+        # 網格點不一定是整數，直接以浮點三線性內插取樣 BGR LUT
+        mapped = bgr_lut.sample(bgr)
+        yuv_table = np.clip(bgr_to_yuv(mapped, full_range), 0, 255)
+
+        # 中性灰 (U = V = 128) 的亮度響應
+        gray = np.zeros((256, 3), dtype=np.float32)
+        gray[:, 0] = np.arange(256)
+        gray[:, 1:] = 128.0
+        gray_bgr = np.clip(yuv_to_bgr(gray, full_range), 0, 255)
+        gray_y = bgr_to_yuv(bgr_lut.sample(gray_bgr), full_range)[:, 0]
+        luma_curve = np.clip(gray_y + 0.5, 0, 255).astype(np.uint8)
+        return cls(FilmLUT(yuv_table.astype(np.float32)), luma_curve, full_range)
+
+    def apply_planes(self, y: np.ndarray, u: np.ndarray, v: np.ndarray,
+                     luma_correction: bool = True) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        處理分離的平面 (y: h×w，u/v: h/2×w/2)
+
+        Args:
+            luma_correction: 將色彩相關的亮度變化 (在色度解析度計算) 加回 Y
+        """
+        ch, cw = u.shape
+        y_small = cv2.resize(y, (cw, ch), interpolation=cv2.INTER_AREA)
+        mapped = self.lut.apply(np.dstack([y_small, u, v]))
+        u_out = mapped[:, :, 1]
+        v_out = mapped[:, :, 2]
+
+        y_out = cv2.LUT(y, self.luma_curve)
+        if luma_correction:
+            # 3D LUT 的亮度與中性曲線的差異，只在色度解析度計算，再上採樣一次
+            delta = mapped[:, :, 0].astype(np.int16) - cv2.LUT(y_small, self.luma_curve).astype(np.int16)
+            delta_full = cv2.resize(delta, (y.shape[1], y.shape[0]), interpolation=cv2.INTER_LINEAR)
+            y_out = np.clip(y_out.astype(np.int16) + delta_full, 0, 255).astype(np.uint8)
+        return y_out, np.ascontiguousarray(u_out), np.ascontiguousarray(v_out)
+
+    def apply_yuv420(self, frame: np.ndarray, layout: str = "I420",
+                     luma_correction: bool = True, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        處理 picamera2 的 YUV420 緩衝區 (形狀 (h*3/2, w) 的 uint8)
+
+        Args:
+            layout: "I420" (Y, U, V 平面) 或 "NV12" (Y, 交錯 UV)
+            out: 可重複使用的輸出緩衝區
+        """
+        y, u, v = split_yuv420(frame, layout)
+        y_out, u_out, v_out = self.apply_planes(y, u, v, luma_correction)
+        if out is None:
+            out = np.empty_like(frame)
+        return merge_yuv420(out, y_out, u_out, v_out, layout)
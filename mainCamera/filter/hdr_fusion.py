@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+HDR 曝光融合模組
+HDR Exposure Fusion
+
+以 picamera2 控制包圍曝光 (3-5 張)，經低解析度快速對齊後，
+使用 Mertens 曝光融合 (Laplacian 金字塔) 合成。
+融合以分塊 (tile) 方式在多核心上平行計算，記憶體用量與影像大小無關，
+結果可直接送入軟片模擬引擎。
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+
+def _power(values: np.ndarray, exponent: float) -> np.ndarray:
+    return values if exponent == 1 else np.power(values, exponent)
+
+
+class ExposureFusion:
+    """分塊 Mertens 曝光融合"""
+
+    def __init__(self, contrast_weight: float = 1.0, saturation_weight: float = 1.0,
+                 exposure_weight: float = 1.0, levels: int = 6, tile_size: int = 512,
+                 workers: Optional[int] = None):
+        """
+        Args:
+            contrast_weight / saturation_weight / exposure_weight: Mertens 三項權重的指數
+            levels: Laplacian 金字塔層數
+            tile_size: 分塊大小 (像素)；每塊另外加上金字塔支撐範圍的邊界
+            workers: 平行執行緒數 (預設為 CPU 核心數)
+        """
+        self.contrast_weight = contrast_weight
+        self.saturation_weight = saturation_weight
+        self.exposure_weight = exposure_weight
+        self.levels = levels
+        self.tile_size = tile_size
+        # 邊界需涵蓋最粗層高斯核的影響範圍，分塊接縫才不會出現低頻落差
+        self.padding = 3 * (2 ** levels)
+        self.workers = workers or os.cpu_count() or 1
+        levels_01 = np.arange(256, dtype=np.float32) / 255.0
+        self._exposure_lut = np.exp(-((levels_01 - 0.5) ** 2) / (2 * 0.2 ** 2)).astype(np.float32)
+
+    # === 權重與金字塔 ===
+
+    def _weights(self, images: List[np.ndarray], images_u8: List[np.ndarray]) -> List[np.ndarray]:
+        """計算並正規化每張曝光的權重圖"""
+        weights = []
+        for img, img_u8 in zip(images, images_u8):
+            weight = np.ones(img.shape[:2], dtype=np.float32)
+            if self.contrast_weight:
+                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+                weight *= _power(np.abs(cv2.Laplacian(gray, cv2.CV_32F)), self.contrast_weight)
+            if self.saturation_weight:
+                b, g, r = cv2.split(img)
+                mean = (b + g + r) * (1.0 / 3.0)
+                variance = ((b - mean) ** 2 + (g - mean) ** 2 + (r - mean) ** 2) * (1.0 / 3.0)
+                weight *= _power(np.sqrt(variance), self.saturation_weight)
+            if self.exposure_weight:
+                # 良好曝光度只與 8-bit 像素值有關，以查找表取代逐像素 exp
+                well_exposed = cv2.LUT(img_u8, self._exposure_lut)
+                b, g, r = cv2.split(well_exposed)
+                weight *= _power(b * g * r, self.exposure_weight)
+            weights.append(weight + 1e-12)
+
+        total = np.sum(weights, axis=0)
+        return [w / total for w in weights]
+
+    def _level_count(self, shape: Tuple[int, int]) -> int:
+        return max(1, min(self.levels, int(np.log2(min(shape))) - 2))
+
+    def _fuse_region(self, images: List[np.ndarray], images_u8: List[np.ndarray]) -> np.ndarray:
+        """以 Laplacian 金字塔融合一個區域 (浮點 0-1 BGR 與對應的 uint8 影像)"""
+        levels = self._level_count(images[0].shape[:2])
+        weights = self._weights(images, images_u8)
+
+        fused = None
+        for img, weight in zip(images, weights):
+            # 影像的 Laplacian 金字塔與權重的高斯金字塔，逐張累加避免同時保留所有金字塔
+            gaussian = [img]
+            weight_pyramid = [weight]
+            for _ in range(levels):
+                gaussian.append(cv2.pyrDown(gaussian[-1]))
+                weight_pyramid.append(cv2.pyrDown(weight_pyramid[-1]))
+
+            contribution = []
+            for i in range(levels):
+                size = (gaussian[i].shape[1], gaussian[i].shape[0])
+                laplacian = gaussian[i] - cv2.pyrUp(gaussian[i + 1], dstsize=size)
+                contribution.append(laplacian * weight_pyramid[i][..., None])
+            contribution.append(gaussian[levels] * weight_pyramid[levels][..., None])
+
+            if fused is None:
+                fused = contribution
+            else:
+                for i, level in enumerate(contribution):
+                    fused[i] += level
+
+        # 重建金字塔
+        result = fused[-1]
+        for i in range(levels - 1, -1, -1):
+            size = (fused[i].shape[1], fused[i].shape[0])
+            result = cv2.pyrUp(result, dstsize=size) + fused[i]
+        return result
+
+    # === 對外介面 ===
+
+    def fuse(self, images: Sequence[np.ndarray]) -> np.ndarray:
+        """
+        融合多張包圍曝光 (uint8 BGR，尺寸需一致)
+
+        Returns:
+            uint8 BGR 融合結果
+        """
+        if len(images) < 2:
+            raise ValueError("曝光融合至少需要兩張影像")
+        h, w = images[0].shape[:2]
+        if any(img.shape[:2] != (h, w) for img in images):
+            raise ValueError("包圍曝光影像尺寸不一致")
+
+        output = np.empty((h, w, 3), dtype=np.uint8)
+        pad = self.padding
+        tiles = [(y, x) for y in range(0, h, self.tile_size) for x in range(0, w, self.tile_size)]
+
+        def process(tile):
+            y, x = tile
+            y1, x1 = min(y + self.tile_size, h), min(x + self.tile_size, w)
+            # 取含邊界的區域；影像外圍以鏡射補足，每塊大小一致
+            ry0, rx0 = max(0, y - pad), max(0, x - pad)
+            ry1, rx1 = min(h, y1 + pad), min(w, x1 + pad)
+            borders = (pad - (y - ry0), pad - (ry1 - y1), pad - (x - rx0), pad - (rx1 - x1))
+
+            region, region_u8 = [], []
+            for img in images:
+                crop = img[ry0:ry1, rx0:rx1]
+                if any(borders):
+                    crop = cv2.copyMakeBorder(crop, *borders, cv2.BORDER_REFLECT_101)
+                region_u8.append(crop)
+                region.append(crop.astype(np.float32) * (1.0 / 255.0))
+
+            fused = self._fuse_region(region, region_u8)
+            core = fused[pad:pad + (y1 - y), pad:pad + (x1 - x)]
+            output[y:y1, x:x1] = np.clip(core * 255.0 + 0.5, 0, 255).astype(np.uint8)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(process, tiles))
+        return output
+
+
+def align_exposures(images: Sequence[np.ndarray], reference_index: Optional[int] = None,
+                    max_dimension: int = 640, min_response: float = 0.05) -> List[np.ndarray]:
+    """
+    手持拍攝的快速平移對齊
+
+    在縮小的梯度圖上做相位相關 (梯度對曝光差異不敏感)，
+    只在全解析度上套用一次平移。
+    """
+    if reference_index is None:
+        reference_index = len(images) // 2
+    h, w = images[0].shape[:2]
+    scale = min(1.0, max_dimension / max(h, w))
+    small_size = (max(1, int(w * scale)), max(1, int(h * scale)))
+    window = cv2.createHanningWindow(small_size, cv2.CV_32F)
+
+    def gradient(img):
+        gray = cv2.cvtColor(cv2.resize(img, small_size, interpolation=cv2.INTER_AREA),
+                            cv2.COLOR_BGR2GRAY).astype(np.float32)
+        gray = cv2.equalizeHist(gray.astype(np.uint8)).astype(np.float32)
+        gx = cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3)
+        gy = cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3)
+        return cv2.magnitude(gx, gy)
+
+    reference = gradient(images[reference_index])
+    aligned = []
+    for i, img in enumerate(images):
+        if i == reference_index:
+            aligned.append(img)
+            continue
+        (dx, dy), response = cv2.phaseCorrelate(reference, gradient(img), window)
+        if response < min_response or (abs(dx) < 0.25 and abs(dy) < 0.25):
+            aligned.append(img)
+            continue
+        matrix = np.float32([[1, 0, -dx / scale], [0, 1, -dy / scale]])
+        aligned.append(cv2.warpAffine(img, matrix, (w, h), flags=cv2.INTER_LINEAR,
+                                      borderMode=cv2.BORDER_REFLECT_101))
+    return aligned
+
+
+class HDRCapture:
+    """picamera2 包圍曝光拍攝 + 曝光融合"""
+
+    def __init__(self, picam2, frames: int = 3, ev_step: float = 1.0,
+                 fusion: Optional[ExposureFusion] = None, stream: str = "main"):
+        """
+        Args:
+            picam2: 已啟動的 Picamera2 實例
+            frames: 包圍張數 (3 或 5)
+            ev_step: 每張間隔的 EV
+            stream: 擷取的串流名稱
+        """
+        if frames not in (3, 5):
+            raise ValueError("包圍張數必須為 3 或 5")
+        self.picam2 = picam2
+        self.frames = frames
+        self.ev_step = ev_step
+        self.fusion = fusion or ExposureFusion()
+        self.stream = stream
+        self.last_timing: Dict[str, float] = {}
+
+    @classmethod
+    def from_settings(cls, picam2, camera_settings) -> "HDRCapture":
+        """依 CameraSettings 的 HDR 設定建立"""
+        return cls(picam2, frames=camera_settings.hdr_frames, ev_step=camera_settings.hdr_ev_step)
+
+    def ev_offsets(self) -> List[float]:
+        half = self.frames // 2
+        return [(i - half) * self.ev_step for i in range(self.frames)]
+
+    def _capture_at(self, exposure_time: int, gain: float, max_wait_frames: int = 8) -> np.ndarray:
+        """設定曝光後等待控制生效的幀，再擷取"""
+        self.picam2.set_controls({"ExposureTime": exposure_time, "AnalogueGain": gain})
+        for _ in range(max_wait_frames):
+            request = self.picam2.capture_request()
+            try:
+                metadata = request.get_metadata()
+                actual = metadata.get("ExposureTime", exposure_time)
+                if abs(actual - exposure_time) <= max(100, exposure_time * 0.05):
+                    return request.make_array(self.stream)
+            finally:
+                request.release()
+        # 感光元件無法達到目標快門 (例如超過幀長) 時使用最後一幀
+        return self.picam2.capture_array(self.stream)
+
+    def capture_bracket(self) -> List[np.ndarray]:
+        """拍攝包圍曝光，回傳由暗到亮的影像 (串流原始色彩順序)"""
+        metadata = self.picam2.capture_metadata()
+        base_exposure = metadata.get("ExposureTime", 10000)
+        base_gain = metadata.get("AnalogueGain", 1.0)
+
+        self.picam2.set_controls({"AeEnable": False, "AwbEnable": False,
+                                  "ColourGains": metadata.get("ColourGains", (1.0, 1.0))})
+        try:
+            frames = []
+            for ev in self.ev_offsets():
+                exposure_time = max(100, int(base_exposure * (2.0 ** ev)))
+                frames.append(self._capture_at(exposure_time, base_gain))
+            return frames
+        finally:
+            self.picam2.set_controls({"AeEnable": True, "AwbEnable": True})
+
+    def capture_hdr(self, align: bool = True) -> np.ndarray:
+        """拍攝並融合，回傳 uint8 影像"""
+        start = time.perf_counter()
+        frames = [f[:, :, :3] for f in self.capture_bracket()]
+        captured = time.perf_counter()
+        if align:
+            frames = align_exposures(frames)
+        aligned = time.perf_counter()
+        result = self.fusion.fuse(frames)
+        fused = time.perf_counter()
+
+        self.last_timing = {
+            "capture": captured - start,
+            "align": aligned - captured,
+            "fusion": fused - aligned,
+        }
+        print(f"🌗 HDR 完成: 拍攝 {self.last_timing['capture']:.2f}s / "
+              f"對齊 {self.last_timing['align']:.2f}s / 融合 {self.last_timing['fusion']:.2f}s")
+        return result
+
+    def capture_and_develop(self, film_engine, simulation: str, **kwargs) -> np.ndarray:
+        """HDR 融合後交給軟片模擬引擎"""
+        return film_engine.apply_simulation(self.capture_hdr(), simulation, **kwargs)
+
+
+if __name__ == "__main__":
+    # 以合成包圍曝光測試融合速度
+    rng = np.random.default_rng(0)
+    base = cv2.GaussianBlur(rng.random((1944, 2592, 3), dtype=np.float32), (0, 0), 25)
+    base = (base - base.min()) / (base.max() - base.min())
+    bracket = [np.clip(base * (2.0 ** ev) * 255, 0, 255).astype(np.uint8) for ev in (-1.5, 0, 1.5)]
+
+    fusion = ExposureFusion()
+    start = time.perf_counter()
+    result = fusion.fuse(align_exposures(bracket))
+    print(f"融合 {result.shape[1]}x{result.shape[0]} x{len(bracket)}: "
+          f"{time.perf_counter() - start:.2f}s ({fusion.workers} 執行緒)")
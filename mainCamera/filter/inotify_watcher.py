@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Linux inotify 檔案監看
+Inotify Watcher
+
+以 ctypes 直接呼叫 libc 的 inotify，不需額外套件，也不輪詢目錄。
+供照片資料夾沖洗服務與相機配置熱重載共用。
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+from typing import Dict, List, Optional
+
+# inotify 事件旗標 (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_DELETE_SELF = 0x00000400
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+class InotifyWatcher:
+    """以 ctypes 包裝 Linux inotify，不需額外套件，也不輪詢目錄"""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1 失敗: {os.strerror(errno)}")
+        self._watches: Dict[int, str] = {}
+
+    def add_watch(self, path: str, mask: int = IN_CLOSE_WRITE | IN_MOVED_TO) -> int:
+        """監看目錄 (不遞迴)"""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"無法監看 {path}: {os.strerror(errno)}")
+        self._watches[wd] = path
+        return wd
+
+    def read_events(self, timeout: Optional[float] = None) -> List[Dict]:
+        """等待並讀取事件；逾時回傳空清單"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode(errors='replace')
+            offset += length
+            directory = self._watches.get(wd)
+            events.append({
+                'mask': mask,
+                'name': name,
+                'path': os.path.join(directory, name) if directory and name else directory,
+            })
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
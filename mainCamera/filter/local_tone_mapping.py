@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+局部色調映射 (高光卷掃 / 陰影提升)
+Local Tone Mapping
+
+- 在 1/8 解析度以 guided filter 估計保邊的亮度基底層
+- 只對基底層做高光壓縮與陰影提升，得到增益圖 (gain = f(base) / base)
+- 全解析度只需一次增益圖上採樣與一次乘法，細節 (原圖 / 基底) 完整保留
+- 三通道乘上同一增益，色相與飽和度比例不變
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import cv2
+import numpy as np
+
+
+class LocalToneMapper:
+    """低解析度基底層 + 全解析度增益的局部色調映射"""
+
+    def __init__(self, highlight_compression: float = 0.4, shadow_lift: float = 0.2,
+                 knee: float = 0.6, scale: int = 8, radius: int = 8, eps: float = 0.01,
+                 strip_height: int = 256, workers: Optional[int] = None):
+        """
+        Args:
+            highlight_compression: 高光壓縮強度 (0 = 不壓縮)
+            shadow_lift: 陰影提升強度 (0 = 不提升)
+            knee: 高光壓縮起始的基底亮度 (0-1)
+            scale: 基底層的縮小倍率
+            radius: 低解析度下的 guided filter 半徑
+            eps: guided filter 的保邊參數 (越小越保邊)
+        """
+        self.highlight_compression = highlight_compression
+        self.shadow_lift = shadow_lift
+        self.knee = knee
+        self.scale = max(1, scale)
+        self.radius = radius
+        self.eps = eps
+        self.strip_height = strip_height
+        self.workers = workers or os.cpu_count() or 1
+
+    def _base_layer(self, luma: np.ndarray) -> np.ndarray:
+        """自導引 guided filter，平滑紋理但保留大尺度邊緣"""
+        ksize = (2 * self.radius + 1, 2 * self.radius + 1)
+        mean = cv2.blur(luma, ksize)
+        variance = cv2.blur(luma * luma, ksize) - mean * mean
+        a = variance / (variance + self.eps)
+        b = mean - a * mean
+        return cv2.blur(a, ksize) * luma + cv2.blur(b, ksize)
+
+    def tone_curve(self, base: np.ndarray) -> np.ndarray:
+        """基底層的色調曲線：knee 以上平滑壓縮，暗部提升 (峰值約在 0.25)"""
+        lift = self.shadow_lift * 1.7 * base * (1.0 - base) ** 3
+        over = np.maximum(base - self.knee, 0.0)
+        rolloff = self.highlight_compression * over * over / max(1.0 - self.knee, 1e-6)
+        return base + lift - rolloff
+
+    def gain_map(self, image: np.ndarray) -> np.ndarray:
+        """低解析度增益圖 (float32)"""
+        h, w = image.shape[:2]
+        small_size = (max(1, w // self.scale), max(1, h // self.scale))
+        small = cv2.resize(image, small_size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            luma = cv2.cvtColor(small[:, :, :3], cv2.COLOR_BGR2GRAY)
+        else:
+            luma = small
+        luma = luma.astype(np.float32) * (1.0 / 255.0)
+        base = np.clip(self._base_layer(luma), 1.0 / 255.0, 1.0)
+        return np.clip(self.tone_curve(base) / base, 0.25, 4.0).astype(np.float32)
+
+    def apply(self, image: np.ndarray) -> np.ndarray:
+        """套用於 uint8 影像 (BGR 或灰階)"""
+        if image is None or image.size == 0:
+            return image
+        if self.highlight_compression <= 0 and self.shadow_lift <= 0:
+            return image
+
+        h, w = image.shape[:2]
+        gain = cv2.resize(self.gain_map(image), (w, h), interpolation=cv2.INTER_LINEAR)
+        output = np.empty_like(image)
+
+        def process(y0):
+            y1 = min(y0 + self.strip_height, h)
+            g = gain[y0:y1]
+            if image.ndim == 3:
+                g = g[:, :, None]
+            output[y0:y1] = np.clip(image[y0:y1] * g + 0.5, 0, 255).astype(np.uint8)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(process, range(0, h, self.strip_height)))
+        return output
+
+
+if __name__ == "__main__":
+    import time
+
+    # 亮天空 + 暗前景的合成場景
+    scene = np.full((1944, 2592, 3), 40, dtype=np.uint8)
+    scene[:900] = (250, 235, 220)
+    rng = np.random.default_rng(0)
+    scene = np.clip(scene + rng.normal(0, 6, scene.shape), 0, 255).astype(np.uint8)
+
+    mapper = LocalToneMapper()
+    start = time.perf_counter()
+    result = mapper.apply(scene)
+    elapsed = time.perf_counter() - start
+    print(f"局部色調映射: {elapsed * 1000:.0f} ms，天空 {scene[:800].mean():.0f} → {result[:800].mean():.0f}，"
+          f"前景 {scene[1100:].mean():.0f} → {result[1100:].mean():.0f}")
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+長曝光模擬
+Long-Exposure Simulation
+
+以連續的預覽 / 錄影幀串流疊加，模擬超過 1 秒快門的效果：
+- mean: 平均疊加 (ND 減光鏡效果，流水絲化、人群消失)
+- lighten: 取最大值 (光軌、星軌)
+- weighted: 指數衰減加權 (後簾效果，越新的幀越明顯)
+
+累加器在開始時一次配置 (float32)，來源幀不做任何緩衝，
+60 秒與 1 秒的疊加使用相同記憶體。
+"""
+
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+STACK_MODES = ("mean", "lighten", "weighted")
+
+
+class LongExposureStacker:
+    """預先配置的 float32 串流疊加器"""
+
+    def __init__(self, shape: Tuple[int, ...], mode: str = "mean", decay: float = 0.98):
+        """
+        Args:
+            shape: 幀尺寸 (h, w, c)
+            mode: mean / lighten / weighted
+            decay: weighted 模式每加入一幀，既有內容乘上的衰減係數
+        """
+        if mode not in STACK_MODES:
+            raise ValueError(f"不支援的疊加模式: {mode}")
+        self.mode = mode
+        self.decay = decay
+        self.shape = tuple(shape)
+        self._accumulator = np.zeros(self.shape, dtype=np.float32)
+        self._scratch = np.empty(self.shape, dtype=np.float32)
+        self._weight = 0.0
+        self.frame_count = 0
+
+    def reset(self):
+        self._accumulator.fill(0)
+        self._weight = 0.0
+        self.frame_count = 0
+
+    def add_frame(self, frame: np.ndarray, weight: float = 1.0):
+        """加入一幀 (uint8)；全部運算原地完成，不保留來源幀"""
+        if frame.shape != self.shape:
+            raise ValueError(f"幀尺寸 {frame.shape} 與疊加器 {self.shape} 不符")
+
+        # 轉型寫入預先配置的暫存區，避免每幀重新配置 float32 陣列
+        np.copyto(self._scratch, frame, casting="unsafe")
+        if self.mode == "lighten":
+            np.maximum(self._accumulator, self._scratch, out=self._accumulator)
+            self._weight = 1.0
+        else:
+            if self.mode == "weighted":
+                self._accumulator *= self.decay
+                self._weight *= self.decay
+            if weight != 1.0:
+                self._scratch *= weight
+            self._accumulator += self._scratch
+            self._weight += weight
+        self.frame_count += 1
+
+    def result(self) -> np.ndarray:
+        """目前的疊加結果 (uint8)"""
+        if self.frame_count == 0:
+            return np.zeros(self.shape, dtype=np.uint8)
+        out = np.empty(self.shape, dtype=np.uint8)
+        np.multiply(self._accumulator, 1.0 / self._weight, out=self._scratch)
+        self._scratch += 0.5
+        np.clip(self._scratch, 0, 255, out=self._scratch)
+        np.copyto(out, self._scratch, casting="unsafe")
+        return out
+
+    def preview(self, max_dimension: int = 640) -> np.ndarray:
+        """縮小後的疊加預覽 (先縮小再正規化，成本與預覽尺寸成正比)"""
+        h, w = self.shape[:2]
+        scale = min(1.0, max_dimension / max(h, w))
+        small = cv2.resize(self._accumulator, (max(1, int(w * scale)), max(1, int(h * scale))),
+                           interpolation=cv2.INTER_AREA)
+        return np.clip(small * (1.0 / max(self._weight, 1e-6)) + 0.5, 0, 255).astype(np.uint8)
+
+
+class LongExposureSession:
+    """從相機串流持續擷取並疊加，定期回呼預覽"""
+
+    def __init__(self, picam2, mode: str = "mean", stream: str = "main",
+                 preview_callback: Optional[Callable[[np.ndarray, Dict], None]] = None,
+                 preview_interval: float = 0.5, preview_size: int = 640, decay: float = 0.98):
+        """
+        Args:
+            stream: 擷取的串流 ("main" 或 "lores"，需為 RGB/BGR 格式)
+            preview_callback: 預覽回呼 (preview_image, progress)，例如更新主螢幕
+            preview_interval: 預覽更新間隔 (秒)
+        """
+        self.picam2 = picam2
+        self.mode = mode
+        self.stream = stream
+        self.preview_callback = preview_callback
+        self.preview_interval = preview_interval
+        self.preview_size = preview_size
+        self.decay = decay
+        self.stacker: Optional[LongExposureStacker] = None
+        self._cancelled = False
+
+    def cancel(self):
+        """中途停止 (保留已疊加的結果)"""
+        self._cancelled = True
+
+    def run(self, duration: float) -> np.ndarray:
+        """疊加 duration 秒，回傳 uint8 結果"""
+        self._cancelled = False
+        first = self.picam2.capture_array(self.stream)[:, :, :3]
+        self.stacker = LongExposureStacker(first.shape, self.mode, self.decay)
+        self.stacker.add_frame(first)
+        del first
+
+        print(f"⏳ 長曝光開始: {duration:.0f}s ({self.mode})")
+        start = time.perf_counter()
+        last_preview = start
+        while not self._cancelled:
+            now = time.perf_counter()
+            elapsed = now - start
+            if elapsed >= duration:
+                break
+            self.stacker.add_frame(self.picam2.capture_array(self.stream)[:, :, :3])
+
+            if self.preview_callback and now - last_preview >= self.preview_interval:
+                last_preview = now
+                progress = {"elapsed": elapsed, "duration": duration,
+                            "frames": self.stacker.frame_count}
+                self.preview_callback(self.stacker.preview(self.preview_size), progress)
+
+        elapsed = time.perf_counter() - start
+        print(f"✅ 長曝光完成: {self.stacker.frame_count} 幀，{elapsed:.1f}s "
+              f"({self.stacker.frame_count / max(elapsed, 1e-6):.1f} fps)")
+        return self.stacker.result()
+
+    def run_and_develop(self, duration: float, film_engine, simulation: str, **kwargs) -> np.ndarray:
+        """長曝光後套用軟片模擬"""
+        return film_engine.apply_simulation(self.run(duration), simulation, **kwargs)
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    stacker = LongExposureStacker((1080, 1920, 3), mode="lighten")
+    start = time.perf_counter()
+    for i in range(60):
+        frame = rng.integers(0, 40, (1080, 1920, 3), dtype=np.uint8)
+        cv2.circle(frame, (30 * i + 20, 540), 8, (255, 255, 255), -1)
+        stacker.add_frame(frame)
+    elapsed = time.perf_counter() - start
+    trail = stacker.result()
+    print(f"lighten 60 幀: {elapsed / 60 * 1000:.1f} ms/幀，光軌像素 {int((trail[:, :, 0] > 200).sum())}")
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+多幀夜景模式
+Multi-Frame Night Mode
+
+針對 low_light 場景：連拍一小段 burst，在低解析度上估計對齊
+(相位相關 + ECC)，再於全解析度套用變換，以 float32 累加器逐幀合併。
+每幀依與參考幀的差異計算權重，排除移動物體造成的鬼影。
+記憶體固定約兩幀 (float32 累加器 + 對齊後的 uint8 幀)，權重留在對齊解析度、逐條上採樣，與 burst 長度無關。
+"""
+
+import queue
+import threading
+import time
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+
+class BurstMerger:
+    """參考幀對齊 + 穩健加權的串流式多幀合併"""
+
+    def __init__(self, align_dimension: int = 480, noise_sigma: float = 6.0,
+                 rejection_scale: float = 3.0, use_ecc: bool = True, strip_height: int = 64):
+        """
+        Args:
+            align_dimension: 對齊估計用的低解析度長邊
+            noise_sigma: 預期雜訊標準差 (8-bit)，決定離群判定門檻
+            rejection_scale: 差異超過 noise_sigma × 此倍數時完全排除
+            use_ecc: 相位相關後是否再以 ECC 精修 (含旋轉)
+            strip_height: 累加時每條的列數 (暫存緩衝區大小)
+        """
+        self.align_dimension = align_dimension
+        self.noise_sigma = noise_sigma
+        self.rejection_scale = rejection_scale
+        self.use_ecc = use_ecc
+        self.strip_height = max(1, strip_height)
+        self.reset()
+
+    def reset(self):
+        self._reference_small: Optional[np.ndarray] = None
+        self._accumulator: Optional[np.ndarray] = None
+        self._weight_sum: Optional[np.ndarray] = None
+        self._scratch: Optional[np.ndarray] = None
+        self._weight_strip: Optional[np.ndarray] = None
+        self._scale = 1.0
+        self._small_size = (0, 0)
+        self.frame_count = 0
+        self.rejected_ratio = 0.0
+
+    # === 低解析度對齊 ===
+
+    def _small_gray(self, frame: np.ndarray) -> np.ndarray:
+        small = cv2.resize(frame, self._small_size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.float32)
+
+    def _estimate_warp(self, small_gray: np.ndarray) -> np.ndarray:
+        """估計將 frame 對齊到參考幀的 2x3 仿射矩陣 (低解析度座標)"""
+        (dx, dy), _ = cv2.phaseCorrelate(self._reference_small, small_gray)
+        warp = np.float32([[1, 0, dx], [0, 1, dy]])
+        if self.use_ecc:
+            criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 1e-4)
+            try:
+                _, warp = cv2.findTransformECC(self._reference_small, small_gray, warp,
+                                               cv2.MOTION_EUCLIDEAN, criteria, None, 5)
+            except cv2.error:
+                # ECC 不收斂時保留相位相關的平移
+                pass
+        return warp
+
+    def _to_full_resolution(self, warp: np.ndarray) -> np.ndarray:
+        full = warp.copy()
+        full[:, 2] /= self._scale
+        return full
+
+    def _upsample_strip(self, weight_small: np.ndarray, y0: int, y1: int) -> np.ndarray:
+        """將低解析度權重的 [y0, y1) 列上採樣到全解析度 (與整張 INTER_LINEAR resize 對應)"""
+        h, w = self._accumulator.shape[:2]
+        sw, sh = self._small_size
+        fx, fy = sw / w, sh / h
+        # 目標像素 (x, y) 取樣來源 ((x + 0.5) * fx - 0.5, (y + y0 + 0.5) * fy - 0.5)
+        matrix = np.float32([[fx, 0, 0.5 * fx - 0.5],
+                             [0, fy, (y0 + 0.5) * fy - 0.5]])
+        strip = self._weight_strip[:y1 - y0]
+        cv2.warpAffine(weight_small, matrix, (w, y1 - y0), dst=strip,
+                       flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                       borderMode=cv2.BORDER_REPLICATE)
+        return strip[:, :, None]
+
+    # === 合併 ===
+
+    def add_frame(self, frame: np.ndarray):
+        """加入一幀 (uint8 BGR)；第一幀作為參考"""
+        frame = frame[:, :, :3]
+        h, w = frame.shape[:2]
+
+        if self._accumulator is None:
+            self._scale = min(1.0, self.align_dimension / max(h, w))
+            self._small_size = (max(1, int(w * self._scale)), max(1, int(h * self._scale)))
+            self._reference_small = self._small_gray(frame)
+            self._accumulator = frame.astype(np.float32)
+            self._weight_sum = np.ones(self._reference_small.shape, dtype=np.float32)
+            self._scratch = np.empty((min(self.strip_height, h), w, 3), dtype=np.float32)
+            self._weight_strip = np.empty((min(self.strip_height, h), w), dtype=np.float32)
+            self.frame_count = 1
+            return
+
+        small_gray = self._small_gray(frame)
+        warp = self._estimate_warp(small_gray)
+        aligned = cv2.warpAffine(frame, self._to_full_resolution(warp), (w, h),
+                                 flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                                 borderMode=cv2.BORDER_REPLICATE)
+
+        # 離群權重在低解析度計算 (平均後雜訊較低，判定更穩定)，累加時再逐條上採樣
+        aligned_small = cv2.warpAffine(small_gray, warp, self._small_size,
+                                       flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                                       borderMode=cv2.BORDER_REPLICATE)
+        difference = cv2.GaussianBlur(np.abs(aligned_small - self._reference_small), (5, 5), 0)
+        low, high = self.noise_sigma, self.noise_sigma * self.rejection_scale
+        weight_small = np.clip((high - difference) / (high - low), 0.0, 1.0)
+        self.rejected_ratio = float(np.mean(weight_small < 0.5))
+
+        # 原地累加 accumulator += aligned * weight：權重與乘積都分條放進固定的暫存緩衝區，
+        # 不產生全尺寸的 float32 暫存影像
+        for y0 in range(0, h, self.strip_height):
+            y1 = min(y0 + self.strip_height, h)
+            scratch = self._scratch[:y1 - y0]
+            np.multiply(aligned[y0:y1], self._upsample_strip(weight_small, y0, y1), out=scratch)
+            np.add(self._accumulator[y0:y1], scratch, out=self._accumulator[y0:y1])
+        # 線性上採樣可與加總交換，權重和留在低解析度，合併時再同樣上採樣
+        self._weight_sum += weight_small
+        self.frame_count += 1
+
+    def result(self) -> np.ndarray:
+        """目前的合併結果 (uint8)"""
+        if self._accumulator is None:
+            raise ValueError("尚未加入任何影像")
+        output = np.empty(self._accumulator.shape, dtype=np.uint8)
+        h = output.shape[0]
+        for y0 in range(0, h, self.strip_height):
+            y1 = min(y0 + self.strip_height, h)
+            scratch = self._scratch[:y1 - y0]
+            np.divide(self._accumulator[y0:y1], self._upsample_strip(self._weight_sum, y0, y1),
+                      out=scratch)
+            scratch += 0.5
+            np.clip(scratch, 0, 255, out=scratch)
+            output[y0:y1] = scratch
+        return output
+
+
+class NightModeCapture:
+    """連拍 + 同步合併：拍攝與合併在不同執行緒，佇列只保留一幀"""
+
+    def __init__(self, picam2, frames: int = 8, merger: Optional[BurstMerger] = None,
+                 stream: str = "main"):
+        self.picam2 = picam2
+        self.frames = frames
+        self.merger = merger or BurstMerger()
+        self.stream = stream
+        self.last_timing: Dict[str, float] = {}
+
+    @staticmethod
+    def should_use(analysis: Dict) -> bool:
+        """依 CameraColorCalibration.analyze_image_characteristics 的結果判斷是否啟用"""
+        return analysis.get("scene_type") == "low_light"
+
+    def noise_sigma_for_gain(self, analogue_gain: float) -> float:
+        """依增益估計雜訊，增益越高越寬鬆，避免把雜訊誤判為移動"""
+        return float(np.clip(3.0 * np.sqrt(max(analogue_gain, 1.0)), 3.0, 20.0))
+
+    def capture(self) -> np.ndarray:
+        """拍攝並合併 burst，回傳 uint8 影像"""
+        metadata = self.picam2.capture_metadata()
+        self.merger.noise_sigma = self.noise_sigma_for_gain(metadata.get("AnalogueGain", 1.0))
+        self.merger.reset()
+
+        # maxsize=1：合併跟不上時拍攝端會等待，記憶體不會隨 burst 增長
+        frames: "queue.Queue[Optional[np.ndarray]]" = queue.Queue(maxsize=1)
+        errors = []
+
+        def producer():
+            try:
+                for _ in range(self.frames):
+                    frames.put(self.picam2.capture_array(self.stream))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                frames.put(None)
+
+        start = time.perf_counter()
+        thread = threading.Thread(target=producer, name="night-burst", daemon=True)
+        thread.start()
+        while True:
+            frame = frames.get()
+            if frame is None:
+                break
+            self.merger.add_frame(frame)
+        thread.join()
+        if errors and self.merger.frame_count == 0:
+            raise errors[0]
+
+        elapsed = time.perf_counter() - start
+        self.last_timing = {"total": elapsed, "frames": self.merger.frame_count,
+                            "per_frame": elapsed / max(1, self.merger.frame_count)}
+        print(f"🌙 夜景合併完成: {self.merger.frame_count} 幀，{elapsed:.2f}s "
+              f"(離群比例 {self.merger.rejected_ratio:.1%})")
+        return self.merger.result()
+
+    def capture_and_develop(self, film_engine, simulation: str, **kwargs) -> np.ndarray:
+        """夜景合併後交給軟片模擬引擎 (多幀合併已降噪，預設不再做單幀降噪)"""
+        kwargs.setdefault("noise_reduction", "off")
+        return film_engine.apply_simulation(self.capture(), simulation, **kwargs)
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    clean = cv2.GaussianBlur(rng.integers(0, 255, (972, 1296, 3), dtype=np.uint8), (0, 0), 4)
+    merger = BurstMerger(noise_sigma=15.0)
+    start = time.perf_counter()
+    for i in range(8):
+        shifted = np.roll(clean, (i % 3, -(i % 2)), axis=(0, 1))
+        noisy = np.clip(shifted + rng.normal(0, 15, clean.shape), 0, 255).astype(np.uint8)
+        merger.add_frame(noisy)
+    merged = merger.result()
+    elapsed = time.perf_counter() - start
+    print(f"合併 8 幀: {elapsed / 8 * 1000:.0f} ms/幀，"
+          f"誤差 {np.abs(merged[8:-8, 8:-8].astype(np.float32) - clean[8:-8, 8:-8]).mean():.2f}")
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+軟片質感素材快取
+Film Texture Asset Cache
+
+漏光 (light leak)、灰塵 (dust)、底片邊框 (film border) 疊加素材：
+- 每種解析度只產生 / 載入一次 (可放自訂 PNG 於 textures/ 取代程序產生)
+- 以 8-bit 儲存，可選擇寫入磁碟後以 memmap 載入，不佔用常駐記憶體
+- LRU 快取，依位元組上限淘汰 (CM4 記憶體有限，可調整)
+- 合成時三種素材在同一次分條運算完成 (screen + multiply 融合)
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+TEXTURE_KINDS = ("light_leak", "dust", "film_border")
+DEFAULT_ASSET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "textures")
+
+
+class TextureAssetCache:
+    """依解析度快取的 8-bit 疊加素材"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, asset_dir: Optional[str] = DEFAULT_ASSET_DIR,
+                 cache_dir: Optional[str] = None, variants: int = 3,
+                 strip_height: int = 256, workers: Optional[int] = None):
+        """
+        Args:
+            max_bytes: 記憶體快取上限 (位元組)
+            asset_dir: 自訂素材資料夾 (<kind>.png / <kind>_<variant>.png)，不存在時程序產生
+            cache_dir: 磁碟快取資料夾；設定後素材存為 .npy 並以 memmap 載入
+            variants: 每種素材的變化數 (每張照片輪流使用，避免完全相同的灰塵)
+        """
+        self.max_bytes = max_bytes
+        self.asset_dir = asset_dir
+        self.cache_dir = cache_dir
+        self.variants = max(1, variants)
+        self.strip_height = strip_height
+        self.workers = workers or os.cpu_count() or 1
+        self._cache: "OrderedDict[Tuple, np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counter = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    # === 快取 ===
+
+    @property
+    def cached_bytes(self) -> int:
+        return self._bytes
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._bytes = 0
+
+    def next_variant(self) -> int:
+        """輪流取得素材變化編號"""
+        with self._lock:
+            self._counter += 1
+            return self._counter % self.variants
+
+    def get(self, kind: str, size: Tuple[int, int], variant: int = 0) -> np.ndarray:
+        """取得 (w, h) 解析度的素材 (uint8；light_leak 為三通道，其餘單通道)"""
+        if kind not in TEXTURE_KINDS:
+            raise ValueError(f"未知的素材類型: {kind}")
+        key = (kind, size, variant % self.variants)
+        with self._lock:
+            texture = self._cache.get(key)
+            if texture is not None:
+                self._cache.move_to_end(key)
+                return texture
+
+        texture = self._load_or_create(*key)
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = texture
+                self._bytes += texture.nbytes
+                # 淘汰最久未使用的素材，但保留剛加入的這一張
+                while self._bytes > self.max_bytes and len(self._cache) > 1:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._bytes -= evicted.nbytes
+        return texture
+
+    def _load_or_create(self, kind: str, size: Tuple[int, int], variant: int) -> np.ndarray:
+        w, h = size
+        disk_path = None
+        if self.cache_dir:
+            disk_path = os.path.join(self.cache_dir, f"{kind}_{w}x{h}_{variant}.npy")
+            if os.path.exists(disk_path):
+                return np.load(disk_path, mmap_mode="r")
+
+        texture = self._load_asset(kind, size, variant)
+        if texture is None:
+            texture = self._generate(kind, size, variant)
+
+        if disk_path:
+            tmp_path = disk_path + ".tmp.npy"
+            np.save(tmp_path, texture)
+            os.replace(tmp_path, disk_path)
+            return np.load(disk_path, mmap_mode="r")
+        return texture
+
+    def _load_asset(self, kind: str, size: Tuple[int, int], variant: int) -> Optional[np.ndarray]:
+        """載入自訂素材並縮放到目標解析度"""
+        if not self.asset_dir:
+            return None
+        for name in (f"{kind}_{variant}.png", f"{kind}.png"):
+            path = os.path.join(self.asset_dir, name)
+            if os.path.exists(path):
+                flag = cv2.IMREAD_COLOR if kind == "light_leak" else cv2.IMREAD_GRAYSCALE
+                asset = cv2.imread(path, flag)
+                if asset is not None:
+                    return cv2.resize(asset, size, interpolation=cv2.INTER_AREA)
+        return None
+
+    # === 程序產生 (每種解析度只執行一次) ===
+
+    def _generate(self, kind: str, size: Tuple[int, int], variant: int) -> np.ndarray:
+        rng = np.random.default_rng(1000 * TEXTURE_KINDS.index(kind) + variant)
+        if kind == "light_leak":
+            return self._generate_light_leak(size, rng)
+        if kind == "dust":
+            return self._generate_dust(size, rng)
+        return self._generate_film_border(size, rng)
+
+    @staticmethod
+    def _generate_light_leak(size: Tuple[int, int], rng: np.random.Generator) -> np.ndarray:
+        """從畫面邊緣滲入的暖色光斑 (低解析度繪製後放大)"""
+        w, h = size
+        sw, sh = 160, max(1, int(160 * h / w))
+        leak = np.zeros((sh, sw, 3), dtype=np.float32)
+        yy, xx = np.mgrid[0:sh, 0:sw].astype(np.float32)
+        edge_x = sw * (0.0 if rng.random() < 0.5 else 1.0)
+        for _ in range(3):
+            cx = edge_x + rng.normal(0, sw * 0.08)
+            cy = rng.uniform(0, sh)
+            radius = rng.uniform(0.15, 0.35) * sw
+            blob = np.exp(-((xx - cx) ** 2 + (yy - cy) ** 2) / (2 * radius ** 2))
+            # BGR：橙紅到洋紅
+            color = np.array([rng.uniform(0.1, 0.5), rng.uniform(0.3, 0.6), 1.0], dtype=np.float32)
+            leak += blob[:, :, None] * color
+        # 重疊處以指數柔和飽和，保持暖色色相而不是裁切成黃白平台
+        peak = leak.max(axis=2, keepdims=True)
+        leak = leak / np.maximum(peak, 1e-6) * (1.0 - np.exp(-1.5 * peak)) * 255
+        return cv2.resize(leak, size, interpolation=cv2.INTER_CUBIC).clip(0, 255).astype(np.uint8)
+
+    @staticmethod
+    def _generate_dust(size: Tuple[int, int], rng: np.random.Generator) -> np.ndarray:
+        """灰塵點與細毛 (單通道，數值為遮蔽強度)"""
+        w, h = size
+        dust = np.zeros((h, w), dtype=np.uint8)
+        scale = max(w, h) / 1000.0
+        for _ in range(int(60 * max(scale, 0.5))):
+            center = (int(rng.uniform(0, w)), int(rng.uniform(0, h)))
+            radius = max(1, int(rng.exponential(1.2) * scale))
+            cv2.circle(dust, center, radius, int(rng.uniform(120, 255)), -1, cv2.LINE_AA)
+        for _ in range(4):
+            points = np.cumsum(rng.normal(0, 6 * scale, (12, 2)), axis=0) + [rng.uniform(0, w), rng.uniform(0, h)]
+            cv2.polylines(dust, [points.astype(np.int32)], False, int(rng.uniform(100, 200)),
+                          max(1, int(scale)), cv2.LINE_AA)
+        return cv2.GaussianBlur(dust, (0, 0), max(0.6, 0.6 * scale))
+
+    @staticmethod
+    def _generate_film_border(size: Tuple[int, int], rng: np.random.Generator) -> np.ndarray:
+        """不規則的底片邊框 (單通道，255 = 完全遮住)"""
+        w, h = size
+        margin = max(2, int(min(w, h) * 0.025))
+        x = np.minimum(np.arange(w), np.arange(w)[::-1]).astype(np.float32)
+        y = np.minimum(np.arange(h), np.arange(h)[::-1]).astype(np.float32)
+        distance = np.minimum(x[None, :], y[:, None])
+        # 邊界位置輕微抖動，模擬片門的粗糙邊緣
+        jitter = cv2.resize(rng.uniform(-1, 1, (12, 12)).astype(np.float32), size, interpolation=cv2.INTER_CUBIC)
+        edge = margin * (1.0 + 0.25 * jitter)
+        softness = max(1.0, margin * 0.25)
+        return (np.clip((edge - distance) / softness + 0.5, 0, 1) * 255).astype(np.uint8)
+
+    # === 合成 ===
+
+    def composite(self, image: np.ndarray, light_leak: float = 0.0, dust: float = 0.0,
+                  film_border: bool = False, variant: Optional[int] = None) -> np.ndarray:
+        """
+        單次融合合成：out = (x + leak·(255 - x)/255) × (1 - dust) × (1 - border)
+
+        Args:
+            light_leak: 漏光強度 (0-1，screen 混合)
+            dust: 灰塵強度 (0-1，multiply 變暗)
+            film_border: 是否加上底片邊框
+        """
+        if light_leak <= 0 and dust <= 0 and not film_border:
+            return image
+        h, w = image.shape[:2]
+        size = (w, h)
+        variant = self.next_variant() if variant is None else variant
+        leak_tex = self.get("light_leak", size, variant) if light_leak > 0 else None
+        dust_tex = self.get("dust", size, variant) if dust > 0 else None
+        border_tex = self.get("film_border", size, variant) if film_border else None
+
+        output = np.empty_like(image)
+        leak_scale = light_leak / 255.0
+        dust_scale = dust / 255.0
+
+        def process(y0):
+            y1 = min(y0 + self.strip_height, h)
+            x = image[y0:y1].astype(np.float32)
+            if leak_tex is not None:
+                x += leak_tex[y0:y1] * leak_scale * (255.0 - x)
+            multiplier = None
+            if dust_tex is not None:
+                multiplier = 1.0 - dust_tex[y0:y1].astype(np.float32) * dust_scale
+            if border_tex is not None:
+                border = 1.0 - border_tex[y0:y1].astype(np.float32) * (1.0 / 255.0)
+                multiplier = border if multiplier is None else multiplier * border
+            if multiplier is not None:
+                x *= multiplier[:, :, None]
+            output[y0:y1] = np.clip(x + 0.5, 0, 255).astype(np.uint8)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(process, range(0, h, self.strip_height)))
+        return output
+
+
+if __name__ == "__main__":
+    import time
+
+    cache = TextureAssetCache(max_bytes=48 * 1024 * 1024)
+    image = np.full((1944, 2592, 3), 128, dtype=np.uint8)
+    for attempt in ("首次 (產生素材)", "再次 (快取)"):
+        start = time.perf_counter()
+        cache.composite(image, light_leak=0.6, dust=0.5, film_border=True, variant=0)
+        print(f"{attempt}: {(time.perf_counter() - start) * 1000:.0f} ms，快取 {cache.cached_bytes / 1e6:.1f} MB")
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+照片資料夾監看沖洗服務
+Watch-Folder Develop Daemon
+
+以 inotify 監看相機照片目錄，新照片寫入完成後自動排入佇列，
+在低優先權背景執行緒中套用目前選擇的軟片模擬並產生縮圖。
+CPU 負載或溫度過高時會暫停，讓出資源給 Live-View 管線。
+
+用法:
+    python watch_folder_daemon.py /home/kevin/Pictures -s CLASSIC_CHROME
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Callable, List, Optional
+
+import cv2
+
+from enhanced_film_simulation import EnhancedFilmSimulation
+from inotify_watcher import InotifyWatcher, IN_CLOSE_WRITE, IN_MOVED_TO, IN_DELETE_SELF, IN_ISDIR
+
+# RAW 解碼為選用功能
+try:
+    import rawpy
+    RAWPY_AVAILABLE = True
+except ImportError:
+    RAWPY_AVAILABLE = False
+
+JPEG_EXTENSIONS = {'.jpg', '.jpeg'}
+RAW_EXTENSIONS = {'.dng'}
+
+
+class SystemLoadMonitor:
+    """讀取 /proc/stat 與 thermal zone，判斷是否需要讓出 CPU"""
+
+    def __init__(self, thermal_path: str = "/sys/class/thermal/thermal_zone0/temp"):
+        self.thermal_path = thermal_path
+        self._last_cpu = self._read_cpu_times()
+
+    @staticmethod
+    def _read_cpu_times():
+        try:
+            with open("/proc/stat", "r") as f:
+                fields = [int(v) for v in f.readline().split()[1:]]
+            idle = fields[3] + (fields[4] if len(fields) > 4 else 0)
+            return idle, sum(fields)
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def cpu_percent(self) -> float:
+        """自上次呼叫以來的 CPU 使用率"""
+        current = self._read_cpu_times()
+        last, self._last_cpu = self._last_cpu, current
+        if current is None or last is None:
+            return 0.0
+        idle_delta = current[0] - last[0]
+        total_delta = current[1] - last[1]
+        if total_delta <= 0:
+            return 0.0
+        return 100.0 * (1.0 - idle_delta / total_delta)
+
+    def temperature(self) -> Optional[float]:
+        """SoC 溫度 (°C)，無法讀取時回傳 None"""
+        try:
+            with open(self.thermal_path, "r") as f:
+                return int(f.read().strip()) / 1000.0
+        except (OSError, ValueError):
+            return None
+
+
+class WatchFolderDaemon:
+    """監看照片目錄並在背景自動沖洗新照片"""
+
+    def __init__(self, photo_dir: str, simulation: str = 'PROVIA',
+                 output_subdir: str = 'developed', thumbnail_subdir: str = 'thumbnails',
+                 thumbnail_size: int = 320, jpeg_quality: int = 92,
+                 max_cpu_percent: float = 70.0, max_temperature: float = 70.0,
+                 apply_color_correction: bool = True,
+                 on_developed: Optional[Callable[[str, str, str], None]] = None):
+        """
+        Args:
+            photo_dir: 相機寫入照片的目錄 (例如 UltraCameraApp.photos_dir 或
+                StorageSettings.current_storage_path)
+            simulation: 初始軟片模擬，可透過 set_simulation() 即時切換
+            max_cpu_percent: CPU 使用率超過此值時暫停沖洗
+            max_temperature: SoC 溫度 (°C) 超過此值時暫停沖洗
+            on_developed: 完成時回呼 (來源, 沖洗結果, 縮圖)
+        """
+        self.photo_dir = os.path.abspath(photo_dir)
+        self.output_dir = os.path.join(self.photo_dir, output_subdir)
+        self.thumbnail_dir = os.path.join(self.photo_dir, thumbnail_subdir)
+        self.thumbnail_size = thumbnail_size
+        self.jpeg_quality = jpeg_quality
+        self.max_cpu_percent = max_cpu_percent
+        self.max_temperature = max_temperature
+        self.apply_color_correction = apply_color_correction
+        self.on_developed = on_developed
+
+        self._simulation = simulation
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._queued = set()
+        self._queued_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._watcher: Optional[InotifyWatcher] = None
+        self._load_monitor = SystemLoadMonitor()
+        self._engine: Optional[EnhancedFilmSimulation] = None
+
+        self.stats = {'developed': 0, 'failed': 0, 'throttled_seconds': 0.0}
+
+    # === 對外介面 ===
+
+    def set_simulation(self, simulation: str):
+        """切換之後新照片套用的軟片模擬"""
+        self._simulation = simulation
+        print(f"🎞️ 自動沖洗軟片切換為: {simulation}")
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def start(self):
+        """啟動監看與沖洗執行緒 (立即返回，不阻塞快門流程)"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        os.makedirs(self.thumbnail_dir, exist_ok=True)
+
+        self._watcher = InotifyWatcher()
+        # IN_CLOSE_WRITE: 相機寫完檔案；IN_MOVED_TO: 先寫暫存檔再改名的情況
+        self._watcher.add_watch(self.photo_dir, IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE_SELF)
+
+        self._stop_event.clear()
+        self._threads = [
+            threading.Thread(target=self._watch_loop, name="develop-watch", daemon=True),
+            threading.Thread(target=self._develop_loop, name="develop-worker", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        print(f"👀 監看照片目錄: {self.photo_dir} (軟片: {self._simulation})")
+
+    def stop(self, timeout: float = 5.0):
+        """停止服務；尚未處理的照片保留在目錄中，下次啟動可用 enqueue_existing() 補做"""
+        self._stop_event.set()
+        self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        if self._watcher:
+            self._watcher.close()
+            self._watcher = None
+        print(f"🛑 自動沖洗服務已停止 (完成 {self.stats['developed']} 張)")
+
+    def enqueue(self, path: str) -> bool:
+        """手動排入一張照片"""
+        if not self._is_candidate(path):
+            return False
+        with self._queued_lock:
+            if path in self._queued:
+                return False
+            self._queued.add(path)
+        self._queue.put(path)
+        return True
+
+    def enqueue_existing(self) -> int:
+        """排入目錄中尚未沖洗的照片"""
+        count = 0
+        for name in sorted(os.listdir(self.photo_dir)):
+            path = os.path.join(self.photo_dir, name)
+            if self._is_candidate(path) and not os.path.exists(self._output_path(path)):
+                count += self.enqueue(path)
+        return count
+
+    # === 內部流程 ===
+
+    def _is_candidate(self, path: str) -> bool:
+        name = os.path.basename(path)
+        # 忽略隱藏檔與寫入中的暫存檔
+        if name.startswith('.') or '.part' in name:
+            return False
+        ext = os.path.splitext(path)[1].lower()
+        if ext in JPEG_EXTENSIONS:
+            return os.path.isfile(path)
+        if ext in RAW_EXTENSIONS:
+            # picamera2 通常同時寫入 JPEG，有 JPEG 時沿用 JPEG 即可
+            stem = os.path.splitext(path)[0]
+            has_jpeg = any(os.path.exists(stem + e) for e in ('.jpg', '.jpeg', '.JPG'))
+            return RAWPY_AVAILABLE and not has_jpeg and os.path.isfile(path)
+        return False
+
+    def _output_path(self, source: str) -> str:
+        stem = os.path.splitext(os.path.basename(source))[0]
+        return os.path.join(self.output_dir, f"{stem}_{self._simulation}.jpg")
+
+    def _watch_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                events = self._watcher.read_events(timeout=0.5)
+            except (OSError, ValueError):
+                break
+            for event in events:
+                if event['mask'] & IN_DELETE_SELF:
+                    print(f"⚠️  照片目錄已移除: {self.photo_dir}")
+                    self._stop_event.set()
+                    break
+                if event['mask'] & IN_ISDIR or not event['path']:
+                    continue
+                self.enqueue(event['path'])
+
+    def _lower_priority(self):
+        """將沖洗執行緒設為最低排程優先權 (Linux 上 setpriority 以執行緒為單位)"""
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError) as e:
+            print(f"⚠️  無法降低沖洗執行緒優先權: {e}")
+        # 不呼叫 cv2.setNumThreads：該設定是整個行程共用的，在相機程式內執行時會連 Live-View 一起限制
+
+    def _wait_for_headroom(self):
+        """CPU 或溫度過高時等待，指數退避最長 5 秒"""
+        delay = 0.25
+        throttled_since = None
+        while not self._stop_event.is_set():
+            cpu = self._load_monitor.cpu_percent()
+            temperature = self._load_monitor.temperature()
+            too_hot = temperature is not None and temperature >= self.max_temperature
+            if cpu < self.max_cpu_percent and not too_hot:
+                break
+            if throttled_since is None:
+                throttled_since = time.monotonic()
+            self._stop_event.wait(delay)
+            delay = min(delay * 2, 5.0)
+        if throttled_since is not None:
+            self.stats['throttled_seconds'] += time.monotonic() - throttled_since
+
+    def _load_image(self, path: str):
+        if os.path.splitext(path)[1].lower() in RAW_EXTENSIONS:
+            with rawpy.imread(path) as raw:
+                rgb = raw.postprocess(use_camera_wb=True, half_size=True)
+            return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+        return cv2.imread(path, cv2.IMREAD_COLOR)
+
+    def _develop_loop(self):
+        self._lower_priority()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self._engine = EnhancedFilmSimulation(enable_calibration=self.apply_color_correction)
+
+        while not self._stop_event.is_set():
+            path = self._queue.get()
+            if path is None:
+                break
+            try:
+                self._wait_for_headroom()
+                if self._stop_event.is_set():
+                    break
+                self._develop(path)
+            finally:
+                with self._queued_lock:
+                    self._queued.discard(path)
+
+    def _develop(self, path: str):
+        simulation = self._simulation
+        try:
+            img = self._load_image(path)
+            if img is None:
+                raise ValueError("無法載入圖像")
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                developed = self._engine.apply_simulation(
+                    img, simulation, apply_color_correction=self.apply_color_correction,
+                    face_aware="still")
+
+            output_path = self._output_path(path)
+            self._atomic_write(output_path, developed, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+
+            h, w = developed.shape[:2]
+            scale = self.thumbnail_size / max(h, w)
+            thumbnail = cv2.resize(developed, (max(1, int(w * scale)), max(1, int(h * scale))),
+                                   interpolation=cv2.INTER_AREA)
+            thumbnail_path = os.path.join(self.thumbnail_dir, os.path.basename(output_path))
+            self._atomic_write(thumbnail_path, thumbnail, [cv2.IMWRITE_JPEG_QUALITY, 85])
+
+            self.stats['developed'] += 1
+            print(f"🎞️ 自動沖洗完成: {os.path.basename(path)} → {os.path.basename(output_path)}")
+            if self.on_developed:
+                self.on_developed(path, output_path, thumbnail_path)
+        except Exception as e:
+            self.stats['failed'] += 1
+            print(f"❌ 自動沖洗失敗 {os.path.basename(path)}: {e}")
+
+    @staticmethod
+    def _atomic_write(path: str, image, params: List[int]):
+        root, ext = os.path.splitext(path)
+        tmp_path = f"{root}.part{ext}"
+        if not cv2.imwrite(tmp_path, image, params):
+            raise IOError(f"無法寫入: {path}")
+        os.replace(tmp_path, path)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="監看照片目錄並自動套用軟片模擬")
+    parser.add_argument('photo_dir', nargs='?', default="/home/kevin/Pictures", help="相機照片目錄")
+    parser.add_argument('-s', '--simulation', default='PROVIA', help="軟片模擬名稱")
+    parser.add_argument('--max-cpu', type=float, default=70.0, help="CPU 使用率上限 (%%)")
+    parser.add_argument('--max-temp', type=float, default=70.0, help="溫度上限 (°C)")
+    parser.add_argument('--backlog', action='store_true', help="啟動時補做目錄中尚未沖洗的照片")
+    args = parser.parse_args(argv)
+
+    daemon = WatchFolderDaemon(args.photo_dir, args.simulation,
+                               max_cpu_percent=args.max_cpu, max_temperature=args.max_temp)
+    daemon.start()
+    if args.backlog:
+        print(f"📋 補做既有照片: {daemon.enqueue_existing()} 張")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,37 +14,131 @@ from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 import threading
 import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from frame_view import FrameLabel
+from live_pipeline import (LivePipeline, CameraModes, lores_to_rgb,
+                          FramePool, resize_to_fit)
+from quality_controller import AdaptiveQualityController, FilterLUTCache, processing_size
+from still_capture import StillCapture, grab_still
+
+# 相機色彩校正與串流場景分析 (預覽以平滑後的場景參數校正，不逐幀重新判斷)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'colorCorrection'))
+try:
+    from camera_color_calibration import CameraColorCalibration
+    from scene_analyzer import StreamingSceneAnalyzer
+    SCENE_ANALYSIS_AVAILABLE = True
+except ImportError:
+    SCENE_ANALYSIS_AVAILABLE = False
 
 class CameraThread(QThread):
     frameReady = pyqtSignal(np.ndarray)
+    qualityChanged = pyqtSignal(dict)
     
-    def __init__(self, picam2):
+    SPATIAL_FILTERS = {8}  # ACROS 使用 CLAHE，無法以 LUT 表示
+    
+    def __init__(self, picam2, stream="lores", color_correction=False):
         super().__init__()
         self.picam2 = picam2
+        self.stream = stream  # 濾鏡在顯示器大小的 lores 上執行，main 保留給拍照
         self.running = True
         self.current_filter = 0
         self.exposure_value = 0
         self.aspect_ratio = 0  # 0: 4:3, 1: 16:9, 2: 1:1
+        self._displayed = threading.Event()
+        self.target_size = None  # 預覽區域 (寬, 高)，由 GUI 在尺寸改變時更新
+        self.pool = FramePool()
+        
+        # 依處理耗時自動調整預覽品質 (解析度 / LUT 濾鏡 / 縮圖更新頻率)
+        self.filter_luts = FilterLUTCache(self.apply_filter, self.SPATIAL_FILTERS)
+        self.quality = AdaptiveQualityController(
+            target_fps=30, lut_cost_ratio=lambda: self.filter_luts.cost_ratio(self.current_filter))
+        self.quality.subscribe(self.qualityChanged.emit)
+        
+        self.pipeline = LivePipeline(lambda: self.picam2.capture_array(self.stream),
+                                     self.process_frame, self.present_frame,
+                                     recycle=self.pool.release, on_stage=self.quality.record)
+        
+        # 相機色彩校正 (預設關閉)：串流場景分析每 N 幀取樣，發布平滑後的校正參數
+        self.calibration = None
+        self.scene = None
+        self.scene_params = None
+        self._rgb_profile = (None, None)  # (編譯後的配置, RGB 版本)
+        if color_correction and SCENE_ANALYSIS_AVAILABLE:
+            self.calibration = CameraColorCalibration()
+            self.scene = StreamingSceneAnalyzer(self.calibration)
         
     def run(self):
-        while self.running:
-            try:
-                frame = self.picam2.capture_array()
-                
-                # 應用濾鏡
-                frame = self.apply_filter(frame)
-                
-                # 應用曝光調整
-                frame = self.adjust_exposure(frame)
-                
-                # 應用裁切（根據比例）
-                frame = self.apply_aspect_ratio(frame)
-                
-                self.frameReady.emit(frame)
-                time.sleep(0.033)  # ~30 FPS
-            except Exception as e:
-                print(f"相機錯誤: {e}")
-                time.sleep(0.1)
+        # 擷取 / 處理 / 顯示分階段執行，由感光元件出幀驅動，過期畫面直接丟棄
+        self.pipeline.run()
+    
+    def process_frame(self, frame):
+        """處理階段：lores (YUV420) 轉 RGB → 裁切 → 縮放到處理解析度 → 色彩校正 → 濾鏡 → 曝光 → 預覽區域"""
+        decision = self.quality.update()
+        frame = lores_to_rgb(frame)
+        
+        # 應用裁切（根據比例），再一次縮放到品質等級的處理解析度，濾鏡只處理必要的像素
+        frame = self.apply_aspect_ratio(frame)
+        frame = resize_to_fit(frame, processing_size(frame.shape, self.target_size, decision["scale"]))
+        
+        # 色彩校正 (串流場景分析每 N 幀取樣一次，其餘幀沿用平滑後的參數)
+        frame = self.correct_colors(frame)
+        
+        # 應用濾鏡
+        frame = self.render_filter(frame, decision)
+        
+        # 應用曝光調整，寫入顯示緩衝區 (低解析度處理時同時放大到預覽區域)
+        return self.pool.fill(self.adjust_exposure(frame), self.target_size)
+    
+    def still_settings(self):
+        """快門當下的濾鏡 / 曝光 / 比例 / 場景參數 (背景沖洗期間使用者可能已變更設定)"""
+        return {"filter": self.current_filter, "exposure": self.exposure_value,
+                "aspect_ratio": self.aspect_ratio, "scene": self.scene_params or {}}
+    
+    def render_still(self, frame, settings=None):
+        """拍照：以快門當下的設定處理全解析度的拍照畫面 (全品質，不使用 LUT)"""
+        settings = settings or self.still_settings()
+        frame = self.correct_colors(frame, settings["scene"])
+        frame = self.adjust_exposure(self.apply_filter(frame, settings["filter"]), settings["exposure"])
+        return self.apply_aspect_ratio(frame, settings["aspect_ratio"])
+    
+    def correct_colors(self, frame, scene_params=None):
+        """相機色彩校正 (RGB)：預覽以串流場景分析的參數校正，拍照沿用快門當下的參數
+        
+        R / B 交換併入編譯後的矩陣與查表，直接在 RGB 上套用。
+        """
+        if self.calibration is None:
+            return frame
+        if scene_params is None:
+            # 場景分析每 N 幀才縮圖取樣，傳入 BGR 視圖不複製整張畫面
+            scene_params = self.scene_params = self.scene.update(frame[:, :, ::-1])
+        compiled = self.calibration.compile_profile(outdoor=scene_params.get("outdoor", 0.0))
+        source, rgb_profile = self._rgb_profile
+        if source is not compiled:
+            rgb_profile = compiled.for_rgb()
+            self._rgb_profile = (compiled, rgb_profile)
+        return rgb_profile.apply(frame, scene_params.get("exposure_ev", 0.0))
+    
+    def present_frame(self, frame):
+        """顯示階段：送到 GUI 並等待繪出，Qt 事件佇列中最多只有一幀"""
+        self._displayed.clear()
+        self.frameReady.emit(frame)
+        self._displayed.wait(0.5)
+    
+    def frame_displayed(self):
+        self._displayed.set()
+    
+    def render_filter(self, frame, decision):
+        """依品質決策套用濾鏡：低品質等級改用烘焙的 LUT (只在實測較快的濾鏡)"""
+        if decision["filter_tier"] == "lut":
+            lut = self.filter_luts.for_preview(self.current_filter)
+            if lut is not None:
+                return lut.apply(frame)
+        return self.apply_filter(frame)
+    
+    def telemetry(self):
+        """預覽管線與品質控制的遙測資料"""
+        return {"pipeline": self.pipeline.stats(), "quality": self.quality.telemetry()}
     
     def apply_tone_curve(self, frame, highlights=1.0, shadows=1.0, midtones=1.0):
         """精確的色調映射功能"""
@@ -71,27 +165,28 @@ class CameraThread(QThread):
         
         return np.clip(result * 255.0, 0, 255).astype(np.uint8)
     
-    def apply_filter(self, frame):
-        """應用 Fujifilm 風格濾鏡效果"""
-        if self.current_filter == 0:  # Provia (標準)
+    def apply_filter(self, frame, index=None):
+        """應用 Fujifilm 風格濾鏡效果 (index 預設為目前選擇的濾鏡)"""
+        index = self.current_filter if index is None else index
+        if index == 0:  # Provia (標準)
             return self.apply_provia(frame)
-        elif self.current_filter == 1:  # Velvia (鮮豔飽和)
+        elif index == 1:  # Velvia (鮮豔飽和)
             return self.apply_velvia(frame)
-        elif self.current_filter == 2:  # Astia (柔和人像)
+        elif index == 2:  # Astia (柔和人像)
             return self.apply_astia(frame)
-        elif self.current_filter == 3:  # Classic Chrome (復古鉵感)
+        elif index == 3:  # Classic Chrome (復古鉵感)
             return self.apply_classic_chrome(frame)
-        elif self.current_filter == 4:  # Pro Neg Hi (專業負片高對比)
+        elif index == 4:  # Pro Neg Hi (專業負片高對比)
             return self.apply_pro_neg_hi(frame)
-        elif self.current_filter == 5:  # Pro Neg Std (專業負片標準)
+        elif index == 5:  # Pro Neg Std (專業負片標準)
             return self.apply_pro_neg_std(frame)
-        elif self.current_filter == 6:  # Classic Neg (經典負片)
+        elif index == 6:  # Classic Neg (經典負片)
             return self.apply_classic_neg(frame)
-        elif self.current_filter == 7:  # Eterna (電影感)
+        elif index == 7:  # Eterna (電影感)
             return self.apply_eterna(frame)
-        elif self.current_filter == 8:  # Acros (黑白膠片)
+        elif index == 8:  # Acros (黑白膠片)
             return self.apply_acros(frame)
-        elif self.current_filter == 9:  # Monochrome (單色)
+        elif index == 9:  # Monochrome (單色)
             return self.apply_monochrome(frame)
         else:
             return frame
@@ -289,34 +384,36 @@ class CameraThread(QThread):
         
         return cv2.cvtColor(gray, cv2.COLOR_GRAY2RGB)
     
-    def adjust_exposure(self, frame):
-        """調整曝光"""
-        if self.exposure_value == 0:
+    def adjust_exposure(self, frame, exposure_value=None):
+        """調整曝光 (exposure_value 預設為目前的曝光值)"""
+        exposure_value = self.exposure_value if exposure_value is None else exposure_value
+        if exposure_value == 0:
             return frame
         
         # 轉換為 float 進行計算
         frame = frame.astype(np.float32)
         
         # 曝光調整 (-100 到 +100)
-        exposure_factor = 1.0 + (self.exposure_value / 100.0)
+        exposure_factor = 1.0 + (exposure_value / 100.0)
         frame = frame * exposure_factor
         
         # 限制範圍
         frame = np.clip(frame, 0, 255)
         return frame.astype(np.uint8)
     
-    def apply_aspect_ratio(self, frame):
-        """應用不同的長寬比"""
+    def apply_aspect_ratio(self, frame, aspect_ratio=None):
+        """應用不同的長寬比 (aspect_ratio 預設為目前選擇的比例)"""
         h, w = frame.shape[:2]
+        aspect_ratio = self.aspect_ratio if aspect_ratio is None else aspect_ratio
         
-        if self.aspect_ratio == 0:  # 4:3
+        if aspect_ratio == 0:  # 4:3
             return frame
-        elif self.aspect_ratio == 1:  # 16:9
+        elif aspect_ratio == 1:  # 16:9
             new_h = int(w * 9 / 16)
             if new_h < h:
                 crop_top = (h - new_h) // 2
                 return frame[crop_top:crop_top + new_h, :]
-        elif self.aspect_ratio == 2:  # 1:1 (正方形)
+        elif aspect_ratio == 2:  # 1:1 (正方形)
             size = min(h, w)
             crop_h = (h - size) // 2
             crop_w = (w - size) // 2
@@ -326,19 +423,36 @@ class CameraThread(QThread):
     
     def stop(self):
         self.running = False
+        self._displayed.set()
+        self.pipeline.stop()
 
 
 class CameraApp(QMainWindow):
-    def __init__(self):
+    stillPreviewReady = pyqtSignal(np.ndarray, str)
+    stillSaved = pyqtSignal(str, float)
+    resolutionSettled = pyqtSignal()
+    
+    RESOLUTIONS = [(640, 480), (1296, 972), (2592, 1944)]  # 拍照解析度 (預覽固定為 binning 模式)
+    
+    def __init__(self, display="hdmi"):
         super().__init__()
         self.picam2 = None
         self.camera_thread = None
-        self.current_frame = None
-        self.current_resolution = 1  # 0: 640x480, 1: 1296x972, 2: 2592x1944
+        self.modes = None
+        self.preview_size = None
+        self.display = display  # 預覽顯示器 (決定 lores 串流大小)
+        self.current_resolution = 2  # 0: 640x480, 1: 1296x972, 2: 2592x1944
         self.save_directory = "/home/kevin/Pictures/piCam"
         self.ensure_save_directory()
         self.init_camera()
         self.init_ui()
+        
+        # 拍照在背景沖洗，快門後 UI 立即返回；代理預覽與存檔結果以訊號回到 GUI 執行緒
+        self.stills = StillCapture(lambda frame, settings: self.camera_thread.render_still(frame, settings),
+                                   on_proxy=self.stillPreviewReady.emit, on_saved=self.stillSaved.emit)
+        self.stillPreviewReady.connect(self.show_still_preview)
+        self.stillSaved.connect(self.still_saved)
+        self.resolutionSettled.connect(self.sync_resolution_buttons)
     
     def ensure_save_directory(self):
         """確保儲存目錄存在"""
@@ -353,15 +467,16 @@ class CameraApp(QMainWindow):
         """初始化相機"""
         try:
             self.picam2 = Picamera2()
-            config = self.picam2.create_preview_configuration(
-                main={"size": (1296, 972), "format": "RGB888"}
-            )
-            self.picam2.configure(config)
-            self.picam2.start()
+            
+            # 預覽與各拍照解析度的設定只在啟動時建立一次，拍照時才切換感光元件模式
+            self.modes = CameraModes(self.picam2, self.RESOLUTIONS, self.display)
+            self.modes.start(self.current_resolution)
             
             # 啟動相機線程
             self.camera_thread = CameraThread(self.picam2)
+            self.camera_thread.target_size = self.preview_size
             self.camera_thread.frameReady.connect(self.update_frame)
+            self.camera_thread.qualityChanged.connect(self.update_quality)
             self.camera_thread.start()
             
         except Exception as e:
@@ -490,8 +605,8 @@ class CameraApp(QMainWindow):
             self.resolution_buttons.append(btn)
             res_buttons_layout.addWidget(btn)
         
-        # 預設選中中等解析度
-        self.resolution_buttons[1].setChecked(True)
+        # 預設選中目前的拍照解析度
+        self.resolution_buttons[self.current_resolution].setChecked(True)
         
         left_layout.addWidget(res_buttons_widget)
         
@@ -539,7 +654,8 @@ class CameraApp(QMainWindow):
         right_panel.setLayout(right_layout)
         
         # 預覽標籤
-        self.preview_label = QLabel()
+        self.preview_label = FrameLabel()
+        self.preview_label.resized.connect(self.preview_resized)
         self.preview_label.setStyleSheet("background-color: black;")
         self.preview_label.setAlignment(Qt.AlignCenter)
         self.preview_label.setMinimumSize(640, 480)
@@ -590,7 +706,19 @@ class CameraApp(QMainWindow):
             }
         """)
         
+        # 預覽品質標籤 (自動調整時顯示目前等級)
+        self.quality_label = QLabel("")
+        self.quality_label.setStyleSheet("color: #888; font-size: 11px; padding: 5px;")
+        
+        # 最近一張照片的預覽 (代理畫面先顯示，存檔後更新提示)
+        self.review_label = QLabel()
+        self.review_label.setFixedSize(120, 90)
+        self.review_label.setAlignment(Qt.AlignCenter)
+        self.review_label.setStyleSheet("background-color: #222; border: 1px solid #444;")
+        
+        bottom_layout.addWidget(self.review_label)
         bottom_layout.addStretch()
+        bottom_layout.addWidget(self.quality_label)
         bottom_layout.addWidget(self.ratio_label)
         bottom_layout.addWidget(self.capture_btn)
         bottom_layout.addStretch()
@@ -628,23 +756,37 @@ class CameraApp(QMainWindow):
         return QIcon(pixmap)
     
     def update_frame(self, frame):
-        """更新預覽畫面"""
-        self.current_frame = frame
-        
-        # 轉換為 QImage
-        h, w, ch = frame.shape
-        bytes_per_line = ch * w
-        qt_image = QImage(frame.data, w, h, bytes_per_line, QImage.Format_RGB888)
-        
-        # 縮放以適應預覽標籤
-        pixmap = QPixmap.fromImage(qt_image)
-        scaled_pixmap = pixmap.scaled(
-            self.preview_label.size(),
-            Qt.KeepAspectRatio,
-            Qt.SmoothTransformation
-        )
+        """更新預覽畫面 (處理端已縮放到預覽區域大小，這裡只包裝緩衝區，不轉換不複製)"""
+        self.preview_label.set_frame(frame, self.camera_thread.pool.release if self.camera_thread else None)
         
-        self.preview_label.setPixmap(scaled_pixmap)
+        # 通知顯示階段可以送下一幀
+        if self.camera_thread:
+            self.camera_thread.frame_displayed()
+    
+    def update_quality(self, decision):
+        """顯示目前的預覽品質等級 (最高品質時不顯示)"""
+        if decision["level"] == 0:
+            self.quality_label.setText("")
+        else:
+            self.quality_label.setText(f"預覽: {decision['name']}")
+    
+    def show_still_preview(self, frame, path):
+        """代理預覽完成：先顯示縮小的沖洗結果，全解析度照片仍在背景處理"""
+        h, w = frame.shape[:2]
+        image = QImage(frame.data, w, h, frame.strides[0], QImage.Format_RGB888)
+        self.review_label.setPixmap(QPixmap.fromImage(image).scaled(
+            self.review_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        self.review_label.setToolTip(f"沖洗中: {os.path.basename(path)}")
+    
+    def still_saved(self, path, elapsed_ms):
+        """全解析度照片已存檔"""
+        self.review_label.setToolTip(f"{path}\n({elapsed_ms:.0f} ms)")
+    
+    def preview_resized(self, size):
+        """預覽區域尺寸改變時通知處理端縮放到新的大小"""
+        self.preview_size = (size.width(), size.height())
+        if self.camera_thread:
+            self.camera_thread.target_size = self.preview_size
     
     def change_filter(self, index):
         """改變濾鏡"""
@@ -675,7 +817,7 @@ class CameraApp(QMainWindow):
             print(f"切換到比例: {ratios[self.camera_thread.aspect_ratio]}")
     
     def change_resolution(self, resolution_index):
-        """變更解析度 - 修復版本"""
+        """變更拍照解析度：選用啟動時預先建立的設定，預覽模式不變"""
         # 取消其他按鈕的選中狀態
         for i, btn in enumerate(self.resolution_buttons):
             btn.setChecked(i == resolution_index)
@@ -683,98 +825,47 @@ class CameraApp(QMainWindow):
         if self.current_resolution == resolution_index:
             return  # 已經是目前解析度，不需要變更
         
-        # 解析度對應表
-        resolutions = [
-            (640, 480),
-            (1296, 972),
-            (2592, 1944)
-        ]
-        
-        new_size = resolutions[resolution_index]
+        new_size = self.RESOLUTIONS[resolution_index]
         
         try:
             print(f"正在變更解析度為: {new_size[0]}x{new_size[1]}...")
+            started = time.perf_counter()
             
-            # 保存目前設定
-            current_filter = self.camera_thread.current_filter if self.camera_thread else 0
-            current_exposure = self.camera_thread.exposure_value if self.camera_thread else 0
-            current_aspect_ratio = self.camera_thread.aspect_ratio if self.camera_thread else 0
-            
-            # 安全停止相機線程
+            # 在擷取執行緒的兩幀之間變更，與已排入的快門保持先後順序
             if self.camera_thread:
-                self.camera_thread.running = False
-                self.camera_thread.wait(timeout=3000)  # 等待 3 秒
-                if self.camera_thread.isRunning():
-                    print("強制終止相機線程...")
-                    self.camera_thread.terminate()
-                    self.camera_thread.wait(1000)
-                self.camera_thread = None
-            
-            # 停止相機
-            if self.picam2:
-                self.picam2.stop()
-                time.sleep(1)  # 增加等待時間
-            
-            # 重新配置相機
-            config = self.picam2.create_preview_configuration(
-                main={"size": new_size, "format": "RGB888"}
-            )
-            self.picam2.configure(config)
-            self.picam2.start()
-            time.sleep(1.5)  # 等待相機完全穩定
-            
-            # 重新啟動相機線程並恢復設定
-            self.camera_thread = CameraThread(self.picam2)
-            self.camera_thread.current_filter = current_filter
-            self.camera_thread.exposure_value = current_exposure
-            self.camera_thread.aspect_ratio = current_aspect_ratio
-            self.camera_thread.frameReady.connect(self.update_frame)
-            self.camera_thread.start()
+                future = self.camera_thread.pipeline.call_between_frames(
+                    lambda: self.modes.switch(resolution_index))
+                try:
+                    future.result(timeout=3)
+                except FutureTimeoutError:
+                    # 擷取執行緒忙碌 (例如正在拍照)：尚未執行就取消，已開始執行則等完成後再同步按鈕
+                    if not future.cancel():
+                        future.add_done_callback(lambda _: self.resolutionSettled.emit())
+                        print("⚠️ 擷取執行緒忙碌，解析度將在目前的工作完成後變更")
+                        return
+                    raise TimeoutError("擷取執行緒忙碌，已取消變更")
+            else:
+                self.modes.switch(resolution_index)
             
             # 更新目前解析度
             self.current_resolution = resolution_index
             
-            print(f"✓ 解析度已成功變更為: {new_size[0]}x{new_size[1]}")
+            print(f"✓ 解析度已變更為: {new_size[0]}x{new_size[1]} "
+                  f"({(time.perf_counter() - started) * 1000:.0f} ms)")
             
         except Exception as e:
             print(f"解析度變更失敗: {e}")
-            QMessageBox.critical(self, "錯誤", f"無法變更解析度: {e}\n\n請重新啟動程式")
-            
-            # 嘗試恢復到安全的中等解析度
-            try:
-                print("嘗試恢復到安全解析度...")
-                if self.picam2:
-                    self.picam2.stop()
-                    time.sleep(1)
-                    config = self.picam2.create_preview_configuration(
-                        main={"size": (1296, 972), "format": "RGB888"}
-                    )
-                    self.picam2.configure(config)
-                    self.picam2.start()
-                    time.sleep(1)
-                    
-                    self.camera_thread = CameraThread(self.picam2)
-                    self.camera_thread.frameReady.connect(self.update_frame)
-                    self.camera_thread.start()
-                    
-                    self.current_resolution = 1
-                    self.resolution_buttons[1].setChecked(True)
-                    print("恢復成功")
-            except Exception as recovery_error:
-                print(f"恢復失敗: {recovery_error}")
-            # 重新啟動相機線程並恢復設定
-            self.camera_thread = CameraThread(self.picam2)
-            self.camera_thread.current_filter = current_filter
-            self.camera_thread.exposure_value = current_exposure
-            self.camera_thread.aspect_ratio = current_aspect_ratio
-            self.camera_thread.frameReady.connect(self.update_frame)
-            self.camera_thread.start()
+            QMessageBox.critical(self, "錯誤", f"無法變更解析度: {e}")
             
-            print(f"解析度已變更為: {new_size[0]}x{new_size[1]}")
-            
-        except Exception as e:
-            QMessageBox.warning(self, "警告", f"無法變更解析度: {e}")
+            # 恢復按鈕狀態 (仍使用原本的拍照解析度)
+            self.sync_resolution_buttons()
     
+    def sync_resolution_buttons(self):
+        """以實際使用中的拍照解析度更新按鈕狀態"""
+        self.current_resolution = self.modes.current
+        for i, btn in enumerate(self.resolution_buttons):
+            btn.setChecked(i == self.current_resolution)
+
     def change_save_path(self):
         """變更儲存路徑"""
         new_path = QFileDialog.getExistingDirectory(
@@ -790,17 +881,19 @@ class CameraApp(QMainWindow):
             print(f"儲存路徑已變更為: {new_path}")
     
     def capture_photo(self):
-        """拍照"""
-        if self.current_frame is not None:
+        """拍照：切換到拍照模式擷取全解析度畫面，沖洗與存檔在背景執行，UI 立即返回"""
+        if self.camera_thread is not None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"photo_{timestamp}.jpg"
             full_path = os.path.join(self.save_directory, filename)
             
-            # 轉換 RGB 到 BGR (OpenCV 格式)
-            bgr_frame = cv2.cvtColor(self.current_frame, cv2.COLOR_RGB2BGR)
-            cv2.imwrite(full_path, bgr_frame)
-            
-            print(f"✓ 照片已儲存: {full_path}")
+            # 設定在快門當下記錄，擷取在預覽管線的兩幀之間執行
+            settings = self.camera_thread.still_settings()
+            grab = lambda: grab_still(self.picam2, still_config=self.modes.still_config,
+                                      size=self.modes.still_size)
+            if not self.stills.capture(grab, full_path, settings,
+                                       self.camera_thread.pipeline.call_between_frames):
+                return
             
             # 顯示快門效果
             self.preview_label.setStyleSheet("background-color: white;")
@@ -808,6 +901,9 @@ class CameraApp(QMainWindow):
     
     def closeEvent(self, event):
         """關閉事件"""
+        # 等待已按下快門的照片存檔 (擷取仍需預覽管線)
+        self.stills.stop()
+        
         if self.camera_thread:
             self.camera_thread.stop()
             self.camera_thread.wait()
@@ -15,58 +15,210 @@ from PyQt5.QtGui import *
 import threading
 import time
 
+from frame_view import FrameLabel
+from live_pipeline import (LivePipeline, STILL_SIZE, create_live_configuration, create_still_configuration,
+                          lores_to_rgb, FramePool, resize_to_fit)
+from quality_controller import AdaptiveQualityController, FilterLUTCache, processing_size
+from still_capture import StillCapture, grab_still
+
+# 相機色彩校正與串流場景分析 (預覽以平滑後的場景參數校正，不逐幀重新判斷)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'colorCorrection'))
+try:
+    from camera_color_calibration import CameraColorCalibration
+    from scene_analyzer import StreamingSceneAnalyzer
+    SCENE_ANALYSIS_AVAILABLE = True
+except ImportError:
+    SCENE_ANALYSIS_AVAILABLE = False
+
+# 軟片選單即時縮圖 (批次 LUT)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'filter'))
+try:
+    from film_lut import LUTBatch
+    LIVE_THUMBNAILS_AVAILABLE = True
+except ImportError:
+    LIVE_THUMBNAILS_AVAILABLE = False
+
 class CameraThread(QThread):
     frameReady = pyqtSignal(np.ndarray)
+    qualityChanged = pyqtSignal(dict)
+    thumbnailsReady = pyqtSignal(dict)
     
-    def __init__(self, picam2):
+    FILTER_COUNT = 10
+    SPATIAL_FILTERS = {8}  # ACROS 使用 CLAHE，無法以 LUT 表示，縮圖直接計算
+    
+    def __init__(self, picam2, stream="lores", color_correction=False):
         super().__init__()
         self.picam2 = picam2
+        self.stream = stream  # 濾鏡在顯示器大小的 lores 上執行，main 保留給拍照
         self.running = True
         self.current_filter = 0
         self.exposure_value = 0
+        self._displayed = threading.Event()
+        self.target_size = None  # 預覽區域 (寬, 高)，由 GUI 在尺寸改變時更新
+        self.pool = FramePool()
+        
+        # 依處理耗時自動調整預覽品質 (解析度 / LUT 濾鏡 / 縮圖更新頻率)
+        self.filter_luts = FilterLUTCache(self.apply_filter, self.SPATIAL_FILTERS)
+        self.quality = AdaptiveQualityController(
+            target_fps=30, lut_cost_ratio=lambda: self.filter_luts.cost_ratio(self.current_filter))
+        self.quality.subscribe(self.qualityChanged.emit)
+        
+        self.pipeline = LivePipeline(lambda: self.picam2.capture_array(self.stream),
+                                     self.process_frame, self.present_frame,
+                                     recycle=self.pool.release, on_stage=self.quality.record)
+        
+        # 相機色彩校正 (預設關閉)：串流場景分析每 N 幀取樣，發布平滑後的校正參數
+        self.calibration = None
+        self.scene = None
+        self.scene_params = None
+        self._rgb_profile = (None, None)  # (編譯後的配置, RGB 版本)
+        if color_correction and SCENE_ANALYSIS_AVAILABLE:
+            self.calibration = CameraColorCalibration()
+            self.scene = StreamingSceneAnalyzer(self.calibration)
+        
+        # 軟片選單縮圖：共用一張縮小畫面，只更新可見項目，受每幀時間預算限制
+        self.thumbnail_size = (96, 72)
+        self.thumbnail_budget = 0.008      # 每次更新的時間預算 (秒)
+        self.thumbnail_interval = 0.2      # 更新間隔，超出預算時自動拉長
+        self.visible_filters = set(range(self.FILTER_COUNT))
+        self._thumbnail_batch = None
+        self._last_thumbnail = 0.0
+        if LIVE_THUMBNAILS_AVAILABLE:
+            self._thumbnail_batch = self.build_thumbnail_batch()
         
     def run(self):
-        while self.running:
-            try:
-                frame = self.picam2.capture_array()
-                
-                # 應用濾鏡
-                frame = self.apply_filter(frame)
-                
-                # 應用曝光調整
-                frame = self.adjust_exposure(frame)
-                
-                self.frameReady.emit(frame)
-                time.sleep(0.033)  # ~30 FPS
-            except Exception as e:
-                print(f"相機錯誤: {e}")
-                time.sleep(0.1)
-    
-    def apply_filter(self, frame):
-        """應用 Fujifilm 風格濾鏡效果"""
-        if self.current_filter == 0:  # Provia (標準)
+        # 擷取 / 處理 / 顯示分階段執行，由感光元件出幀驅動，過期畫面直接丟棄
+        self.pipeline.run()
+    
+    def process_frame(self, frame):
+        """處理階段：lores (YUV420) 轉 RGB → 縮放到處理解析度 → 色彩校正 → 縮圖 → 濾鏡 → 曝光 → 預覽區域"""
+        decision = self.quality.update()
+        frame = lores_to_rgb(frame)
+        
+        # 一次縮放到品質等級的處理解析度，濾鏡只處理必要的像素
+        frame = resize_to_fit(frame, processing_size(frame.shape, self.target_size, decision["scale"]))
+        
+        # 色彩校正 (串流場景分析每 N 幀取樣一次，其餘幀沿用平滑後的參數)
+        frame = self.correct_colors(frame)
+        
+        # 軟片選單縮圖 (在套用濾鏡前，從原始畫面產生)
+        self.update_thumbnails(frame)
+        
+        # 應用濾鏡
+        frame = self.render_filter(frame, decision)
+        
+        # 應用曝光調整，寫入顯示緩衝區 (低解析度處理時同時放大到預覽區域)
+        return self.pool.fill(self.adjust_exposure(frame), self.target_size)
+    
+    def still_settings(self):
+        """快門當下的濾鏡 / 曝光 / 場景參數 (背景沖洗期間使用者可能已變更設定)"""
+        return {"filter": self.current_filter, "exposure": self.exposure_value,
+                "scene": self.scene_params or {}}
+    
+    def render_still(self, frame, settings=None):
+        """拍照：以快門當下的設定處理全解析度的拍照畫面 (全品質，不使用 LUT)"""
+        settings = settings or self.still_settings()
+        frame = self.correct_colors(frame, settings["scene"])
+        return self.adjust_exposure(self.apply_filter(frame, settings["filter"]), settings["exposure"])
+    
+    def correct_colors(self, frame, scene_params=None):
+        """相機色彩校正 (RGB)：預覽以串流場景分析的參數校正，拍照沿用快門當下的參數
+        
+        R / B 交換併入編譯後的矩陣與查表，直接在 RGB 上套用。
+        """
+        if self.calibration is None:
+            return frame
+        if scene_params is None:
+            # 場景分析每 N 幀才縮圖取樣，傳入 BGR 視圖不複製整張畫面
+            scene_params = self.scene_params = self.scene.update(frame[:, :, ::-1])
+        compiled = self.calibration.compile_profile(outdoor=scene_params.get("outdoor", 0.0))
+        source, rgb_profile = self._rgb_profile
+        if source is not compiled:
+            rgb_profile = compiled.for_rgb()
+            self._rgb_profile = (compiled, rgb_profile)
+        return rgb_profile.apply(frame, scene_params.get("exposure_ev", 0.0))
+    
+    def present_frame(self, frame):
+        """顯示階段：送到 GUI 並等待繪出，Qt 事件佇列中最多只有一幀"""
+        self._displayed.clear()
+        self.frameReady.emit(frame)
+        self._displayed.wait(0.5)
+    
+    def frame_displayed(self):
+        self._displayed.set()
+    
+    def render_filter(self, frame, decision):
+        """依品質決策套用濾鏡：低品質等級改用烘焙的 LUT (只在實測較快的濾鏡)"""
+        if decision["filter_tier"] == "lut":
+            lut = self.filter_luts.for_preview(self.current_filter)
+            if lut is not None:
+                return lut.apply(frame)
+        return self.apply_filter(frame)
+    
+    def telemetry(self):
+        """預覽管線與品質控制的遙測資料"""
+        return {"pipeline": self.pipeline.stats(), "quality": self.quality.telemetry()}
+    
+    def apply_filter(self, frame, index=None):
+        """應用 Fujifilm 風格濾鏡效果 (index 預設為目前選擇的濾鏡)"""
+        index = self.current_filter if index is None else index
+        if index == 0:  # Provia (標準)
             return self.apply_provia(frame)
-        elif self.current_filter == 1:  # Velvia (鮮豔飽和)
+        elif index == 1:  # Velvia (鮮豔飽和)
             return self.apply_velvia(frame)
-        elif self.current_filter == 2:  # Astia (柔和人像)
+        elif index == 2:  # Astia (柔和人像)
             return self.apply_astia(frame)
-        elif self.current_filter == 3:  # Classic Chrome (復古鉵感)
+        elif index == 3:  # Classic Chrome (復古鉵感)
             return self.apply_classic_chrome(frame)
-        elif self.current_filter == 4:  # Pro Neg Hi (專業負片高對比)
+        elif index == 4:  # Pro Neg Hi (專業負片高對比)
             return self.apply_pro_neg_hi(frame)
-        elif self.current_filter == 5:  # Pro Neg Std (專業負片標準)
+        elif index == 5:  # Pro Neg Std (專業負片標準)
             return self.apply_pro_neg_std(frame)
-        elif self.current_filter == 6:  # Classic Neg (經典負片)
+        elif index == 6:  # Classic Neg (經典負片)
             return self.apply_classic_neg(frame)
-        elif self.current_filter == 7:  # Eterna (電影感)
+        elif index == 7:  # Eterna (電影感)
             return self.apply_eterna(frame)
-        elif self.current_filter == 8:  # Acros (黑白膠片)
+        elif index == 8:  # Acros (黑白膠片)
             return self.apply_acros(frame)
-        elif self.current_filter == 9:  # Monochrome (單色)
+        elif index == 9:  # Monochrome (單色)
             return self.apply_monochrome(frame)
         else:
             return frame
     
+    def build_thumbnail_batch(self):
+        """將逐像素的濾鏡烘焙為 LUT (網格影像上執行一次原始算法)，再疊成批次表"""
+        self._lut_filters = [i for i in range(self.FILTER_COUNT) if i not in self.SPATIAL_FILTERS]
+        luts = [self.filter_luts.get(i) for i in self._lut_filters]
+        return LUTBatch(luts)
+    
+    def update_thumbnails(self, frame):
+        """依時間預算更新可見項目的縮圖"""
+        if self._thumbnail_batch is None or not self.visible_filters:
+            return
+        now = time.perf_counter()
+        # 預覽品質降低時拉長縮圖更新間隔
+        if now - self._last_thumbnail < self.thumbnail_interval * self.quality.current["overlay_slowdown"]:
+            return
+        self._last_thumbnail = now
+        
+        small = cv2.resize(frame[:, :, :3], self.thumbnail_size, interpolation=cv2.INTER_AREA)
+        visible = self.visible_filters
+        batched = [i for i in self._lut_filters if i in visible]
+        thumbnails = {}
+        if batched:
+            rendered = self._thumbnail_batch.apply(small, [self._lut_filters.index(i) for i in batched])
+            thumbnails.update(zip(batched, rendered))
+        for index in self.SPATIAL_FILTERS & visible:
+            thumbnails[index] = self.apply_filter(small, index)
+        self.thumbnailsReady.emit(thumbnails)
+        
+        # 超出預算就降低更新頻率，有餘裕再逐步恢復
+        elapsed = time.perf_counter() - now
+        if elapsed > self.thumbnail_budget:
+            self.thumbnail_interval = min(1.0, self.thumbnail_interval * 1.5)
+        else:
+            self.thumbnail_interval = max(0.1, self.thumbnail_interval * 0.9)
+    
     def apply_tone_curve(self, channel, shadows=1.0, midtones=1.0, highlights=1.0):
         """精確的色調曲線調整"""
         normalized = channel / 255.0
@@ -344,24 +496,28 @@ class CameraThread(QThread):
         
         return cv2.cvtColor(gray, cv2.COLOR_GRAY2RGB)
     
-    def adjust_exposure(self, frame):
-        """調整曝光"""
-        if self.exposure_value == 0:
+    def adjust_exposure(self, frame, exposure_value=None):
+        """調整曝光 (exposure_value 預設為目前的曝光值)"""
+        exposure_value = self.exposure_value if exposure_value is None else exposure_value
+        if exposure_value == 0:
             return frame
         
         frame = frame.astype(np.float32)
-        exposure_factor = 1.0 + (self.exposure_value / 100.0)
+        exposure_factor = 1.0 + (exposure_value / 100.0)
         frame = frame * exposure_factor
         frame = np.clip(frame, 0, 255)
         return frame.astype(np.uint8)
     
     def stop(self):
         self.running = False
+        self._displayed.set()
+        self.pipeline.stop()
 
 
 class FilmSimulationWidget(QScrollArea):
     """可滑動的軟片模擬選擇器"""
     filterChanged = pyqtSignal(int)
+    visibleFiltersChanged = pyqtSignal(set)
     
     def __init__(self):
         super().__init__()
@@ -393,6 +549,7 @@ class FilmSimulationWidget(QScrollArea):
         container.setLayout(layout)
         
         self.filter_widgets = []
+        self.thumbnail_labels = []
         
         for i, filter_info in enumerate(self.filters):
             filter_widget = self.create_filter_widget(i, filter_info)
@@ -410,6 +567,31 @@ class FilmSimulationWidget(QScrollArea):
         
         self.setWidget(container)
         self.update_selection(0)
+        
+        # 捲動時通知相機線程只更新可見項目的縮圖
+        self.verticalScrollBar().valueChanged.connect(lambda _: self.notify_visible_filters())
+    
+    def visible_filters(self):
+        """目前捲動區域內可見的項目"""
+        top = self.verticalScrollBar().value()
+        bottom = top + self.viewport().height()
+        return {i for i, widget in enumerate(self.filter_widgets)
+                if widget.y() < bottom and widget.y() + widget.height() > top}
+    
+    def notify_visible_filters(self):
+        self.visibleFiltersChanged.emit(self.visible_filters())
+    
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.notify_visible_filters()
+    
+    def set_thumbnails(self, thumbnails):
+        """更新縮圖 (RGB uint8)"""
+        for index, image in thumbnails.items():
+            h, w = image.shape[:2]
+            # QImage 不持有 numpy 記憶體，需 copy 後再交給 QPixmap
+            qt_image = QImage(image.data, w, h, 3 * w, QImage.Format_RGB888).copy()
+            self.thumbnail_labels[index].setPixmap(QPixmap.fromImage(qt_image))
     
     def create_filter_widget(self, index, filter_info):
         """創建單個濾鏡選項"""
@@ -417,9 +599,20 @@ class FilmSimulationWidget(QScrollArea):
         widget.setFixedHeight(80)
         widget.setCursor(Qt.PointingHandCursor)
         
+        outer_layout = QHBoxLayout()
+        outer_layout.setContentsMargins(8, 4, 15, 4)
+        widget.setLayout(outer_layout)
+        
+        # 即時縮圖 (目前畫面套用此濾鏡)
+        thumbnail = QLabel()
+        thumbnail.setFixedSize(96, 72)
+        thumbnail.setStyleSheet("QLabel { background-color: #000000; border: none; }")
+        outer_layout.addWidget(thumbnail)
+        self.thumbnail_labels.append(thumbnail)
+        
         layout = QVBoxLayout()
-        layout.setContentsMargins(15, 10, 15, 10)
-        widget.setLayout(layout)
+        layout.setContentsMargins(0, 6, 0, 6)
+        outer_layout.addLayout(layout)
         
         # 濾鏡名稱
         name_label = QLabel(filter_info["name"])
@@ -497,16 +690,26 @@ class FilmSimulationWidget(QScrollArea):
 
 class XHalfCameraApp(QMainWindow):
     """Fujifilm X-half 風格相機應用程式"""
+    stillPreviewReady = pyqtSignal(np.ndarray, str)
+    stillSaved = pyqtSignal(str, float)
     
-    def __init__(self):
+    def __init__(self, display="hdmi"):
         super().__init__()
         self.picam2 = None
+        self.still_config = None
         self.camera_thread = None
-        self.current_frame = None
+        self.preview_size = None
+        self.display = display  # 預覽顯示器 (決定 lores 串流大小)
         self.save_directory = "/home/kevin/Pictures/piCam"
         self.ensure_save_directory()
         self.init_camera()
         self.init_ui()
+        
+        # 拍照在背景沖洗，快門後 UI 立即返回；代理預覽與存檔結果以訊號回到 GUI 執行緒
+        self.stills = StillCapture(lambda frame, settings: self.camera_thread.render_still(frame, settings),
+                                   on_proxy=self.stillPreviewReady.emit, on_saved=self.stillSaved.emit)
+        self.stillPreviewReady.connect(self.show_still_preview)
+        self.stillSaved.connect(self.still_saved)
     
     def ensure_save_directory(self):
         """確保儲存目錄存在"""
@@ -521,15 +724,17 @@ class XHalfCameraApp(QMainWindow):
         """初始化相機"""
         try:
             self.picam2 = Picamera2()
-            config = self.picam2.create_preview_configuration(
-                main={"size": (1296, 972), "format": "RGB888"}
-            )
+            # 預覽在 binning 模式，拍照時才以預先建立的設定切到全解析度
+            config = create_live_configuration(self.picam2, display=self.display)
+            self.still_config = create_still_configuration(self.picam2, STILL_SIZE)
             self.picam2.configure(config)
             self.picam2.start()
             
             # 啟動相機線程
             self.camera_thread = CameraThread(self.picam2)
+            self.camera_thread.target_size = self.preview_size
             self.camera_thread.frameReady.connect(self.update_frame)
+            self.camera_thread.qualityChanged.connect(self.update_quality)
             self.camera_thread.start()
             
         except Exception as e:
@@ -579,6 +784,9 @@ class XHalfCameraApp(QMainWindow):
         # 軟片模擬選擇器
         self.film_selector = FilmSimulationWidget()
         self.film_selector.filterChanged.connect(self.change_filter)
+        if self.camera_thread:
+            self.camera_thread.thumbnailsReady.connect(self.film_selector.set_thumbnails)
+            self.film_selector.visibleFiltersChanged.connect(self.change_visible_filters)
         left_layout.addWidget(self.film_selector)
         
         # === 右半邊：相機預覽 ===
@@ -589,7 +797,8 @@ class XHalfCameraApp(QMainWindow):
         right_panel.setLayout(right_layout)
         
         # 預覽標籤
-        self.preview_label = QLabel()
+        self.preview_label = FrameLabel()
+        self.preview_label.resized.connect(self.preview_resized)
         self.preview_label.setStyleSheet("background-color: black; border: 1px solid #333;")
         self.preview_label.setAlignment(Qt.AlignCenter)
         self.preview_label.setMinimumSize(390, 290)
@@ -649,10 +858,22 @@ class XHalfCameraApp(QMainWindow):
         
         bottom_layout.addWidget(self.exposure_slider)
         bottom_layout.addWidget(self.exposure_label)
+        
+        # 預覽品質標籤 (自動調整時顯示目前等級)
+        self.quality_label = QLabel("")
+        self.quality_label.setStyleSheet("color: #888; font-size: 11px;")
+        bottom_layout.addWidget(self.quality_label)
         bottom_layout.addStretch()
         bottom_layout.addWidget(self.shutter_btn)
         bottom_layout.addStretch()
         
+        # 最近一張照片的預覽 (代理畫面先顯示，存檔後更新提示)
+        self.review_label = QLabel()
+        self.review_label.setFixedSize(120, 90)
+        self.review_label.setAlignment(Qt.AlignCenter)
+        self.review_label.setStyleSheet("background-color: #222; border: 1px solid #444;")
+        bottom_layout.addWidget(self.review_label)
+        
         right_layout.addWidget(bottom_controls)
         
         # 組合左右面板
@@ -663,23 +884,37 @@ class XHalfCameraApp(QMainWindow):
         self.showFullScreen()
     
     def update_frame(self, frame):
-        """更新預覽畫面"""
-        self.current_frame = frame
-        
-        # 轉換為 QImage
-        h, w, ch = frame.shape
-        bytes_per_line = ch * w
-        qt_image = QImage(frame.data, w, h, bytes_per_line, QImage.Format_RGB888)
-        
-        # 縮放以適應預覽標籤
-        pixmap = QPixmap.fromImage(qt_image)
-        scaled_pixmap = pixmap.scaled(
-            self.preview_label.size(),
-            Qt.KeepAspectRatio,
-            Qt.SmoothTransformation
-        )
+        """更新預覽畫面 (處理端已縮放到預覽區域大小，這裡只包裝緩衝區，不轉換不複製)"""
+        self.preview_label.set_frame(frame, self.camera_thread.pool.release if self.camera_thread else None)
         
-        self.preview_label.setPixmap(scaled_pixmap)
+        # 通知顯示階段可以送下一幀
+        if self.camera_thread:
+            self.camera_thread.frame_displayed()
+    
+    def update_quality(self, decision):
+        """顯示目前的預覽品質等級 (最高品質時不顯示)"""
+        if decision["level"] == 0:
+            self.quality_label.setText("")
+        else:
+            self.quality_label.setText(f"預覽: {decision['name']}")
+    
+    def show_still_preview(self, frame, path):
+        """代理預覽完成：先顯示縮小的沖洗結果，全解析度照片仍在背景處理"""
+        h, w = frame.shape[:2]
+        image = QImage(frame.data, w, h, frame.strides[0], QImage.Format_RGB888)
+        self.review_label.setPixmap(QPixmap.fromImage(image).scaled(
+            self.review_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        self.review_label.setToolTip(f"沖洗中: {os.path.basename(path)}")
+    
+    def still_saved(self, path, elapsed_ms):
+        """全解析度照片已存檔"""
+        self.review_label.setToolTip(f"{path}\n({elapsed_ms:.0f} ms)")
+    
+    def preview_resized(self, size):
+        """預覽區域尺寸改變時通知處理端縮放到新的大小"""
+        self.preview_size = (size.width(), size.height())
+        if self.camera_thread:
+            self.camera_thread.target_size = self.preview_size
     
     def change_filter(self, index):
         """改變濾鏡"""
@@ -687,6 +922,11 @@ class XHalfCameraApp(QMainWindow):
             self.camera_thread.current_filter = index
             print(f"切換到濾鏡: {self.film_selector.filters[index]['name']}")
     
+    def change_visible_filters(self, indices):
+        """只更新捲動區域內可見的縮圖"""
+        if self.camera_thread:
+            self.camera_thread.visible_filters = indices
+    
     def change_exposure(self, value):
         """改變曝光值"""
         if self.camera_thread:
@@ -694,18 +934,19 @@ class XHalfCameraApp(QMainWindow):
             self.exposure_label.setText(f"EV: {value:+d}")
     
     def capture_photo(self):
-        """拍照"""
-        if self.current_frame is not None:
+        """拍照：切換到拍照模式擷取全解析度畫面，沖洗與存檔在背景執行，UI 立即返回"""
+        if self.camera_thread is not None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filter_name = self.film_selector.filters[self.camera_thread.current_filter]['name'].replace(' ', '_')
             filename = f"photo_{timestamp}_{filter_name}.jpg"
             full_path = os.path.join(self.save_directory, filename)
             
-            # 轉換 RGB 到 BGR (OpenCV 格式)
-            bgr_frame = cv2.cvtColor(self.current_frame, cv2.COLOR_RGB2BGR)
-            cv2.imwrite(full_path, bgr_frame)
-            
-            print(f"✓ 照片已儲存: {full_path}")
+            # 設定在快門當下記錄，擷取在預覽管線的兩幀之間執行
+            settings = self.camera_thread.still_settings()
+            if not self.stills.capture(lambda: grab_still(self.picam2, still_config=self.still_config),
+                                       full_path, settings,
+                                       self.camera_thread.pipeline.call_between_frames):
+                return
             
             # 快門效果
             self.preview_label.setStyleSheet("background-color: white; border: 1px solid #333;")
@@ -730,6 +971,9 @@ class XHalfCameraApp(QMainWindow):
     
     def closeEvent(self, event):
         """關閉事件"""
+        # 等待已按下快門的照片存檔 (擷取仍需預覽管線)
+        self.stills.stop()
+        
         if self.camera_thread:
             self.camera_thread.stop()
             self.camera_thread.wait()
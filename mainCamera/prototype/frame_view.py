@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+零複製預覽元件
+Zero-Copy Preview Label
+
+處理端已把畫面縮放到元件大小，GUI 執行緒只需：
+- 以 QImage 直接包裝 numpy 緩衝區 (不轉換、不複製、不轉 QPixmap)
+- paintEvent 置中繪出
+- 換下一幀時把前一個緩衝區歸還緩衝池
+"""
+
+from typing import Callable, Optional
+
+import numpy as np
+from PyQt5.QtCore import QSize, pyqtSignal
+from PyQt5.QtGui import QImage, QPainter
+from PyQt5.QtWidgets import QLabel
+
+
+class FrameLabel(QLabel):
+    """直接繪出 RGB888 numpy 畫面的 QLabel (保留樣式表背景，例如快門閃白效果)"""
+
+    resized = pyqtSignal(QSize)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._frame: Optional[np.ndarray] = None
+        self._image: Optional[QImage] = None
+        self._release: Optional[Callable[[np.ndarray], None]] = None
+
+    def set_frame(self, frame: np.ndarray, release: Optional[Callable[[np.ndarray], None]] = None):
+        """顯示新畫面；QImage 引用緩衝區記憶體，緩衝區在下一幀到來前不可歸還"""
+        previous, previous_release = self._frame, self._release
+        h, w = frame.shape[:2]
+        self._frame, self._release = frame, release
+        self._image = QImage(frame.data, w, h, frame.strides[0], QImage.Format_RGB888)
+        if previous_release is not None and previous is not None and previous is not frame:
+            previous_release(previous)
+        self.update()
+
+    def paintEvent(self, event):
+        super().paintEvent(event)  # 樣式表背景
+        if self._image is None:
+            return
+        painter = QPainter(self)
+        x = (self.width() - self._image.width()) // 2
+        y = (self.height() - self._image.height()) // 2
+        painter.drawImage(x, y, self._image)
+        painter.end()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.resized.emit(event.size())
@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+即時預覽管線
+Frame-Driven Live-View Pipeline
+
+擷取 → 處理 → 顯示 三個階段各自執行，以單格「最新畫面優先」的佇列連接：
+- 擷取階段由感光元件的出幀驅動 (capture_array 會阻塞到下一幀完成)，不使用固定 sleep
+- 下游忙碌時新畫面直接覆蓋舊畫面 (計入丟棄數)，不會累積延遲
+- 預覽延遲約為一幀的處理時間，幀率只受最慢的階段限制
+
+濾鏡在依顯示器大小設定的 lores 串流上執行；預覽時 main 維持 2x2 binning 的解析度，
+感光元件不必進入全解析度模式 (OV5647 全解析度約 15 fps)。
+拍照時以啟動時預先建立的拍照設定呼叫 switch_mode_and_capture，在擷取執行緒的兩幀之間執行，
+取得畫面後自動回到預覽模式；變更拍照解析度只改選用的設定，管線與執行緒不需重建。
+畫面在處理端一次縮放到預覽區域大小 (INTER_AREA) 後才套用濾鏡，
+輸出寫入可重複使用的緩衝池，GUI 只包裝顯示不再轉換或縮放。
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+
+Packet = Tuple[int, float, Any]  # (序號, 擷取時間, 畫面)
+
+# 預覽顯示器尺寸 (寬, 高)
+DISPLAY_SIZES = {
+    "ili9341": (320, 240),   # 2.4" SPI LCD (橫向)
+    "hdmi": (1920, 1080),
+}
+STILL_SIZE = (2592, 1944)  # OV5647 全解析度
+PREVIEW_SIZE = (1296, 972)  # OV5647 2x2 binning：全視角，幀率不受全解析度模式限制
+
+
+def fit_lores_size(display_size: Tuple[int, int], still_size: Tuple[int, int]) -> Tuple[int, int]:
+    """依 main 的長寬比放入顯示區域，不超過 main，寬高對齊 2 (YUV420 色度取樣)"""
+    dw, dh = display_size
+    sw, sh = still_size
+    scale = min(dw / sw, dh / sh, 1.0)
+    return max(2, int(sw * scale) // 2 * 2), max(2, int(sh * scale) // 2 * 2)
+
+
+def create_live_configuration(picam2, main_size: Tuple[int, int] = PREVIEW_SIZE,
+                              display: Union[str, Tuple[int, int]] = "hdmi"):
+    """
+    預覽設定：main 為 binning 解析度 (RGB888)，lores 為顯示器大小 (YUV420，Pi 4 以前的 ISP 只支援此格式)
+    
+    Args:
+        main_size: 預覽時的 main 串流解析度 (決定感光元件模式)
+        display: DISPLAY_SIZES 的名稱或 (寬, 高)
+    """
+    display_size = DISPLAY_SIZES[display] if isinstance(display, str) else tuple(display)
+    config = picam2.create_preview_configuration(
+        main={"size": tuple(main_size), "format": "RGB888"},
+        lores={"size": fit_lores_size(display_size, main_size), "format": "YUV420"},
+    )
+    picam2.align_configuration(config)
+    return config
+
+
+def create_still_configuration(picam2, still_size: Tuple[int, int] = STILL_SIZE):
+    """拍照設定 (RGB888)，啟動時建立一次，拍照時交給 switch_mode_and_capture"""
+    config = picam2.create_still_configuration(main={"size": tuple(still_size), "format": "RGB888"})
+    picam2.align_configuration(config)
+    return config
+
+
+class CameraModes:
+    """預覽固定在 binning 模式；各拍照解析度的設定在啟動時一次建立，拍照時才切換"""
+
+    def __init__(self, picam2, still_sizes: Sequence[Tuple[int, int]],
+                 display: Union[str, Tuple[int, int]] = "hdmi", preview_size: Tuple[int, int] = PREVIEW_SIZE):
+        """
+        Args:
+            still_sizes: 各模式的拍照解析度
+            preview_size: 預覽時的 main 串流解析度
+        """
+        self.picam2 = picam2
+        self.still_sizes = [tuple(size) for size in still_sizes]
+        self.preview_size = tuple(preview_size)
+        self.live_config = create_live_configuration(picam2, self.preview_size, display)
+        # 不超過預覽 main 的解析度直接由預覽畫面縮小，不需切換模式
+        self.still_configs = [None if self._fits_preview(size) else create_still_configuration(picam2, size)
+                              for size in self.still_sizes]
+        self.current: Optional[int] = None
+
+    def _fits_preview(self, size: Tuple[int, int]) -> bool:
+        return size[0] <= self.preview_size[0] and size[1] <= self.preview_size[1]
+
+    @property
+    def still_size(self) -> Tuple[int, int]:
+        return self.still_sizes[self.current]
+
+    @property
+    def still_config(self):
+        """目前拍照解析度的設定 (None 表示直接取預覽的 main)"""
+        return self.still_configs[self.current]
+
+    def start(self, index: int):
+        """以預覽設定啟動相機並選用拍照模式 (只在啟動時呼叫)"""
+        self.picam2.configure(self.live_config)
+        self.picam2.start()
+        self.current = index
+
+    def switch(self, index: int):
+        """
+        選用另一個拍照解析度
+        
+        預覽模式不變，只改變之後拍照使用的設定；與拍照在同一個執行緒呼叫
+        (LivePipeline.call_between_frames)，已按下的快門仍使用原本的解析度。
+        """
+        self.current = index
+
+
+def lores_to_rgb(frame: np.ndarray) -> np.ndarray:
+    """lores 的 YUV420 (I420) 陣列轉為 RGB；已是三通道時直接回傳"""
+    if frame.ndim == 2:
+        return cv2.cvtColor(frame, cv2.COLOR_YUV2RGB_I420)
+    return frame
+
+
+def main_to_rgb(frame: np.ndarray) -> np.ndarray:
+    """main 串流的 RGB888 陣列在記憶體中為 B, G, R (picamera2 的命名與 OpenCV 相反)"""
+    return cv2.cvtColor(frame[:, :, :3], cv2.COLOR_BGR2RGB)
+
+
+def fit_size(frame_size: Tuple[int, int], target_size: Tuple[int, int]) -> Tuple[int, int]:
+    """保持長寬比放入目標區域 (等同 Qt.KeepAspectRatio)"""
+    fw, fh = frame_size
+    tw, th = target_size
+    scale = min(tw / fw, th / fh)
+    return max(1, int(round(fw * scale))), max(1, int(round(fh * scale)))
+
+
+def resize_to_fit(frame: np.ndarray, target_size: Optional[Tuple[int, int]]) -> np.ndarray:
+    """縮放到預覽區域大小；縮小用 INTER_AREA，尺寸相同時不處理"""
+    if not target_size:
+        return frame
+    h, w = frame.shape[:2]
+    size = fit_size((w, h), target_size)
+    if size == (w, h):
+        return frame
+    interpolation = cv2.INTER_AREA if size[0] < w else cv2.INTER_LINEAR
+    return cv2.resize(frame, size, interpolation=interpolation)
+
+
+class FramePool:
+    """顯示用的畫面緩衝池：GUI 顯示完畢後歸還重複使用，尺寸改變時自動換新"""
+
+    def __init__(self, size: int = 4):
+        self.size = size
+        self._lock = threading.Lock()
+        self._free = []
+        self._shape: Optional[Tuple[int, ...]] = None
+        self.allocated = 0
+
+    def acquire(self, shape: Tuple[int, ...]) -> np.ndarray:
+        with self._lock:
+            if shape != self._shape:
+                self._shape, self._free = shape, []
+            if self._free:
+                return self._free.pop()
+            self.allocated += 1
+        return np.empty(shape, dtype=np.uint8)
+
+    def release(self, buffer: Optional[np.ndarray]):
+        if buffer is None:
+            return
+        with self._lock:
+            if buffer.shape == self._shape and len(self._free) < self.size:
+                self._free.append(buffer)
+
+    def fill(self, frame: np.ndarray, target_size: Optional[Tuple[int, int]] = None) -> np.ndarray:
+        """
+        將處理結果寫入池中的連續緩衝區 (GUI 可直接包裝為 QImage)
+        
+        以較低解析度處理時同時放大到 target_size，直接寫入緩衝區不另外配置
+        """
+        h, w = frame.shape[:2]
+        size = fit_size((w, h), target_size) if target_size else (w, h)
+        buffer = self.acquire((size[1], size[0]) + frame.shape[2:])
+        if size == (w, h):
+            np.copyto(buffer, frame)
+        else:
+            cv2.resize(frame, size, dst=buffer, interpolation=cv2.INTER_LINEAR)
+        return buffer
+
+
+class LatestFrameSlot:
+    """單格佇列：put 永不阻塞，覆蓋尚未取走的畫面；get 阻塞到有新畫面"""
+
+    def __init__(self, on_drop: Optional[Callable[[Packet], None]] = None):
+        self._condition = threading.Condition()
+        self._item: Optional[Packet] = None
+        self._closed = False
+        self._on_drop = on_drop  # 被覆蓋的畫面 (例如歸還緩衝池)
+        self.dropped = 0
+
+    def put(self, item: Packet):
+        with self._condition:
+            stale, self._item = self._item, item
+            self._condition.notify()
+        if stale is not None:
+            self.dropped += 1
+            if self._on_drop is not None:
+                self._on_drop(stale)
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Packet]:
+        """取走最新畫面；逾時或已關閉時回傳 None"""
+        with self._condition:
+            if self._item is None and not self._closed:
+                self._condition.wait(timeout)
+            item, self._item = self._item, None
+            return item
+
+    def clear(self):
+        """丟棄尚未取走的畫面 (例如切換模式後的舊尺寸畫面)"""
+        with self._condition:
+            stale, self._item = self._item, None
+        if stale is not None and self._on_drop is not None:
+            self._on_drop(stale)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def reopen(self):
+        with self._condition:
+            self._closed = False
+            self._item = None
+
+
+class _StageStats:
+    """各階段的幀率與耗時 (指數移動平均)"""
+
+    def __init__(self, smoothing: float = 0.1):
+        self.smoothing = smoothing
+        self.frames = 0
+        self.fps = 0.0
+        self.busy_ms = 0.0
+        self._last: Optional[float] = None
+
+    def record(self, started: float, finished: float):
+        self.frames += 1
+        self.busy_ms += self.smoothing * ((finished - started) * 1000 - self.busy_ms)
+        if self._last is not None and finished > self._last:
+            self.fps += self.smoothing * (1.0 / (finished - self._last) - self.fps)
+        self._last = finished
+
+
+class LivePipeline:
+    """擷取 / 處理 / 顯示 三階段預覽管線"""
+
+    def __init__(self, capture: Callable[[], Any], process: Callable[[Any], Any],
+                 present: Callable[[Any], None], error_backoff: float = 0.1,
+                 recycle: Optional[Callable[[Any], None]] = None,
+                 on_stage: Optional[Callable[[str, float], None]] = None):
+        """
+        Args:
+            capture: 阻塞到下一幀並回傳畫面 (例如 picam2.capture_array)
+            process: 濾鏡等處理，回傳要顯示的畫面
+            present: 顯示畫面；可阻塞到畫面實際繪出，讓顯示端也只保留最新一幀
+            error_backoff: 階段發生錯誤後的重試間隔 (秒)
+            recycle: 處理完但未顯示就被丟棄的畫面 (例如 FramePool.release)
+            on_stage: 每個階段完成時回報 (階段名稱, 秒)，例如 AdaptiveQualityController.record
+        """
+        self.capture = capture
+        self.process = process
+        self.present = present
+        self.error_backoff = error_backoff
+        self._captured = LatestFrameSlot()
+        self._processed = LatestFrameSlot(on_drop=(lambda packet: recycle(packet[2])) if recycle else None)
+        self._stop = threading.Event()
+        self._threads = []
+        self._stats = {name: _StageStats() for name in ("capture", "process", "present")}
+        self.latency_ms = 0.0
+        self.on_stage = on_stage
+        self._commands = queue.SimpleQueue()
+
+    # === 階段 ===
+
+    def _capture_loop(self):
+        sequence = 0
+        while not self._stop.is_set():
+            self._run_commands()
+            started = time.perf_counter()
+            try:
+                frame = self.capture()
+            except Exception as e:
+                print(f"相機錯誤: {e}")
+                self._stop.wait(self.error_backoff)
+                continue
+            finished = time.perf_counter()
+            self._record("capture", started, finished)
+            sequence += 1
+            self._captured.put((sequence, finished, frame))
+
+    def _process_loop(self):
+        while not self._stop.is_set():
+            packet = self._captured.get(timeout=0.5)
+            if packet is None:
+                continue
+            sequence, captured_at, frame = packet
+            started = time.perf_counter()
+            try:
+                frame = self.process(frame)
+            except Exception as e:
+                print(f"處理錯誤: {e}")
+                self._stop.wait(self.error_backoff)
+                continue
+            self._record("process", started, time.perf_counter())
+            self._processed.put((sequence, captured_at, frame))
+
+    def _present_loop(self):
+        while not self._stop.is_set():
+            packet = self._processed.get(timeout=0.5)
+            if packet is None:
+                continue
+            _, captured_at, frame = packet
+            started = time.perf_counter()
+            try:
+                self.present(frame)
+            except Exception as e:
+                print(f"顯示錯誤: {e}")
+                continue
+            finished = time.perf_counter()
+            self._record("present", started, finished)
+            self.latency_ms += 0.1 * ((finished - captured_at) * 1000 - self.latency_ms)
+
+    def _record(self, stage: str, started: float, finished: float):
+        self._stats[stage].record(started, finished)
+        if self.on_stage is not None:
+            self.on_stage(stage, finished - started)
+
+    def _run_commands(self):
+        """在擷取執行緒的兩幀之間執行排入的指令 (例如 switch_mode)"""
+        while True:
+            try:
+                fn, future = self._commands.get_nowait()
+            except queue.Empty:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn())
+            except Exception as e:
+                future.set_exception(e)
+            # 指令前擷取的畫面 (舊模式) 不再處理
+            self._captured.clear()
+
+    # === 控制 ===
+
+    def call_between_frames(self, fn: Callable[[], Any]) -> Future:
+        """
+        排入在擷取執行緒兩幀之間執行的指令，回傳 Future
+        
+        相機呼叫 (capture_array / switch_mode) 都在同一個執行緒，管線不需停止；
+        管線未執行時直接在呼叫端執行。
+        """
+        future = Future()
+        self._commands.put((fn, future))
+        if not self.running or not self._threads:
+            self._run_commands()
+        return future
+
+    def start(self):
+        """三個階段都在背景執行緒"""
+        self._reset()
+        for loop in (self._capture_loop, self._process_loop, self._present_loop):
+            thread = threading.Thread(target=loop, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def run(self):
+        """處理階段在呼叫端執行緒 (例如 QThread.run)，阻塞到 stop()"""
+        self._reset()
+        for loop in (self._capture_loop, self._present_loop):
+            thread = threading.Thread(target=loop, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        try:
+            self._process_loop()
+        finally:
+            self.stop()
+
+    def stop(self, timeout: float = 2.0):
+        self._stop.set()
+        self._captured.close()
+        self._processed.close()
+        current = threading.current_thread()
+        for thread in self._threads:
+            if thread is not current:
+                thread.join(timeout)
+        self._threads = [t for t in self._threads if t.is_alive()]
+        self._run_commands()
+
+    @property
+    def running(self) -> bool:
+        return not self._stop.is_set()
+
+    def _reset(self):
+        self._stop.clear()
+        self._captured.reopen()
+        self._processed.reopen()
+
+    def stats(self) -> Dict:
+        """各階段幀率 / 耗時、丟棄的過期畫面數與擷取到顯示的延遲"""
+        result = {name: {"frames": s.frames, "fps": round(s.fps, 1), "busy_ms": round(s.busy_ms, 2)}
+                  for name, s in self._stats.items()}
+        result["dropped"] = {"before_process": self._captured.dropped,
+                             "before_present": self._processed.dropped}
+        result["latency_ms"] = round(self.latency_ms, 1)
+        return result
+
+
+if __name__ == "__main__":
+    # 模擬 30 fps 的感光元件，處理 50 ms：幀率受處理限制，延遲約一幀處理時間
+    frame_interval = 1 / 30
+    next_frame = [time.perf_counter()]
+
+    def sensor():
+        next_frame[0] += frame_interval
+        delay = next_frame[0] - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)  # 模擬等待感光元件出幀
+        return np.zeros((240, 320, 3), dtype=np.uint8)
+
+    def slow_filter(frame):
+        time.sleep(0.05)
+        return frame
+
+    pipeline = LivePipeline(sensor, slow_filter, lambda frame: None)
+    pipeline.start()
+    time.sleep(3)
+    pipeline.stop()
+    print(pipeline.stats())
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+預覽品質自適應控制
+Adaptive Live-View Quality Controller
+
+各濾鏡成本差異很大 (Velvia 的 LAB 來回轉換 vs 單色)，固定品質會讓預覽幀率忽高忽低：
+- 以滑動視窗記錄各階段耗時，依處理階段的平均 / p90 與目標幀時間比較
+- 超出預算時逐級降低品質：處理解析度 → LUT 濾鏡 → 略過顆粒 → 降低選單縮圖更新頻率
+- 有餘裕 (且預估升級後仍在預算內) 並持續一段時間才升級，避免在兩級之間來回跳動
+- LUT 不一定比原始濾鏡快：烘焙時實測兩者成本，只在較快時採用，升級預估也以實測比例計算
+- 目前的決策以 dict 發布，供 UI 顯示與遙測記錄
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# 低品質等級以 3D LUT 取代逐像素濾鏡 (來自 filter 模組)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'filter'))
+try:
+    from film_lut import FilmLUT
+    FILM_LUT_AVAILABLE = True
+except ImportError:
+    FILM_LUT_AVAILABLE = False
+
+# 品質等級 (由高到低)
+#   scale: 處理解析度相對於預覽區域的比例
+#   filter_tier: "full" 逐像素原始濾鏡 / "lut" 烘焙後的 3D LUT
+#   grain: 是否套用顆粒等空間效果 (軟片函式的 spatial_effects 參數)
+#   overlay_slowdown: 選單縮圖等疊加層的更新間隔倍率
+QUALITY_LEVELS = [
+    {"name": "full", "scale": 1.0, "filter_tier": "full", "grain": True, "overlay_slowdown": 1.0},
+    {"name": "high", "scale": 0.8, "filter_tier": "full", "grain": True, "overlay_slowdown": 1.0},
+    {"name": "balanced", "scale": 0.8, "filter_tier": "lut", "grain": False, "overlay_slowdown": 2.0},
+    {"name": "fast", "scale": 0.6, "filter_tier": "lut", "grain": False, "overlay_slowdown": 3.0},
+    {"name": "minimum", "scale": 0.4, "filter_tier": "lut", "grain": False, "overlay_slowdown": 5.0},
+]
+
+
+def processing_size(frame_shape, target_size: Optional[Tuple[int, int]], scale: float) -> Tuple[int, int]:
+    """品質等級對應的處理解析度 (寬, 高)：預覽區域 (未設定時為畫面大小) × scale"""
+    width, height = target_size or (frame_shape[1], frame_shape[0])
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+class AdaptiveQualityController:
+    """滑動視窗量測 + 遲滯的預覽品質控制器"""
+
+    def __init__(self, target_fps: float = 30.0, window: int = 30, controlled_stages=("process",),
+                 downgrade_samples: int = 10, upgrade_frames: int = 45, upgrade_margin: float = 0.85,
+                 levels: Optional[List[Dict]] = None, lut_cost_ratio: Optional[Callable[[], float]] = None):
+        """
+        Args:
+            target_fps: 目標預覽幀率 (幀時間預算 = 1 / target_fps)
+            window: 各階段耗時的滑動視窗長度 (幀)
+            controlled_stages: 品質設定能影響的階段 (擷取階段的等待時間不計入)
+            downgrade_samples: 切換等級後至少要累積的樣本數才會再次降級
+            upgrade_frames: 持續有餘裕多少幀才升級
+            upgrade_margin: 預估升級後的耗時需低於預算的此比例
+            lut_cost_ratio: 目前濾鏡在 LUT 層級的實測成本比例 (例如 FilterLUTCache.cost_ratio)，
+                未提供時視為與逐像素濾鏡相同
+        """
+        self.levels = levels or QUALITY_LEVELS
+        self.lut_cost_ratio = lut_cost_ratio
+        self.window = window
+        self.controlled_stages = tuple(controlled_stages)
+        self.downgrade_samples = downgrade_samples
+        self.upgrade_frames = upgrade_frames
+        self.upgrade_margin = upgrade_margin
+        self.set_target_fps(target_fps)
+        self._samples: Dict[str, deque] = {}
+        self._listeners: List[Callable[[Dict], None]] = []
+        self._lock = threading.Lock()
+        self._level = 0
+        self._headroom_frames = 0
+        self._changes = 0
+        self.current: Dict = self._snapshot(0.0)
+
+    def set_target_fps(self, target_fps: float):
+        self.target_fps = target_fps
+        self.budget = 1.0 / target_fps
+
+    def subscribe(self, callback: Callable[[Dict], None]):
+        """註冊品質變更回呼 (只在等級改變時呼叫)"""
+        self._listeners.append(callback)
+
+    # === 量測 ===
+
+    def record(self, stage: str, seconds: float):
+        """記錄一個階段的耗時 (可從任何執行緒呼叫，例如 LivePipeline 的 on_stage)"""
+        samples = self._samples.get(stage)
+        if samples is None:
+            samples = self._samples.setdefault(stage, deque(maxlen=self.window))
+        samples.append(seconds)
+
+    def _stage_cost(self) -> float:
+        """受控階段的耗時：平均與 p90 的平均 (兼顧整體與偶發尖峰)"""
+        cost = 0.0
+        for stage in self.controlled_stages:
+            samples = self._samples.get(stage)
+            if samples:
+                values = np.fromiter(samples, dtype=np.float64)
+                cost += 0.5 * (values.mean() + np.percentile(values, 90))
+        return cost
+
+    def _sample_count(self) -> int:
+        return min((len(self._samples.get(stage, ())) for stage in self.controlled_stages), default=0)
+
+    # === 決策 ===
+
+    def _projected_cost(self, cost: float, level: int, new_level: int) -> float:
+        """依像素數與濾鏡層級 (實測的 LUT 成本比例) 預估另一個等級的耗時"""
+        current, target = self.levels[level], self.levels[new_level]
+        projected = cost * (target["scale"] / current["scale"]) ** 2
+        if current["filter_tier"] != target["filter_tier"]:
+            ratio = self.lut_cost_ratio() if self.lut_cost_ratio is not None else 1.0
+            projected *= ratio if target["filter_tier"] == "lut" else 1.0 / ratio
+        return projected
+
+    def update(self) -> Dict:
+        """每幀呼叫一次 (處理階段開始前)，回傳目前的品質決策"""
+        with self._lock:
+            cost = self._stage_cost()
+            level = self._level
+            if self._sample_count() >= self.downgrade_samples:
+                if cost > self.budget and level < len(self.levels) - 1:
+                    level += 1
+                    self._headroom_frames = 0
+                elif level > 0 and self._projected_cost(cost, level, level - 1) < self.budget * self.upgrade_margin:
+                    self._headroom_frames += 1
+                    if self._headroom_frames >= self.upgrade_frames:
+                        level -= 1
+                        self._headroom_frames = 0
+                else:
+                    self._headroom_frames = 0
+
+            changed = level != self._level
+            if changed:
+                self._level = level
+                self._changes += 1
+                # 新等級重新量測，舊樣本不再代表目前的成本
+                for stage in self.controlled_stages:
+                    self._samples.pop(stage, None)
+            self.current = self._snapshot(cost)
+
+        if changed:
+            print(f"🎚️ 預覽品質: {self.current['name']} ({self.current['cost_ms']:.1f} / "
+                  f"{self.current['budget_ms']:.1f} ms)")
+            for callback in self._listeners:
+                callback(self.current)
+        return self.current
+
+    def _snapshot(self, cost: float) -> Dict:
+        """不可變的決策快照 (以整個 dict 替換發布)"""
+        decision = dict(self.levels[self._level])
+        decision.update(level=self._level, cost_ms=round(float(cost) * 1000, 2),
+                        budget_ms=round(self.budget * 1000, 2), target_fps=self.target_fps)
+        return decision
+
+    def telemetry(self) -> Dict:
+        """目前決策與各階段耗時統計 (平均 / p90 / 最大，毫秒)"""
+        stages = {}
+        for stage, samples in list(self._samples.items()):
+            if samples:
+                values = np.fromiter(samples, dtype=np.float64) * 1000
+                stages[stage] = {"mean_ms": round(float(values.mean()), 2),
+                                 "p90_ms": round(float(np.percentile(values, 90)), 2),
+                                 "max_ms": round(float(values.max()), 2), "samples": len(values)}
+        return {"decision": self.current, "stages": stages, "changes": self._changes}
+
+
+class FilterLUTCache:
+    """低品質等級使用的濾鏡 LUT (第一次使用時才烘焙，空間濾鏡無法以 LUT 表示)
+
+    烘焙時在預覽大小的測試畫面上各量一次原始濾鏡與 LUT 的耗時，
+    預覽只在 LUT 較快的濾鏡使用 LUT (例如單色濾鏡本身就比三線性內插便宜)。
+    """
+
+    def __init__(self, apply_filter: Callable[[np.ndarray, int], np.ndarray], spatial_filters=(),
+                 size: int = 17, probe_size: Tuple[int, int] = (640, 480)):
+        """
+        Args:
+            apply_filter: 逐像素濾鏡 (RGB 畫面, 濾鏡索引)
+            spatial_filters: 無法以 LUT 表示的濾鏡索引
+            probe_size: 量測成本用的測試畫面大小 (寬, 高)
+        """
+        self.apply_filter = apply_filter
+        self.spatial_filters = set(spatial_filters)
+        self.size = size
+        self.probe_size = probe_size
+        self._luts: Dict[int, "FilmLUT"] = {}
+        self._cost_ratios: Dict[int, float] = {}
+
+    def get(self, index: int) -> Optional["FilmLUT"]:
+        """濾鏡的 LUT (例如批次縮圖使用)，第一次取得時烘焙並量測成本"""
+        if not FILM_LUT_AVAILABLE or index in self.spatial_filters:
+            return None
+        if index not in self._luts:
+            lut = FilmLUT.from_function(lambda grid: self.apply_filter(grid, index), self.size)
+            self._cost_ratios[index] = self._measure(lut, index)
+            self._luts[index] = lut
+        return self._luts[index]
+
+    def for_preview(self, index: int) -> Optional["FilmLUT"]:
+        """預覽 LUT 層級使用的 LUT；實測不比原始濾鏡快時回傳 None (改用原始濾鏡)"""
+        lut = self.get(index)
+        if lut is None or self._cost_ratios[index] >= 1.0:
+            return None
+        return lut
+
+    def cost_ratio(self, index: int) -> float:
+        """LUT 層級相對於原始濾鏡的實測成本 (不使用 LUT 或尚未烘焙時為 1.0)"""
+        return min(self._cost_ratios.get(index, 1.0), 1.0)
+
+    def _measure(self, lut: "FilmLUT", index: int) -> float:
+        """測試畫面上 LUT 與原始濾鏡的耗時比 (各取三次中最快的一次)"""
+        width, height = self.probe_size
+        rng = np.random.default_rng(0)
+        probe = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+        def best_of(func) -> float:
+            timings = []
+            for _ in range(3):
+                started = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - started)
+            return min(timings)
+
+        filter_time = best_of(lambda: self.apply_filter(probe, index))
+        return best_of(lambda: lut.apply(probe)) / max(filter_time, 1e-9)
+
+
+if __name__ == "__main__":
+    # 模擬：逐像素濾鏡在完整解析度需 50 ms，LUT 實測為其一半，目標 30 fps
+    lut_ratio = 0.5
+    controller = AdaptiveQualityController(target_fps=30, lut_cost_ratio=lambda: lut_ratio)
+    full_cost = 0.050
+    for frame in range(300):
+        decision = controller.update()
+        cost = full_cost * decision["scale"] ** 2
+        if decision["filter_tier"] == "lut":
+            cost *= lut_ratio
+        if frame == 150:
+            full_cost = 0.020  # 換成便宜的濾鏡
+        controller.record("process", cost * np.random.uniform(0.9, 1.1))
+    print(controller.telemetry())
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+全解析度拍照
+Full-Resolution Still Capture
+
+快門只負責取得畫面，沖洗與存檔在背景執行緒完成，UI 立即返回：
+- 以預先建立的拍照設定呼叫 switch_mode_and_capture，取得全解析度畫面與 metadata 後切回預覽模式，
+  在擷取執行緒的兩幀之間執行 (LivePipeline.call_between_frames)
+- 先以縮小的代理畫面套用相同設定，馬上回報供 UI 顯示預覽
+- 再以全解析度、全品質 (逐像素濾鏡，不使用 LUT) 沖洗並存檔
+- 濾鏡 / 曝光等設定在快門當下記錄，沖洗期間使用者變更設定不影響這張照片
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from live_pipeline import main_to_rgb, resize_to_fit
+
+
+def grab_still(picam2, stream: str = "main", still_config=None,
+               size: Optional[Tuple[int, int]] = None) -> Tuple[np.ndarray, Dict]:
+    """
+    取得一張完整畫面與 metadata
+
+    Args:
+        still_config: 拍照設定 (create_still_configuration)，以 switch_mode_and_capture 切換後擷取，
+            完成後回到預覽模式；None 時以 capture_request 取目前的串流 (make_array 會複製，緩衝區可立即歸還)
+        size: 取預覽串流時縮小到此解析度
+    """
+    if still_config is not None:
+        arrays, metadata = picam2.switch_mode_and_capture_arrays(still_config, [stream])
+        return arrays[0], metadata
+
+    request = picam2.capture_request()
+    try:
+        frame = request.make_array(stream)
+        metadata = request.get_metadata()
+    finally:
+        request.release()
+    if size is not None and tuple(frame.shape[1::-1]) != tuple(size):
+        frame = cv2.resize(frame, tuple(size), interpolation=cv2.INTER_AREA)
+    return frame, metadata
+
+
+class StillCapture:
+    """拍照背景工作：代理預覽 → 全品質沖洗 → 存檔"""
+
+    def __init__(self, render: Callable[[np.ndarray, Dict], np.ndarray],
+                 on_proxy: Optional[Callable[[np.ndarray, str], None]] = None,
+                 on_saved: Optional[Callable[[str, float], None]] = None,
+                 on_error: Optional[Callable[[str, Exception], None]] = None,
+                 proxy_size: Tuple[int, int] = (120, 90), max_pending: int = 3):
+        """
+        Args:
+            render: 以快門當下的設定沖洗 RGB 畫面 (例如 CameraThread.render_still)
+            on_proxy: 代理預覽完成 (RGB 畫面, 檔案路徑)
+            on_saved: 全解析度照片已存檔 (檔案路徑, 快門到存檔的毫秒數)
+            on_error: 擷取或沖洗失敗 (檔案路徑, 例外)
+            proxy_size: 代理預覽大小 (寬, 高)
+            max_pending: 尚未存檔的照片上限 (每張全解析度畫面約 15 MB)
+        """
+        self.render = render
+        self.on_proxy = on_proxy
+        self.on_saved = on_saved
+        self.on_error = on_error
+        self.proxy_size = proxy_size
+        self.max_pending = max_pending
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._worker: Optional[threading.Thread] = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def capture(self, grab: Callable[[], Tuple[np.ndarray, Dict]], path: str, settings: Dict,
+                call_between_frames: Optional[Callable[[Callable[[], Any]], Any]] = None) -> bool:
+        """
+        快門：排入擷取並立即返回；仍有太多照片在沖洗時回傳 False
+
+        Args:
+            grab: 取得 (畫面, metadata)，例如 lambda: grab_still(picam2)
+            path: 存檔路徑
+            settings: 快門當下的沖洗設定
+            call_between_frames: 在擷取執行緒執行 grab (LivePipeline.call_between_frames)，
+                未提供時在呼叫端執行
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                print(f"⚠️ 仍有 {self._pending} 張照片沖洗中，請稍候")
+                return False
+            self._pending += 1
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._work, daemon=True)
+                self._worker.start()
+
+        shutter = time.perf_counter()
+
+        def submit(future):
+            try:
+                frame, metadata = future.result()
+            except Exception as e:
+                self._finish()
+                self._report_error(path, e)
+                return
+            self._queue.put((frame, metadata, path, settings, shutter))
+
+        if call_between_frames is None:
+            future = Future()
+            try:
+                future.set_result(grab())
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            future = call_between_frames(grab)
+        future.add_done_callback(submit)
+        return True
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            frame, metadata, path, settings, shutter = job
+            try:
+                self._develop(frame, path, settings, shutter)
+            except Exception as e:
+                self._report_error(path, e)
+            finally:
+                self._finish()
+
+    def _develop(self, frame: np.ndarray, path: str, settings: Dict, shutter: float):
+        # 代理預覽：先縮小再沖洗，幾毫秒內就能顯示
+        if self.on_proxy is not None:
+            proxy = self.render(main_to_rgb(resize_to_fit(frame, self.proxy_size)), settings)
+            self.on_proxy(np.ascontiguousarray(proxy), path)
+
+        # 全解析度、全品質沖洗
+        still = self.render(main_to_rgb(frame), settings)
+        if not cv2.imwrite(path, cv2.cvtColor(still, cv2.COLOR_RGB2BGR)):
+            raise IOError(f"無法寫入 {path}")
+        elapsed_ms = (time.perf_counter() - shutter) * 1000
+        print(f"✓ 照片已儲存: {path} ({still.shape[1]}x{still.shape[0]}, {elapsed_ms:.0f} ms)")
+        if self.on_saved is not None:
+            self.on_saved(path, elapsed_ms)
+
+    def _finish(self):
+        with self._lock:
+            self._pending -= 1
+
+    def _report_error(self, path: str, error: Exception):
+        print(f"拍照失敗: {error}")
+        if self.on_error is not None:
+            self.on_error(path, error)
+
+    def stop(self, timeout: Optional[float] = 30.0):
+        """等待已按下快門的照片全部存檔後結束背景執行緒 (須在預覽管線停止前呼叫)"""
+        deadline = time.perf_counter() + (timeout or 0)
+        while self._pending and (timeout is None or time.perf_counter() < deadline):
+            time.sleep(0.05)
+        if self._worker is not None and self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join(1.0)
@@ -19,12 +19,22 @@ import threading
 import signal
 import sys
 
+# 自動沖洗服務（從 filter 模組）
+try:
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'filter'))
+    from watch_folder_daemon import WatchFolderDaemon
+    AUTO_DEVELOP_AVAILABLE = True
+except ImportError:
+    AUTO_DEVELOP_AVAILABLE = False
+
 class UltraCameraApp:
     def __init__(self):
         self.picam2 = None
         self.running = True
         self.photo_count = 0
         self.photos_dir = "/home/kevin/Pictures"
+        self.develop_daemon = None
+        self.film_simulation = "PROVIA"  # 目前選擇的軟片模擬 (自動沖洗使用)
         
         # 確保照片目錄存在
         os.makedirs(self.photos_dir, exist_ok=True)
@@ -198,6 +208,9 @@ class UltraCameraApp:
         keyboard_thread.daemon = True
         keyboard_thread.start()
         
+        # 啟動背景自動沖洗（低優先權，不影響拍照）
+        self.start_auto_develop()
+        
         print("✅ Ultra Camera App 已啟動！")
         print("📺 HDMI 全螢幕預覽中...")
         
@@ -232,12 +245,40 @@ class UltraCameraApp:
         
         return True
     
+    def set_film_simulation(self, simulation):
+        """變更目前選擇的軟片模擬，之後的新照片以此自動沖洗"""
+        self.film_simulation = simulation
+        if self.develop_daemon:
+            self.develop_daemon.set_simulation(simulation)
+    
+    def start_auto_develop(self, simulation=None):
+        """啟動照片目錄監看，新照片自動套用目前選擇的軟片模擬並產生縮圖"""
+        if not AUTO_DEVELOP_AVAILABLE:
+            print("⚠️  自動沖洗模組未找到，略過")
+            return False
+        
+        if simulation is not None:
+            self.film_simulation = simulation
+        
+        try:
+            self.develop_daemon = WatchFolderDaemon(self.photos_dir, self.film_simulation)
+            self.develop_daemon.start()
+            return True
+        except Exception as e:
+            print(f"⚠️  自動沖洗服務啟動失敗: {e}")
+            self.develop_daemon = None
+            return False
+    
     def cleanup(self):
         """清理資源"""
         print("🧹 正在清理資源...")
         
         self.running = False
         
+        if self.develop_daemon:
+            self.develop_daemon.stop()
+            self.develop_daemon = None
+        
         if self.picam2:
             try:
                 self.picam2.stop_preview()
@@ -258,6 +299,10 @@ def main():
     
     app = UltraCameraApp()
     
+    # 軟片模擬可由第一個參數指定，例如: python ultra_camera_app.py CLASSIC_CHROME
+    if len(sys.argv) > 1:
+        app.set_film_simulation(sys.argv[1])
+    
     try:
         success = app.run()
         exit_code = 0 if success else 1
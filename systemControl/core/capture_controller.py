@@ -0,0 +1,241 @@
+"""
+拍攝控制器
+統一快門的拍攝路徑：依 CameraSettings 與場景選擇拍攝方式
+(長曝光疊加 / HDR 包圍曝光 / low_light 場景的多幀夜景 / 單張)，
+取得的畫面交給軟片模擬引擎沖洗後存檔。
+拍攝與沖洗在背景執行緒進行，快門立即返回；長曝光期間的漸進預覽疊在主螢幕上。
+預覽在 binning 模式；單張以預先建立的拍照設定切到全解析度擷取，
+連拍類 (長曝光 / HDR / 夜景) 整段切換一次到拍照設定，結束後回到預覽模式。
+"""
+
+import contextlib
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+# 軟片模擬與多幀拍攝 (mainCamera/filter)
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'mainCamera', 'filter'))
+
+try:
+    import cv2
+    from enhanced_film_simulation import EnhancedFilmSimulation
+    from hdr_fusion import HDRCapture
+    from long_exposure import LongExposureSession
+    from night_mode import NightModeCapture
+    FILM_PIPELINE_AVAILABLE = True
+except ImportError:
+    FILM_PIPELINE_AVAILABLE = False
+
+
+class CaptureController:
+    """快門 → 拍攝 (長曝光 / HDR / 夜景 / 單張) → 軟片模擬 → 存檔"""
+
+    def __init__(self, picam2, camera_settings, output_dir: str, film_engine=None,
+                 stream: str = "main", still_config=None,
+                 on_saved: Optional[Callable[[str, float], None]] = None,
+                 on_error: Optional[Callable[[Exception], None]] = None,
+                 on_preview: Optional[Callable[[np.ndarray, Dict], None]] = None):
+        """
+        Args:
+            picam2: 已啟動的 Picamera2 實例 (main 為 RGB888，記憶體順序為 BGR)
+            camera_settings: CameraSettings，快門當下讀取 HDR 等設定
+            output_dir: 照片存檔資料夾
+            film_engine: EnhancedFilmSimulation，未提供時於第一次拍攝時建立
+            still_config: 全解析度拍照設定 (單張以 switch_mode_and_capture 擷取，連拍整段切換一次)；
+                          None 時直接取預覽模式的 stream
+            on_saved: 照片已存檔 (檔案路徑, 快門到存檔的秒數)
+            on_error: 拍攝或沖洗失敗
+            on_preview: 長曝光漸進預覽 (BGR 預覽影像, 進度)
+        """
+        if not FILM_PIPELINE_AVAILABLE:
+            raise RuntimeError("軟片模擬模組不可用 (需要 OpenCV 與 mainCamera/filter)")
+        self.picam2 = picam2
+        self.camera_settings = camera_settings
+        self.output_dir = output_dir
+        self.film_engine = film_engine
+        self.stream = stream
+        self.still_config = still_config
+        self.on_saved = on_saved
+        self.on_error = on_error
+        self.on_preview = on_preview
+        self.film_simulation = "PROVIA"
+        self.photo_count = 0
+        self._worker: Optional[threading.Thread] = None
+        self._session: Optional[LongExposureSession] = None
+        self._lock = threading.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._worker is not None and self._worker.is_alive()
+
+    def set_film_simulation(self, simulation: str):
+        """變更沖洗使用的軟片模擬 (下一次快門生效)"""
+        self.film_simulation = simulation
+
+    def capture(self) -> bool:
+        """快門：在背景執行緒拍攝並沖洗；上一張尚未完成時回傳 False"""
+        with self._lock:
+            if self.busy:
+                print("⚠️ 上一張照片仍在處理中，請稍候")
+                return False
+            self._worker = threading.Thread(target=self._run, args=(self.film_simulation,),
+                                            name="capture", daemon=True)
+            self._worker.start()
+        return True
+
+    def wait(self, timeout: Optional[float] = None):
+        """等待目前的拍攝完成"""
+        if self._worker is not None:
+            self._worker.join(timeout)
+
+    def cancel(self):
+        """中途結束長曝光 (保留已疊加的結果並照常沖洗)"""
+        session = self._session
+        if session is not None:
+            session.cancel()
+
+    # === 拍攝 ===
+
+    def _grab(self) -> Tuple[np.ndarray, Dict]:
+        """預覽模式的一幀：以 capture_request 取得畫面與 metadata，取出後立即歸還緩衝區"""
+        request = self.picam2.capture_request()
+        try:
+            frame = request.make_array(self.stream)
+            metadata = request.get_metadata()
+        finally:
+            request.release()
+        return frame[:, :, :3], metadata
+
+    def _grab_still(self) -> Tuple[np.ndarray, Dict]:
+        """單張：切到拍照設定擷取，完成後自動回到預覽模式"""
+        arrays, metadata = self.picam2.switch_mode_and_capture_arrays(self.still_config, [self.stream])
+        return arrays[0][:, :, :3], metadata
+
+    @contextlib.contextmanager
+    def _still_mode(self):
+        """連拍期間切到拍照設定 (整段只切換一次)，結束後回到原本的預覽模式"""
+        if self.still_config is None:
+            yield
+            return
+        preview_config = self.picam2.camera_config
+        self.picam2.switch_mode(self.still_config)
+        try:
+            yield
+        finally:
+            self.picam2.switch_mode(preview_config)
+
+    def _acquire(self) -> Tuple[np.ndarray, Dict, Dict]:
+        """
+        依目前設定與場景取得要沖洗的畫面
+
+        Returns:
+            (uint8 BGR 畫面, 拍攝 metadata, 覆寫的沖洗參數)
+        """
+        settings = self.camera_settings
+        if settings.long_exposure_seconds > 0:
+            return self._long_exposure(settings)
+
+        if settings.hdr_enabled:
+            # 包圍曝光以目前自動曝光為基準，融合結果直接交給軟片模擬
+            metadata = self.picam2.capture_metadata()
+            hdr = HDRCapture.from_settings(self.picam2, settings)
+            hdr.stream = self.stream
+            print(f"🌗 HDR 包圍曝光: {hdr.frames} 張 ±{settings.hdr_ev_step} EV")
+            with self._still_mode():
+                return hdr.capture_hdr(), metadata, {}
+
+        frame, metadata = self._grab()
+        # 場景分析建議 low_light 時改拍多幀夜景，預覽畫面只用於判斷
+        if NightModeCapture.should_use(self._engine().analyze_scene(frame)):
+            print("🌙 低光場景：改用多幀夜景合併")
+            night = NightModeCapture(self.picam2, stream=self.stream)
+            # 多幀合併已降噪，auto 時不再做單幀降噪
+            overrides = {"noise_reduction": "off"} if settings.noise_reduction == "auto" else {}
+            with self._still_mode():
+                return night.capture(), metadata, overrides
+        if self.still_config is not None:
+            frame, metadata = self._grab_still()
+        return frame, metadata, {}
+
+    def _long_exposure(self, settings) -> Tuple[np.ndarray, Dict, Dict]:
+        """以串流疊加模擬超過 1 秒的快門，疊加期間定期更新主螢幕預覽"""
+        metadata = self.picam2.capture_metadata()
+        self._session = LongExposureSession(self.picam2, mode=settings.long_exposure_mode,
+                                            stream=self.stream, preview_callback=self._show_preview)
+        try:
+            with self._still_mode():
+                frame = self._session.run(settings.long_exposure_seconds)
+        finally:
+            self._session = None
+            self._clear_overlay()
+        # mean / weighted 疊加已平均雜訊，auto 時不再降噪 (lighten 保留最亮值，雜訊未平均)
+        if settings.noise_reduction == "auto" and settings.long_exposure_mode != "lighten":
+            return frame, metadata, {"noise_reduction": "off"}
+        return frame, metadata, {}
+
+    def _show_preview(self, preview: np.ndarray, progress: Dict):
+        """長曝光漸進預覽：疊在主螢幕 (HDMI) 的相機預覽上，並轉交 on_preview"""
+        try:
+            self.picam2.set_overlay(cv2.cvtColor(preview, cv2.COLOR_BGR2RGBA))
+        except Exception:
+            # 未啟動預覽視窗時無法疊加，交由 on_preview 顯示
+            pass
+        if self.on_preview is not None:
+            self.on_preview(preview, progress)
+
+    def _clear_overlay(self):
+        try:
+            self.picam2.set_overlay(None)
+        except Exception:
+            pass
+
+    # === 沖洗與存檔 ===
+
+    def _engine(self):
+        if self.film_engine is None:
+            self.film_engine = EnhancedFilmSimulation()
+        return self.film_engine
+
+    def _develop(self, frame: np.ndarray, simulation: str, metadata: Dict,
+                 overrides: Optional[Dict] = None) -> np.ndarray:
+        """軟片模擬沖洗；降噪依 CameraSettings.noise_reduction，auto 依拍攝時的類比增益，膚色調整限制在臉部附近"""
+        options = {"noise_reduction": self.camera_settings.noise_reduction,
+                   "analogue_gain": metadata.get("AnalogueGain"),
+                   "face_aware": "still"}
+        options.update(overrides or {})
+        return self._engine().apply_simulation(frame, simulation, **options)
+
+    def _next_path(self) -> str:
+        os.makedirs(self.output_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.photo_count += 1
+        return os.path.join(self.output_dir, f"IMG_{timestamp}_{self.photo_count:04d}.jpg")
+
+    def _save(self, image: np.ndarray) -> str:
+        path = self._next_path()
+        quality = int(getattr(self.camera_settings, "jpeg_quality", 95))
+        if not cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, quality]):
+            raise IOError(f"無法寫入 {path}")
+        return path
+
+    def _run(self, simulation: str):
+        shutter = time.perf_counter()
+        try:
+            frame, metadata, overrides = self._acquire()
+            developed = self._develop(frame, simulation, metadata, overrides)
+            path = self._save(developed)
+        except Exception as e:
+            print(f"❌ 拍攝失敗: {e}")
+            if self.on_error is not None:
+                self.on_error(e)
+            return
+
+        elapsed = time.perf_counter() - shutter
+        print(f"📸 照片已儲存: {path} ({simulation}, {elapsed:.1f}s)")
+        if self.on_saved is not None:
+            self.on_saved(path, elapsed)
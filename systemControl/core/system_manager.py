@@ -15,6 +15,28 @@ try:
 except ImportError:
     ModeDial = None
 
+# 白卡測光 (mainCamera/colorCorrection)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'mainCamera', 'colorCorrection'))
+
+try:
+    from white_balance_meter import WhiteCardMeter
+except ImportError:
+    WhiteCardMeter = None
+
+# 相機 (只在 Raspberry Pi 上可用)
+try:
+    from picamera2 import Picamera2, Preview
+except ImportError:
+    Picamera2 = None
+    Preview = None
+
+# 拍攝控制 (單張 / HDR → 軟片模擬 → 存檔)
+try:
+    from core.capture_controller import CaptureController, FILM_PIPELINE_AVAILABLE
+except ImportError:
+    CaptureController = None
+    FILM_PIPELINE_AVAILABLE = False
+
 from settings import (
     CameraSettings, 
     DisplaySettings, 
@@ -41,6 +63,13 @@ class SystemManager:
             self.mode_dial = ModeDial()
             self._setup_dial_callbacks()
         
+        # 相機 (由 attach_camera 連接 Picamera2)
+        self.picam2 = None
+        self.white_card_meter = None
+        self.capture_controller = None
+        self.film_simulation = "PROVIA"  # 轉盤選擇的軟片模擬
+        self.capture_preview_listeners = []  # 長曝光漸進預覽 (preview, progress)
+        
         # 系統狀態
         self.system_initialized = False
         self.current_mode = "photo"  # photo, video, manual
@@ -138,18 +167,72 @@ class SystemManager:
             # self.camera_settings.trigger_autofocus()
         elif press_type == "full":
             print("📷 全按快門：執行拍攝...")
-            # TODO: 呼叫相機執行拍攝
-            # self.camera_settings.capture_image()
+            self._perform_capture()
+
+    def attach_camera(self, picam2, wb_stream: str = "lores", still_config=None):
+        """
+        連接已啟動的 Picamera2
 
-    def _perform_white_balance_capture(self):
-        """執行白卡測光"""
-        # TODO: 實作白卡測光邏輯
-        # 1. 擷取當前影像
-        # 2. 計算中心區域的平均色彩
-        # 3. 計算並套用白平衡增益
+        Args:
+            picam2: Picamera2 實例
+            wb_stream: 白卡測光使用的串流 (lores / main / 未打包的 raw)
+            still_config: 全解析度拍照設定 (單張與 HDR / 夜景 / 長曝光連拍都切換到此設定)，None 時直接取 main
+        """
+        self.picam2 = picam2
+        if WhiteCardMeter:
+            self.white_card_meter = WhiteCardMeter(picam2, stream=wb_stream)
+        
+        # 還原上次白卡測光的增益
+        if self.camera_settings.white_balance_mode == "custom":
+            picam2.set_controls({"AwbEnable": False,
+                                 "ColourGains": tuple(self.camera_settings.white_balance_gains)})
+        
+        # 快門拍攝路徑 (依 HDR 等設定拍攝並沖洗)
+        if CaptureController and FILM_PIPELINE_AVAILABLE:
+            self.capture_controller = CaptureController(
+                picam2, self.camera_settings, self.storage_settings.current_storage_path,
+                still_config=still_config, on_preview=self._on_capture_preview)
+            self.capture_controller.set_film_simulation(self.film_simulation)
+    
+    def add_capture_preview_listener(self, callback):
+        """註冊長曝光漸進預覽的接收端 (callback(preview, progress))，例如主螢幕 UI"""
+        self.capture_preview_listeners.append(callback)
+    
+    def _on_capture_preview(self, preview, progress: Dict):
+        for callback in self.capture_preview_listeners:
+            try:
+                callback(preview, progress)
+            except Exception as e:
+                print(f"預覽更新失敗: {e}")
+    
+    def _perform_capture(self) -> bool:
+        """全按快門：交給拍攝控制器在背景拍攝、沖洗並存檔"""
+        if self.capture_controller is None:
+            print("⚠️  相機未連接或軟片模擬模組不可用")
+            return False
+        # 長曝光進行中再按一次快門：提前結束並沖洗已疊加的結果
+        if self.capture_controller.busy and self.camera_settings.long_exposure_seconds > 0:
+            print("⏹️ 提前結束長曝光")
+            self.capture_controller.cancel()
+            return True
+        return self.capture_controller.capture()
+    
+    def _perform_white_balance_capture(self) -> bool:
+        """執行白卡測光：量測中央區塊、套用 ColourGains 並儲存為自定義白平衡"""
+        if self.white_card_meter is None:
+            print("⚠️  相機未連接或白卡測光模組不可用")
+            return False
+        
         print("⚖️ 正在計算白平衡增益...")
-        # self.camera_settings.calculate_custom_white_balance()
+        result = self.white_card_meter.measure_and_apply()
+        if result is None:
+            return False
+        
+        red, blue = result["gains"]
+        self.camera_settings.set_white_balance_gains(red, blue)
+        self.camera_settings.save_settings()
         print("✅ 白平衡已校準")
+        return True
     
     def _setup_dial_callbacks(self):
         """設定轉盤回調函數"""
@@ -173,13 +256,25 @@ class SystemManager:
         pass
     
     def _on_dial_binding_triggered(self, mode_id: str, bindings: Dict, value):
-        """轉盤綁定觸發回調"""
+        """
+        轉盤綁定觸發回調
+        
+        enum 模式的 value 是選項索引，綁定本身有 value 時以綁定的值為準
+        (例如軟片模擬的名稱、自定義白平衡的 AwbEnable: false)
+        """
+        value = bindings.get("value", value)
+        
         # 處理特殊動作
         if bindings.get("action") == "enter_settings":
             self._show_settings_menu()
         elif bindings.get("control"):
             # 處理相機控制綁定
             self._apply_camera_control(bindings["control"], value)
+        elif bindings.get("pipeline") == "filmSim":
+            # 軟片模擬：下一次快門以此沖洗
+            self.film_simulation = value
+            if self.capture_controller is not None:
+                self.capture_controller.set_film_simulation(value)
     
     def _load_dial_profile(self, profile_name: str) -> bool:
         """載入轉盤配置檔案"""
@@ -222,8 +317,14 @@ class SystemManager:
             
             # 根據控制類型套用設定
             if control == "ExposureTime":
-                # 快門速度控制
+                # 快門速度控制 (選回一般快門時關閉長曝光)
                 print(f"  設定快門速度: {value}s")
+                if self.camera_settings.long_exposure_seconds:
+                    self.camera_settings.set_long_exposure(0)
+                
+            elif control == "LongExposure":
+                # 超過 1 秒的快門以串流疊加模擬 (見 mainCamera/filter/long_exposure.py)
+                self.camera_settings.set_long_exposure(value)
                 
             elif control == "AnalogueGain":
                 # ISO 控制
@@ -234,8 +335,18 @@ class SystemManager:
                 self.camera_settings.set_exposure_compensation(value)
                 
             elif control == "AwbMode":
-                # 白平衡模式
+                # 白平衡模式 (從自定義白平衡切回時重新啟用 AWB)
                 self.camera_settings.set_white_balance_mode(value)
+                if self.picam2 is not None:
+                    self.picam2.set_controls({"AwbEnable": True})
+                
+            elif control == "AwbEnable":
+                # 自定義白平衡：關閉 AWB，使用白卡測光儲存的增益
+                if not value:
+                    self.camera_settings.set_white_balance_mode("custom")
+                    if self.picam2 is not None:
+                        self.picam2.set_controls({"AwbEnable": False,
+                                                  "ColourGains": tuple(self.camera_settings.white_balance_gains)})
                 
             elif control == "ColourGains_AB":
                 # 色彩增益調整
@@ -296,6 +407,27 @@ class SystemManager:
         self.storage_settings.save_settings()
     
     def _initialize_hardware(self):
-        """初始化硬體 (預留)"""
-        # TODO: 初始化相機、螢幕、感測器等硬體
-        pass
\ No newline at end of file
+        """初始化硬體：啟動相機並連接 (螢幕、感測器預留)"""
+        if Picamera2 is None or self.picam2 is not None:
+            return
+        try:
+            picam2 = Picamera2()
+            # 預覽時 main 為 2x2 binning 解析度 (全視角，感光元件不進入約 15 fps 的全解析度模式)，
+            # lores 供白卡測光與預覽；單張拍照才以預先建立的設定切到全解析度
+            config = picam2.create_preview_configuration(
+                main={"size": (1296, 972), "format": "RGB888"},
+                lores={"size": (640, 480), "format": "YUV420"},
+                display="lores",
+            )
+            still_config = picam2.create_still_configuration(main={"size": (2592, 1944), "format": "RGB888"})
+            picam2.configure(config)
+            # 主螢幕 (HDMI) 預覽，長曝光的漸進結果以 overlay 疊在上面
+            try:
+                picam2.start_preview(Preview.DRM)
+            except Exception as e:
+                print(f"⚠️  主螢幕預覽無法啟動: {e}")
+            picam2.start()
+            self.attach_camera(picam2, still_config=still_config)
+            print("📷 相機已連接")
+        except Exception as e:
+            print(f"相機初始化失敗，以無相機模式執行: {e}")
\ No newline at end of file
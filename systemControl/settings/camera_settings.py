@@ -37,6 +37,8 @@ class CameraSettings:
         self.iso_mode = "auto"           # auto, manual
         self.iso_range = (100, 3200)    # (min, max)
         self.exposure_compensation = 0.0 # -3.0 ~ +3.0 EV
+        self.long_exposure_seconds = 0   # 0 = 關閉，>1 秒以串流疊加模擬
+        self.long_exposure_mode = "mean" # mean, lighten, weighted
         
         # 白平衡設定
         self.white_balance_mode = "auto"  # auto, daylight, cloudy, incandescent, etc.
@@ -44,6 +46,8 @@ class CameraSettings:
         
         # 特殊功能
         self.hdr_enabled = False
+        self.hdr_frames = 3              # 包圍張數: 3, 5
+        self.hdr_ev_step = 1.0           # 包圍間隔 (EV)
         self.noise_reduction = "auto"    # auto, off, low, medium, high
         self.sharpness = 0               # -2 ~ +2
         self.contrast = 0                # -2 ~ +2
@@ -60,6 +64,8 @@ class CameraSettings:
             "jpeg_quality": self.jpeg_quality,
             "size": self.image_size,
             "hdr_enabled": self.hdr_enabled,
+            "hdr_frames": self.hdr_frames,
+            "hdr_ev_step": self.hdr_ev_step,
             "noise_reduction": self.noise_reduction,
             "sharpness": self.sharpness,
             "contrast": self.contrast,
@@ -181,9 +187,24 @@ class CameraSettings:
             print(f"無效的曝光補償值: {ev}")
             return False
     
+    def set_long_exposure(self, seconds: float, mode: str = None) -> bool:
+        """設定長曝光秒數 (0 關閉) 與疊加模式"""
+        valid_modes = ["mean", "lighten", "weighted"]
+        if not 0 <= seconds <= 300 or (mode is not None and mode not in valid_modes):
+            print(f"無效的長曝光設定: {seconds}s, {mode}")
+            return False
+        self.long_exposure_seconds = seconds
+        if mode is not None:
+            self.long_exposure_mode = mode
+        if seconds:
+            print(f"長曝光已設定為: {seconds}s ({self.long_exposure_mode})")
+        else:
+            print("長曝光已關閉")
+        return True
+    
     def set_white_balance_mode(self, mode: str) -> bool:
         """設定白平衡模式"""
-        valid_modes = ["auto", "daylight", "cloudy", "incandescent", "fluorescent", "shade", "manual"]
+        valid_modes = ["auto", "daylight", "cloudy", "incandescent", "fluorescent", "shade", "manual", "custom"]
         if mode in valid_modes:
             self.white_balance_mode = mode
             print(f"白平衡模式已設定為: {mode}")
@@ -192,11 +213,33 @@ class CameraSettings:
             print(f"無效的白平衡模式: {mode}")
             return False
     
+    def set_white_balance_gains(self, red: float, blue: float) -> bool:
+        """設定自定義白平衡增益 (白卡測光結果)，並切換為 custom 模式"""
+        if 0.0 < red <= 32.0 and 0.0 < blue <= 32.0:
+            self.white_balance_gains = (round(float(red), 4), round(float(blue), 4))
+            self.white_balance_mode = "custom"
+            print(f"白平衡增益已設定為: R {red:.3f} / B {blue:.3f}")
+            return True
+        else:
+            print(f"無效的白平衡增益: {red}, {blue}")
+            return False
+    
     def enable_hdr(self, enabled: bool):
         """啟用/關閉 HDR"""
         self.hdr_enabled = enabled
         print(f"HDR 已{'啟用' if enabled else '關閉'}")
     
+    def set_hdr_bracket(self, frames: int, ev_step: float) -> bool:
+        """設定 HDR 包圍曝光張數與間隔"""
+        if frames in [3, 5] and 0.3 <= ev_step <= 3.0:
+            self.hdr_frames = frames
+            self.hdr_ev_step = ev_step
+            print(f"HDR 包圍已設定為: {frames} 張, 間隔 {ev_step:.1f} EV")
+            return True
+        else:
+            print(f"無效的 HDR 包圍設定: {frames} 張, {ev_step} EV")
+            return False
+    
     def set_image_enhancement(self, sharpness: int = None, contrast: int = None, saturation: int = None) -> bool:
         """設定影像增強參數"""
         success = True
@@ -242,7 +285,9 @@ class CameraSettings:
                 "metering": self.metering_mode,
                 "iso_mode": self.iso_mode,
                 "iso_range": self.iso_range,
-                "compensation": self.exposure_compensation
+                "compensation": self.exposure_compensation,
+                "long_exposure_seconds": self.long_exposure_seconds,
+                "long_exposure_mode": self.long_exposure_mode
             },
             "white_balance": {
                 "mode": self.white_balance_mode,
@@ -287,6 +332,8 @@ class CameraSettings:
                 self.jpeg_quality = image.get("jpeg_quality", self.jpeg_quality)
                 self.image_size = image.get("size", self.image_size)
                 self.hdr_enabled = image.get("hdr_enabled", self.hdr_enabled)
+                self.hdr_frames = image.get("hdr_frames", self.hdr_frames)
+                self.hdr_ev_step = image.get("hdr_ev_step", self.hdr_ev_step)
                 self.noise_reduction = image.get("noise_reduction", self.noise_reduction)
                 self.sharpness = image.get("sharpness", self.sharpness)
                 self.contrast = image.get("contrast", self.contrast)
@@ -315,6 +362,8 @@ class CameraSettings:
                 self.iso_mode = exposure.get("iso_mode", self.iso_mode)
                 self.iso_range = tuple(exposure.get("iso_range", self.iso_range))
                 self.exposure_compensation = exposure.get("compensation", self.exposure_compensation)
+                self.long_exposure_seconds = exposure.get("long_exposure_seconds", self.long_exposure_seconds)
+                self.long_exposure_mode = exposure.get("long_exposure_mode", self.long_exposure_mode)
             
             # 載入白平衡設定
             if "white_balance" in settings_data:
@@ -351,9 +400,13 @@ class CameraSettings:
         self.iso_mode = "auto"
         self.iso_range = (100, 3200)
         self.exposure_compensation = 0.0
+        self.long_exposure_seconds = 0
+        self.long_exposure_mode = "mean"
         self.white_balance_mode = "auto"
         self.white_balance_gains = (1.0, 1.0)
         self.hdr_enabled = False
+        self.hdr_frames = 3
+        self.hdr_ev_step = 1.0
         self.noise_reduction = "auto"
         self.sharpness = 0
         self.contrast = 0